@@ -9,6 +9,17 @@ a = Analysis(
     datas=[
         ('convert_blog.py', '.'),
         ('tagFinder.py', '.'),
+        ('drive_client.py', '.'),
+        ('run_metrics.py', '.'),
+        ('url_rewrites.py', '.'),
+        ('todo_watcher.py', '.'),
+        ('build_manifest.py', '.'),
+        ('async_drive.py', '.'),
+        ('blog_images.py', '.'),
+        ('output_writer.py', '.'),
+        ('cms_export.py', '.'),
+        ('blog_template.py', '.'),
+        ('blog_style.css', '.'),
         ('README.md', '.'),
         ('Tags.txt', '.'),
         ('icon.png', '.'),
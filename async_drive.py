@@ -0,0 +1,284 @@
+# async_drive.py
+
+# Asyncio Google Drive client used by convert_blog.py --async-drive: uploads, exports and deletes
+# for hundreds of documents share one event loop thread and a bounded connection pool.
+# Needs aiohttp (pip install aiohttp); the default threaded path does not.
+
+import os
+import json
+import uuid
+import asyncio
+from contextlib import asynccontextmanager
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from drive_client import (backoff_delay, DOCX_MIMETYPE, DOWNLOAD_CHUNK_SIZE, DRIVE_BURST,
+                          DRIVE_REQUESTS_PER_SECOND, MAX_RETRIES, RATE_LIMIT_REASONS, RESUMABLE_UPLOAD_THRESHOLD,
+                          UPLOAD_CHUNK_SIZE, TokenBucket)
+
+# ==== CONFIGURATION ====
+
+GOOGLE_ROOT_URL = 'https://www.googleapis.com/'
+DEFAULT_CONNECTIONS = 16      # open HTTP connections shared by every document
+DEFAULT_MAX_IN_FLIGHT = 64    # documents uploading or exporting at once
+REQUEST_TIMEOUT = 300         # seconds for a single request, including large exports
+
+# ==== ERRORS ====
+
+class DriveRequestError(Exception):
+    """A Drive call answered with an HTTP error status"""
+
+    def __init__(self, status, content=b''):
+        self.status = status
+        self.content = content
+        self.reason = None
+        message = ''
+        try:
+            error = json.loads(content.decode('utf-8')).get('error', {})
+            message = error.get('message', '')
+            errors = error.get('errors', [])
+            self.reason = errors[0].get('reason') if errors else None
+        except (ValueError, AttributeError, UnicodeDecodeError):
+            pass
+        super().__init__(f"Drive returned {status}" + (f": {message}" if message else ""))
+
+def is_rate_limit_error(error):
+    """True for 429 and 403 rate limit responses"""
+    if not isinstance(error, DriveRequestError):
+        return False
+    return error.status == 429 or (error.status == 403 and error.reason in RATE_LIMIT_REASONS)
+
+def is_retryable_error(error):
+    """True for rate limits, 5xx responses, dropped connections and timeouts"""
+    if isinstance(error, DriveRequestError):
+        return is_rate_limit_error(error) or error.status >= 500
+    return isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError, ConnectionError))
+
+# ==== RATE LIMITING ====
+
+class AsyncTokenBucket:
+    """
+    drive_client.TokenBucket for coroutines: waiting for a token never blocks the loop.
+    Pass shared (a TokenBucket, e.g. DriveThrottle.bucket) to draw from the same budget as
+    Drive calls made from threads, so together they stay within one request rate.
+    """
+
+    def __init__(self, rate=DRIVE_REQUESTS_PER_SECOND, capacity=DRIVE_BURST, shared=None):
+        self.tokens = shared if shared is not None else TokenBucket(rate, capacity)
+
+    async def acquire(self):
+        while True:
+            wait = self.tokens.try_acquire()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+class AsyncAdaptiveConcurrency:
+    """
+    drive_client.AdaptiveConcurrency for coroutines: limits documents in flight, halving
+    the limit when Drive throttles and growing it by one after a run of successful calls.
+    """
+
+    def __init__(self, maximum, minimum=1, initial=None):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.limit = initial or max(self.minimum, self.maximum // 2)
+        self._active = 0
+        self._successes = 0
+        self._condition = asyncio.Condition()
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one in-flight slot for the duration of the block"""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._active -= 1
+                self._condition.notify_all()
+
+    def on_success(self):
+        self._successes += 1
+        if self._successes >= self.limit and self.limit < self.maximum:
+            self.limit += 1
+            self._successes = 0
+            asyncio.ensure_future(self._wake())
+
+    def on_throttle(self):
+        self._successes = 0
+        new_limit = max(self.minimum, self.limit // 2)
+        if new_limit < self.limit:
+            print(f"Drive is throttling requests, reducing concurrency to {new_limit}")
+        self.limit = new_limit
+
+    async def _wake(self):
+        async with self._condition:
+            self._condition.notify_all()
+
+# ==== CLIENT ====
+
+def _read_bytes(path, offset=0, size=-1):
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return f.read(size)
+
+class AsyncDriveClient:
+    """
+    Drive v3 upload, export and delete over aiohttp, with the same token bucket, jittered
+    backoff and adaptive concurrency as drive_client.DriveThrottle. Use as an async context
+    manager; all calls must come from the event loop that entered it.
+
+    Args:
+        credentials: google.oauth2 credentials (refreshed in a thread when they expire);
+            None with endpoint for fake_drive.py
+        endpoint: Root URL to send every call to instead of Google (e.g. http://127.0.0.1:8765/)
+        max_concurrency: Maximum documents in flight (see slot())
+        connections: Size of the HTTP connection pool
+        shared_bucket: drive_client.TokenBucket to share with threaded Drive calls (such as the
+            DriveCleanupQueue's deletes), so both stay within one request rate
+    """
+
+    def __init__(self, credentials=None, endpoint=None, max_concurrency=DEFAULT_MAX_IN_FLIGHT,
+                 connections=DEFAULT_CONNECTIONS, requests_per_second=DRIVE_REQUESTS_PER_SECOND,
+                 burst=DRIVE_BURST, max_retries=MAX_RETRIES, timeout=REQUEST_TIMEOUT, shared_bucket=None):
+        if aiohttp is None:
+            raise RuntimeError("The async Drive client needs aiohttp: pip install aiohttp")
+        self.credentials = credentials
+        self.root = endpoint.rstrip('/') + '/' if endpoint else GOOGLE_ROOT_URL
+        self.connections = connections
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.bucket = AsyncTokenBucket(requests_per_second, burst, shared_bucket)
+        self.concurrency = AsyncAdaptiveConcurrency(max_concurrency)
+        self.session = None
+        self._refresh_lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.connections),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+
+    def slot(self):
+        """Hold one of the adaptive in-flight document slots"""
+        return self.concurrency.slot()
+
+    async def _auth_headers(self):
+        if self.credentials is None:
+            return {}
+        if not self.credentials.valid:
+            async with self._refresh_lock:
+                if not self.credentials.valid:
+                    from google.auth.transport.requests import Request
+                    await asyncio.to_thread(self.credentials.refresh, Request())
+        return {'Authorization': f'Bearer {self.credentials.token}'}
+
+    async def request(self, method, url, stats=None, data=None, headers=None, read_body=None):
+        """
+        Send one request, retrying transient failures; returns (status, headers, body).
+        body is the response bytes, or whatever read_body(response) returns when given
+        (e.g. to stream it elsewhere); a retry calls read_body again on the new response.
+        If stats is a dict, its 'retries' count is incremented for every retry.
+        """
+        attempt = 0
+        while True:
+            await self.bucket.acquire()
+            try:
+                request_headers = dict(headers or {}, **await self._auth_headers())
+                async with self.session.request(method, url, data=data, headers=request_headers,
+                                                allow_redirects=False) as response:
+                    if response.status >= 400:
+                        raise DriveRequestError(response.status, await response.read())
+                    body = await (read_body or aiohttp.ClientResponse.read)(response)
+                    result = response.status, response.headers, body
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable_error(e):
+                    raise
+                if is_rate_limit_error(e):
+                    self.concurrency.on_throttle()
+                if stats is not None:
+                    stats['retries'] = stats.get('retries', 0) + 1
+                await asyncio.sleep(backoff_delay(attempt))
+                attempt += 1
+                continue
+            self.concurrency.on_success()
+            return result
+
+    async def upload(self, input_path, name=None, resumable_threshold=RESUMABLE_UPLOAD_THRESHOLD,
+                     chunk_size=UPLOAD_CHUNK_SIZE, stats=None):
+        """
+        Upload a .docx as a Google Doc and return its file ID. As in build_upload_media,
+        files below resumable_threshold go in one multipart request and larger ones as a
+        resumable upload of chunk_size chunks read from disk.
+        """
+        metadata = json.dumps({'name': name or os.path.basename(input_path),
+                               'mimeType': 'application/vnd.google-apps.document'})
+        size = os.path.getsize(input_path)
+        upload_url = f"{self.root}upload/drive/v3/files"
+
+        if size < resumable_threshold:
+            boundary = f"==============={uuid.uuid4().hex}=="
+            data = (f'--{boundary}\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n{metadata}\r\n'
+                    f'--{boundary}\r\nContent-Type: {DOCX_MIMETYPE}\r\n\r\n').encode('utf-8')
+            data += await asyncio.to_thread(_read_bytes, input_path) + f'\r\n--{boundary}--'.encode('utf-8')
+            _, _, body = await self.request(
+                'POST', f"{upload_url}?uploadType=multipart&fields=id", stats, data,
+                {'Content-Type': f'multipart/related; boundary="{boundary}"'})
+            return json.loads(body)['id']
+
+        _, headers, _ = await self.request(
+            'POST', f"{upload_url}?uploadType=resumable&fields=id", stats, metadata.encode('utf-8'),
+            {'Content-Type': 'application/json; charset=UTF-8', 'X-Upload-Content-Type': DOCX_MIMETYPE,
+             'X-Upload-Content-Length': str(size)})
+        session_url = headers['Location']
+        for offset in range(0, size, chunk_size):
+            chunk = await asyncio.to_thread(_read_bytes, input_path, offset, chunk_size)
+            status, _, body = await self.request(
+                'PUT', session_url, stats, chunk,
+                {'Content-Range': f"bytes {offset}-{offset + len(chunk) - 1}/{size}"})
+            if status in (200, 201):
+                return json.loads(body)['id']
+        raise DriveRequestError(status, body)
+
+    async def export_html(self, file_id, stats=None):
+        """The Google Doc exported as HTML"""
+        _, _, body = await self.request('GET', self._export_url(file_id), stats)
+        return body.decode('utf-8')
+
+    async def export_to_file(self, file_id, path, stats=None, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        """
+        Stream the Google Doc's HTML export to path, at most chunk_size bytes in memory at a
+        time. The file is written as path.part and renamed when complete. Returns its size.
+        """
+        partial_path = f"{path}.part"
+
+        async def _write(response):
+            with open(partial_path, 'wb') as f:
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    await asyncio.to_thread(f.write, chunk)
+                return f.tell()
+
+        try:
+            _, _, size = await self.request('GET', self._export_url(file_id), stats, read_body=_write)
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        os.replace(partial_path, path)
+        return size
+
+    def _export_url(self, file_id):
+        return f"{self.root}drive/v3/files/{file_id}/export?mimeType=text/html"
+
+    async def delete(self, file_id, stats=None):
+        await self.request('DELETE', f"{self.root}drive/v3/files/{file_id}", stats)
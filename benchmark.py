@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Benchmark - Throughput and memory benchmarks for the HTML cleaner and tag finder
+Generates synthetic Google Docs HTML exports and stores results for before/after comparison
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import tracemalloc
+import subprocess
+
+from convert_blog import clean_html, clean_html_simple, DEFAULT_TAGS
+from tagFinder import load_tags, find_tags
+
+RESULTS_FILE = os.path.join('benchmarks', 'results.jsonl')
+
+# Paragraph counts for the document size presets
+SIZES = {
+    'small': 20,
+    'medium': 200,
+    'large': 2000,
+}
+
+WORDS = (
+    "the truck diesel engine turbo injector Cummins Duramax Powerstroke upgrade install "
+    "performance tuning exhaust intake intercooler transmission clutch towing mileage fuel "
+    "pump boost pressure gauge sensor repair kit gasket hose clamp coolant filter power "
+    "torque horsepower Ford Chevy Ram GMC Allison 6.7L 6.6L 5.9L 7.3L parts warranty"
+).split()
+
+# ==== SYNTHETIC EXPORTS ====
+
+def _sentence(rng, min_words=6, max_words=18):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))]
+    return ' '.join(words).capitalize() + '.'
+
+def generate_export_html(paragraphs=50, spans_per_paragraph=4, list_fragments=None, list_depth=3,
+                         tables=None, links=None, marker=True, notes=True, seed=0):
+    """
+    Build HTML shaped like a Google Drive export.
+
+    Args:
+        paragraphs: Number of body paragraphs
+        spans_per_paragraph: Inline-styled spans per paragraph (bold/italic/13pt mixed in)
+        list_fragments: Number of lst-kix list fragments (default: paragraphs // 4)
+        list_depth: Deepest nesting level used by the list fragments
+        tables: Number of tables (default: paragraphs // 50 + 1)
+        links: Number of google.com/url?q= redirect links (default: paragraphs // 3)
+        marker: Include the 'Begin writing' marker (formatted document)
+        notes: Append a Notes section that the cleaner removes
+        seed: Random seed, so the same arguments give the same document
+    """
+    rng = random.Random(seed)
+    list_fragments = paragraphs // 4 if list_fragments is None else list_fragments
+    tables = paragraphs // 50 + 1 if tables is None else tables
+    links = paragraphs // 3 if links is None else links
+
+    styles = [
+        'color:#000000;font-weight:400;text-decoration:none;vertical-align:baseline;font-size:11pt;'
+        'font-family:"Arial";font-style:normal',
+        'color:#000000;font-weight:700;text-decoration:none;vertical-align:baseline;font-size:11pt;'
+        'font-family:"Arial";font-style:normal',
+        'color:#000000;font-weight:400;text-decoration:none;vertical-align:baseline;font-size:11pt;'
+        'font-family:"Arial";font-style:italic',
+    ]
+    heading_style = ('color:#000000;font-weight:700;text-decoration:none;vertical-align:baseline;'
+                     'font-size:13pt;font-family:"Arial";font-style:normal')
+
+    head = ('<html><head><meta content="text/html; charset=UTF-8" http-equiv="content-type">'
+            '<style type="text/css">'
+            + ''.join(f'ul.lst-kix_list_{i}-{level}{{list-style-type:none}}'
+                      for i in range(4) for level in range(list_depth))
+            + '.c1{font-weight:700}.c2{font-style:italic}.c3{padding-top:0pt;padding-bottom:0pt;'
+              'line-height:1.15;orphans:2;widows:2;text-align:left}.c9{background-color:#ffffff;'
+              'max-width:468pt;padding:72pt 72pt 72pt 72pt}'
+            '</style></head><body class="c9 doc-content">')
+
+    parts = [head]
+    if marker:
+        parts.append(f'<p class="c3"><span style="{heading_style}">Draft title</span></p>'
+                     f'<p class="c3"><span style="{styles[0]}">Author notes and SEO keywords</span></p>'
+                     f'<p class="c3"><span style="{styles[0]}">Begin writing the article below the line break</span></p>'
+                     '<hr>')
+    else:
+        parts.append(f'<p class="c3"><span style="{heading_style}">Draft title</span></p>')
+
+    # Spread lists, tables and links over the paragraphs
+    list_at = set(rng.sample(range(paragraphs), min(list_fragments, paragraphs)))
+    table_at = set(rng.sample(range(paragraphs), min(tables, paragraphs)))
+    link_at = set(rng.sample(range(paragraphs), min(links, paragraphs)))
+    list_id = 0
+
+    for i in range(paragraphs):
+        if i and i % 12 == 0:
+            if marker:
+                parts.append(f'<h2 class="c3"><span style="{styles[1]}">{_sentence(rng, 3, 6)}</span></h2>')
+            else:
+                parts.append(f'<p class="c3"><span style="{heading_style}">{_sentence(rng, 3, 6)}</span></p>')
+
+        spans = []
+        for _ in range(spans_per_paragraph):
+            spans.append(f'<span style="{rng.choice(styles)}">{_sentence(rng)} </span>')
+        if i in link_at:
+            target = f'https://www.dieselpowerproducts.com/p-{rng.randint(1000, 9999)}-part.aspx'
+            spans.append(f'<span><a href="https://www.google.com/url?q={target}&amp;sa=D&amp;'
+                         f'source=editors&amp;ust=1700000000000000&amp;usg=AOvVaw{i}">{_sentence(rng, 2, 4)}</a></span>')
+        if i % 9 == 4:
+            spans.append('<span>&nbsp;</span><br><br>' f'<span style="{styles[0]}">{_sentence(rng)}</span>')
+        parts.append(f'<p class="c3">{"".join(spans)}</p>')
+        if i % 15 == 7:
+            parts.append('<p class="c3"><span></span></p>')
+
+        if i in list_at:
+            list_id = (list_id + 1) % 4
+            for level in range(rng.randint(1, list_depth)):
+                items = ''.join(
+                    f'<li class="c3 li-bullet-0"><span style="{styles[1]}">Label {j}</span>'
+                    f'<span style="{styles[0]}">: {_sentence(rng, 4, 10)}</span></li>'
+                    for j in range(rng.randint(1, 4)))
+                parts.append(f'<ul class="c7 lst-kix_list_{list_id}-{level} start">{items}</ul>')
+
+        if i in table_at:
+            rows = ''.join(
+                '<tr>' + ''.join(f'<td class="c5"><p class="c3"><span style="{styles[0]}">'
+                                 f'{rng.choice(WORDS)}</span></p></td>' for _ in range(4)) + '</tr>'
+                for _ in range(rng.randint(3, 8)))
+            parts.append(f'<table class="c8"><tbody>{rows}</tbody></table>')
+
+    if notes:
+        parts.append(f'<h3 class="c3"><span style="{styles[1]}">Notes</span></h3>')
+        parts.append(f'<p class="c3"><span style="{styles[0]}">{_sentence(rng)}</span></p>')
+    parts.append('<hr></body></html>')
+    return ''.join(parts)
+
+# ==== HARNESS ====
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except Exception:
+        return None
+
+def measure(function, inputs, repeat=3):
+    """
+    Run function over every input `repeat` times.
+    Returns docs/s and MB/s from the fastest repeat, and peak traced memory from one
+    extra run under tracemalloc (kept separate because tracing slows everything down).
+    """
+    total_bytes = sum(len(item.encode('utf-8')) for item in inputs)
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for item in inputs:
+            function(item)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    try:
+        for item in inputs:
+            function(item)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'docs': len(inputs),
+        'input_mb': round(total_bytes / 1e6, 3),
+        'seconds': round(best, 6),
+        'docs_per_s': round(len(inputs) / best, 3) if best else None,
+        'mb_per_s': round(total_bytes / 1e6 / best, 3) if best else None,
+        'peak_mb': round(peak / 1e6, 3),
+    }
+
+def benchmark_upload(sizes_kb=(30, 200, 1024), latency=0.02, repeat=5):
+    """
+    Time files.create against fake_drive.py for multipart vs resumable uploads.
+    latency is added to every response, so the resumable session round trip shows up.
+    """
+    import tempfile
+    from fake_drive import start_fake_drive
+    from drive_client import build_drive_service, build_upload_media, DOCX_MIMETYPE
+
+    server = start_fake_drive(latency=latency)
+    service = build_drive_service(endpoint=server.endpoint)
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            for size_kb in sizes_kb:
+                path = os.path.join(folder, f'{size_kb}kb.docx')
+                with open(path, 'wb') as f:
+                    f.write(os.urandom(size_kb * 1024))
+                for strategy, threshold in (('multipart', size_kb * 1024 + 1), ('resumable', 0)):
+                    timings = []
+                    for _ in range(repeat):
+                        started = time.perf_counter()
+                        media = build_upload_media(path, mimetype=DOCX_MIMETYPE, resumable_threshold=threshold)
+                        service.files().create(body={'name': f'{size_kb}kb.docx'}, media_body=media,
+                                               fields='id').execute()
+                        timings.append(time.perf_counter() - started)
+                    results[f'upload.{strategy}.{size_kb}kb'] = {
+                        'latency_s': latency,
+                        'mean_ms': round(sum(timings) / len(timings) * 1000, 3),
+                        'min_ms': round(min(timings) * 1000, 3),
+                    }
+    finally:
+        server.stop()
+    return results
+
+def benchmark_export(sizes_mb=(1, 16), repeat=3):
+    """
+    Peak traced memory and time of fetching an export from fake_drive.py, comparing the whole
+    response in memory (files.export + decode + write) with drive_client.download_to_file.
+    Exports are padded to size with an inline data URI image, as image-heavy posts are.
+    The fake Drive runs in its own process so its allocations are not traced.
+    """
+    import base64
+    import socket
+    import tempfile
+    from googleapiclient.http import MediaInMemoryUpload
+    from drive_client import build_drive_service, download_to_file, DOCX_MIMETYPE
+
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    endpoint = f'http://127.0.0.1:{port}/'
+
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        fake_drive = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_drive.py')
+        server = subprocess.Popen([sys.executable, fake_drive, '--port', str(port), '--raw-folder', folder],
+                                  stdout=subprocess.DEVNULL)
+        service = build_drive_service(endpoint=endpoint)
+        try:
+            for _ in range(50):  # wait for the server to listen
+                try:
+                    socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+                    break
+                except OSError:
+                    time.sleep(0.1)
+            for size_mb in sizes_mb:
+                html = generate_export_html(SIZES['small'], seed=size_mb)
+                padding = base64.b64encode(os.urandom(size_mb * 2**20 * 3 // 4)).decode('ascii')
+                html = html.replace('</body>', f'<p><img src="data:image/png;base64,{padding}"></p></body>')
+                with open(os.path.join(folder, f'{size_mb}mb.html'), 'w', encoding='utf-8') as f:
+                    f.write(html)
+                del html, padding
+                media = MediaInMemoryUpload(b'', mimetype=DOCX_MIMETYPE)
+                file_id = service.files().create(body={'name': f'{size_mb}mb.docx'}, media_body=media,
+                                                 fields='id').execute()['id']
+                raw_path = os.path.join(folder, 'export.html')
+
+                def _in_memory():
+                    data = service.files().export(fileId=file_id, mimeType='text/html').execute()
+                    text = data.decode('utf-8')
+                    with open(raw_path, 'w', encoding='utf-8') as f:
+                        f.write(text)
+
+                def _streamed():
+                    request = service.files().export_media(fileId=file_id, mimeType='text/html')
+                    download_to_file(request, raw_path)
+
+                for strategy, function in (('memory', _in_memory), ('streamed', _streamed)):
+                    timings = []
+                    for _ in range(repeat):
+                        started = time.perf_counter()
+                        function()
+                        timings.append(time.perf_counter() - started)
+                    tracemalloc.start()
+                    try:
+                        function()
+                        _, peak = tracemalloc.get_traced_memory()
+                    finally:
+                        tracemalloc.stop()
+                    results[f'export.{strategy}.{size_mb}mb'] = {
+                        'mean_ms': round(sum(timings) / len(timings) * 1000, 3),
+                        'min_ms': round(min(timings) * 1000, 3),
+                        'peak_mb': round(peak / 1e6, 3),
+                    }
+        finally:
+            server.terminate()
+            server.wait()
+    return results
+
+def run_benchmarks(sizes, functions, docs_per_size=3, repeat=2):
+    """Benchmark each function for each size preset; returns {'<function>.<size>': result}"""
+    tags_list = list(DEFAULT_TAGS)
+    tags_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Tags.txt')
+    if os.path.exists(tags_file):
+        tags_list += [tag for tag in load_tags(tags_file) if tag not in tags_list]
+
+    results = {}
+    for size in sizes:
+        paragraphs = SIZES[size]
+        formatted = [generate_export_html(paragraphs, seed=i) for i in range(docs_per_size)]
+        unformatted = [generate_export_html(paragraphs, marker=False, seed=i) for i in range(docs_per_size)]
+
+        if 'clean_html' in functions:
+            results[f'clean_html.{size}'] = measure(clean_html, formatted, repeat)
+        if 'clean_html_simple' in functions:
+            results[f'clean_html_simple.{size}'] = measure(clean_html_simple, unformatted, repeat)
+        if 'find_tags' in functions:
+            cleaned = [clean_html(doc) for doc in formatted]
+            results[f'find_tags.{size}'] = measure(lambda html: find_tags(html, tags_list), cleaned, repeat)
+        for name, result in results.items():
+            if name.endswith(f'.{size}'):
+                print(f"  {name:<28} {result['docs_per_s']:>9.2f} docs/s {result['mb_per_s']:>8.2f} MB/s "
+                      f"{result['peak_mb']:>8.2f} MB peak")
+
+    if 'upload' in functions:
+        upload_results = benchmark_upload()
+        for name, result in upload_results.items():
+            print(f"  {name:<28} {result['mean_ms']:>9.2f} ms mean {result['min_ms']:>8.2f} ms min")
+        results.update(upload_results)
+    if 'export' in functions:
+        export_results = benchmark_export()
+        for name, result in export_results.items():
+            print(f"  {name:<28} {result['mean_ms']:>9.2f} ms mean {result['peak_mb']:>8.2f} MB peak")
+        results.update(export_results)
+    return results
+
+def save_results(results, label, path=RESULTS_FILE):
+    """Append one run to the results file"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    record = {
+        'label': label,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'results': results,
+    }
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + '\n')
+    return record
+
+def load_results(path=RESULTS_FILE):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def compare(before, after):
+    """Print throughput/memory changes between two stored runs"""
+    print(f"before: {before['label']} ({before.get('revision')}, {before['timestamp']})")
+    print(f"after:  {after['label']} ({after.get('revision')}, {after['timestamp']})\n")
+    print(f"{'benchmark':<30}{'before':>12}{'after':>12}{'change':>10}")
+    for name, new in after['results'].items():
+        old = before['results'].get(name)
+        if not old:
+            continue
+        # Throughput benchmarks compare docs/s, upload benchmarks compare mean latency
+        key, higher_is_better = ('docs_per_s', True) if 'docs_per_s' in new else ('mean_ms', False)
+        if not old.get(key) or not new.get(key):
+            continue
+        change = (new[key] / old[key] - 1) * 100
+        if not higher_is_better:
+            change = -change
+        print(f"{name:<30}{old[key]:>12.2f}{new[key]:>12.2f}{change:>+9.1f}%")
+        if 'peak_mb' in new:
+            print(f"{'  peak MB':<30}{old['peak_mb']:>12.2f}{new['peak_mb']:>12.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark clean_html, clean_html_simple, find_tags, uploads and export downloads.")
+    parser.add_argument('--sizes', nargs='+', choices=sorted(SIZES), default=['small'])
+    parser.add_argument('--functions', nargs='+',
+                        choices=['clean_html', 'clean_html_simple', 'find_tags', 'upload', 'export'],
+                        default=['clean_html', 'clean_html_simple', 'find_tags'])
+    parser.add_argument('--docs', type=int, default=3, help="documents per size (default: 3)")
+    parser.add_argument('--repeat', type=int, default=2, help="timed repeats, fastest is kept (default: 2)")
+    parser.add_argument('--label', default=None, help="name stored with the results (default: git revision)")
+    parser.add_argument('--results', default=RESULTS_FILE, help=f"results file (default: {RESULTS_FILE})")
+    parser.add_argument('--no-save', action='store_true', help="do not store the results")
+    parser.add_argument('--compare', nargs='*', metavar='LABEL',
+                        help="compare two stored runs by label (default: the last two) and exit")
+    parser.add_argument('--generate', metavar='FILE',
+                        help="write one synthetic export (first --sizes entry) to FILE and exit")
+    args = parser.parse_args()
+
+    if args.generate:
+        with open(args.generate, 'w', encoding='utf-8') as f:
+            f.write(generate_export_html(SIZES[args.sizes[0]]))
+        print(f"Saved synthetic export -> {args.generate}")
+        return 0
+
+    if args.compare is not None:
+        runs = load_results(args.results)
+        if args.compare:
+            by_label = {run['label']: run for run in runs}
+            missing = [label for label in args.compare[:2] if label not in by_label]
+            if missing or len(args.compare) < 2:
+                print(f"Error: need two stored labels, missing: {', '.join(missing) or 'second label'}")
+                return 1
+            before, after = by_label[args.compare[0]], by_label[args.compare[1]]
+        elif len(runs) >= 2:
+            before, after = runs[-2], runs[-1]
+        else:
+            print(f"Error: need at least two runs in {args.results}")
+            return 1
+        compare(before, after)
+        return 0
+
+    print(f"Benchmarking ({', '.join(args.functions)}) on {', '.join(args.sizes)} documents...")
+    results = run_benchmarks(args.sizes, args.functions, args.docs, args.repeat)
+    if not args.no_save:
+        record = save_results(results, args.label or _git_revision() or 'unlabelled', args.results)
+        print(f"\nSaved results as '{record['label']}' -> {args.results}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,6 +8,7 @@ import os
 import sys
 import json
 import threading
+import multiprocessing
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from pathlib import Path
@@ -26,8 +27,8 @@ def get_resource_path(relative_path):
 
 # Import the conversion functions from convert_blog
 try:
-    from convert_blog import get_credentials, convert_docx_to_html, OUTPUT_FOLDER, RAW_FOLDER
-    from googleapiclient.discovery import build
+    from convert_blog import get_credentials, convert_docx_to_html, OUTPUT_FOLDER, RAW_FOLDER, DRIVE_ENDPOINT
+    from drive_client import DriveCleanupQueue, DriveThrottle, build_drive_service, PENDING_DELETES_FILE
 except ImportError as e:
     print(f"Error importing convert_blog module: {e}")
     print("Make sure convert_blog.py is in the same directory as this script.")
@@ -197,6 +198,14 @@ Find: Locate an existing DPPBlogBuilder installation"""
             if source_tagfinder.exists():
                 shutil.copy2(source_tagfinder, project_folder / "tagFinder.py")
 
+            # Copy the modules imported by convert_blog.py and the posts' stylesheet
+            for module_name in ("drive_client.py", "run_metrics.py", "url_rewrites.py", "todo_watcher.py",
+                                "build_manifest.py", "async_drive.py", "blog_images.py", "output_writer.py",
+                                "cms_export.py", "blog_template.py", "blog_style.css"):
+                source_module = Path(__file__).parent / module_name
+                if source_module.exists():
+                    shutil.copy2(source_module, project_folder / module_name)
+
             # Create README.md (will be created separately)
             readme_path = project_folder / "README.md"
             if not readme_path.exists():
@@ -399,7 +408,7 @@ Find: Locate an existing DPPBlogBuilder installation"""
         """Start the conversion process in a separate thread"""
         # Check for client_secret.json
         client_secret_path = Path(self.project_folder) / "client_secret.json"
-        if not client_secret_path.exists():
+        if not DRIVE_ENDPOINT and not client_secret_path.exists():
             messagebox.showerror("Missing Credentials",
                                "client_secret.json not found!\n\n" +
                                "Please add your Google API credentials to:\n" +
@@ -454,19 +463,26 @@ Find: Locate an existing DPPBlogBuilder installation"""
             sys.stdout = StreamCapture(self.update_status)
 
             try:
-                # Get credentials
-                self.update_status("Authenticating with Google...\n")
+                if DRIVE_ENDPOINT:
+                    # Local stand-in server (fake_drive.py), no Google account needed
+                    self.update_status(f"Using Drive endpoint {DRIVE_ENDPOINT}\n\n")
+                    creds = None
+                else:
+                    # Get credentials
+                    self.update_status("Authenticating with Google...\n")
+
+                    # Check if token exists (first time setup)
+                    token_path = Path(self.project_folder) / "token.pickle"
+                    if not token_path.exists():
+                        self.update_status("First-time setup: Browser will open for authentication...\n")
+                        self.update_status("Please log in and grant access in your browser.\n\n")
 
-                # Check if token exists (first time setup)
-                token_path = Path(self.project_folder) / "token.pickle"
-                if not token_path.exists():
-                    self.update_status("First-time setup: Browser will open for authentication...\n")
-                    self.update_status("Please log in and grant access in your browser.\n\n")
+                    creds = get_credentials()
 
-                creds = get_credentials()
-                drive_service = build("drive", "v3", credentials=creds)
+                drive_service = build_drive_service(creds, DRIVE_ENDPOINT)
 
-                self.update_status("✓ Authentication successful!\n\n")
+                if creds:
+                    self.update_status("✓ Authentication successful!\n\n")
 
                 # Get folders
                 input_folder = Path(self.project_folder) / "todo"
@@ -480,32 +496,48 @@ Find: Locate an existing DPPBlogBuilder installation"""
                 self.update_status("Starting conversion...\n")
                 self.update_status("-" * 60 + "\n\n")
 
+                # Retry rate-limited and failed Drive calls with backoff
+                throttle = DriveThrottle()
+
+                # Temp Google Docs are deleted in batches in the background
+                cleanup_queue = DriveCleanupQueue(
+                    lambda: build_drive_service(creds, DRIVE_ENDPOINT),
+                    pending_file=str(Path(self.project_folder) / PENDING_DELETES_FILE),
+                    throttle=throttle
+                )
+
                 # Process each .docx file
-                for filename in os.listdir(input_folder):
-                    if filename.lower().endswith(".docx"):
-                        input_path = input_folder / filename
-                        self.update_status(f"Processing: {filename}\n")
-                        try:
-                            html_path, tags = convert_docx_to_html(
-                                drive_service, str(input_path),
-                                str(output_folder), str(raw_folder),
-                                str(tags_file) if tags_file.exists() else None
-                            )
-                            # Success - add checkmark
-                            self.update_status(f"  ✓ SUCCESS: {filename} converted\n\n")
-
-                            # Store result for display
-                            self.conversion_results.append((filename, html_path, tags))
-
-                            # Update progress bar
-                            self.completed_files += 1
-                            self.root.after(0, lambda: self.progress_bar.config(value=self.completed_files))
-                        except Exception as e:
-                            # Failure - add red X
-                            self.update_status(f"  ✗ FAILED: {filename}\n")
-                            self.update_status(f"     Error: {e}\n\n")
-                            self.completed_files += 1
-                            self.root.after(0, lambda: self.progress_bar.config(value=self.completed_files))
+                with cleanup_queue:
+                    for filename in os.listdir(input_folder):
+                        if filename.lower().endswith(".docx"):
+                            input_path = input_folder / filename
+                            self.update_status(f"Processing: {filename}\n")
+                            stats = {'retries': 0}
+                            try:
+                                html_path, tags = convert_docx_to_html(
+                                    drive_service, str(input_path),
+                                    str(output_folder), str(raw_folder),
+                                    str(tags_file) if tags_file.exists() else None,
+                                    cleanup_queue=cleanup_queue,
+                                    throttle=throttle,
+                                    stats=stats
+                                )
+                                # Success - add checkmark
+                                retry_note = f" after {stats['retries']} retries" if stats['retries'] else ""
+                                self.update_status(f"  ✓ SUCCESS: {filename} converted{retry_note}\n\n")
+
+                                # Store result for display
+                                self.conversion_results.append((filename, html_path, tags))
+
+                                # Update progress bar
+                                self.completed_files += 1
+                                self.root.after(0, lambda: self.progress_bar.config(value=self.completed_files))
+                            except Exception as e:
+                                # Failure - add red X
+                                self.update_status(f"  ✗ FAILED: {filename}\n")
+                                self.update_status(f"     Error: {e}\n\n")
+                                self.completed_files += 1
+                                self.root.after(0, lambda: self.progress_bar.config(value=self.completed_files))
 
                 self.update_status("-" * 60 + "\n")
                 self.update_status("✓ ALL FILES PROCESSED!\n\n")
@@ -667,4 +699,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # Needed in the frozen executable for documents cleaned in a separate process
+    multiprocessing.freeze_support()
     main()
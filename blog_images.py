@@ -0,0 +1,314 @@
+# blog_images.py
+
+# Moves images out of exported HTML into files in the post's folder: base64 data: URIs pasted
+# into drafts are decoded once, written by content hash and referenced by a relative path, and
+# (optionally) remote images are downloaded through a shared disk cache and linked the same way.
+
+import os
+import re
+import time
+import base64
+import hashlib
+import binascii
+import threading
+import urllib.error
+import urllib.request
+from io import BytesIO
+from html import unescape
+from collections import namedtuple
+from urllib.parse import unquote_to_bytes, urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from output_writer import OutputWriter
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+IMAGES_FOLDER = 'images'      # subfolder of the blog folder, also the prefix of rewritten src values
+PLACEHOLDER_SRC = 'data:,'    # an empty data URI left in place of a dropped payload
+IMAGE_QUALITY = 85            # JPEG/WebP quality used when recompressing
+IMAGE_WORKERS = os.cpu_count() or 1
+IMAGE_CACHE_FOLDER = 'image_cache'  # downloaded images, shared by every post and run
+IMAGE_FETCH_WORKERS = 8       # downloads in progress at once, per process
+FETCH_TIMEOUT = 30            # seconds for one download
+FETCH_ATTEMPTS = 3            # tries per image for timeouts, 429s and 5xx responses
+MAX_IMAGE_BYTES = 50 * 1024 * 1024
+MIME_EXTENSIONS = {
+    'image/png': '.png',
+    'image/jpeg': '.jpg',
+    'image/jpg': '.jpg',
+    'image/gif': '.gif',
+    'image/webp': '.webp',
+    'image/bmp': '.bmp',
+    'image/svg+xml': '.svg',
+}
+RECOMPRESS_FORMATS = {'.png': 'PNG', '.jpg': 'JPEG', '.webp': 'WEBP'}  # GIF (animation) and SVG are kept as is
+
+# The start of src="data:image/png;base64,...." inside an <img> tag, up to the payload. The payload
+# can be megabytes long, so its closing quote is found with str.find rather than by the regex
+DATA_URI_IMAGE_START = re.compile(
+    r'''(<img\b[^>]*?\ssrc\s*=\s*)(["'])data:([\w.+-]+/[\w.+-]+)?((?:;[^,"'>]*)?),''',
+    re.IGNORECASE)
+# src="https://lh3.googleusercontent.com/..." inside an <img> tag
+REMOTE_IMAGE = re.compile(r'''(<img\b[^>]*?\ssrc\s*=\s*)(["'])(https?://[^"'>]+)\2''', re.IGNORECASE)
+
+# What to do with a post's images (picklable, so it can be sent to cleaning processes)
+#   folder: where the post's images are saved; None drops embedded images
+#   recompress: re-encode saved images with Pillow
+#   fetch_remote: also download remote images into folder, through the cache in cache_folder
+#   endpoint: root URL remote image requests go to instead of their own host (e.g. fake_drive.py)
+ImageOptions = namedtuple('ImageOptions', ['folder', 'recompress', 'fetch_remote', 'cache_folder', 'endpoint'],
+                          defaults=(False, False, IMAGE_CACHE_FOLDER, None))
+
+# Writes images atomically and creates each images folder once per process
+_writer = OutputWriter()
+
+# ==== EXTRACTION ====
+
+def is_local_image(src):
+    """True for src values that point into the post's images folder"""
+    return bool(src) and src.startswith(IMAGES_FOLDER + '/')
+
+def decode_data_uri(mime_type, parameters, payload):
+    """(bytes, extension) of a data URI image, or None if it isn't a usable image"""
+    extension = MIME_EXTENSIONS.get((mime_type or '').lower())
+    if extension is None:
+        return None
+    try:
+        if ';base64' in parameters.lower():
+            data = base64.b64decode(re.sub(r'\s+', '', payload), validate=True)
+        else:
+            data = unquote_to_bytes(payload)
+    except (binascii.Error, ValueError):
+        return None
+    return (data, extension) if data else None
+
+def image_file_name(data, extension):
+    """Content-addressed file name, so identical images share one file"""
+    return hashlib.sha256(data).hexdigest()[:16] + extension
+
+def extract_images(raw_html, options=None):
+    """
+    Take the images out of raw_html before it is parsed, so data: URI payloads are never part
+    of the parse tree. With options (an ImageOptions), each distinct image is written to
+    options.folder once, named by its content hash, and its src becomes images/<file>:
+    - data: URI images are decoded (ones that can't be are dropped),
+    - with options.fetch_remote, remote images are downloaded through an ImageFetcher
+      (ones that fail keep their URL).
+    Without options, data: URI payloads are dropped (the cleaner strips such src values
+    anyway) and remote images are left alone.
+    """
+    images_folder = options.folder if options is not None else None
+    pending = {}  # file name -> bytes, for images not yet in images_folder
+    html = replace_data_uri_images(raw_html, images_folder, pending)
+    if images_folder is not None and options.fetch_remote:
+        html = replace_remote_images(html, options, pending)
+    if pending:
+        write_images(images_folder, pending, options.recompress)
+    return html
+
+def _claim_image(images_folder, data, extension, pending):
+    """Queue an image for images_folder unless it is already there; returns its relative src"""
+    name = image_file_name(data, extension)
+    if name not in pending and not os.path.exists(os.path.join(images_folder, name)):
+        pending[name] = data
+    return f"{IMAGES_FOLDER}/{name}"
+
+def replace_data_uri_images(raw_html, images_folder, pending):
+    """
+    raw_html with each data: URI image's src replaced by images/<file> (its bytes queued in
+    pending), or by PLACEHOLDER_SRC without images_folder or if it can't be decoded
+    """
+    if 'data:' not in raw_html:
+        return raw_html
+    parts = []
+    position = 0
+    while True:
+        match = DATA_URI_IMAGE_START.search(raw_html, position)
+        if match is None:
+            break
+        prefix, quote, mime_type, parameters = match.groups()
+        end = raw_html.find(quote, match.end())
+        if end < 0:
+            break
+        src = PLACEHOLDER_SRC
+        if images_folder is not None:
+            decoded = decode_data_uri(mime_type, parameters, raw_html[match.end():end])
+            if decoded is not None:
+                src = _claim_image(images_folder, *decoded, pending)
+        parts.append(raw_html[position:match.start()])
+        parts.append(f"{prefix}{quote}{src}")
+        position = end
+    if not parts:
+        return raw_html
+    parts.append(raw_html[position:])
+    return ''.join(parts)
+
+def replace_remote_images(html, options, pending):
+    """html with each remote image's src replaced by images/<file> of its downloaded copy"""
+    urls = {unescape(match.group(3)) for match in REMOTE_IMAGE.finditer(html)}
+    if not urls:
+        return html
+    fetcher = get_image_fetcher(options.cache_folder, options.endpoint)
+    sources = {}
+    for url, name in fetcher.fetch_all(urls).items():
+        if name is not None:
+            with open(fetcher.cache_path(name), 'rb') as f:
+                sources[url] = _claim_image(options.folder, f.read(), os.path.splitext(name)[1], pending)
+
+    def _replace(match):
+        src = sources.get(unescape(match.group(3)))
+        return f"{match.group(1)}{match.group(2)}{src}{match.group(2)}" if src else match.group(0)
+
+    return REMOTE_IMAGE.sub(_replace, html)
+
+def write_images(images_folder, images, recompress=False):
+    """Write {file name: bytes} into images_folder, recompressing each first if asked"""
+    items = list(images.items())
+    if recompress and Image is not None and len(items) > 1:
+        # Pillow releases the GIL while encoding and decoding, so threads use several cores
+        with ThreadPoolExecutor(max_workers=min(IMAGE_WORKERS, len(items))) as pool:
+            items = list(pool.map(_recompressed_item, items))
+    elif recompress:
+        items = [_recompressed_item(item) for item in items]
+    _writer.write_files({os.path.join(images_folder, name): data for name, data in items})
+    print(f"Saved {len(items)} image(s) -> {images_folder}")
+
+# ==== REMOTE IMAGES ====
+
+class ImageFetchError(Exception):
+    """A remote image could not be downloaded"""
+
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+class ImageFetcher:
+    """
+    Downloads remote images, at most `workers` at a time, into a disk cache shared by every
+    post, process and run:
+        cache_folder/<content hash>.<ext>   the image, so identical images are stored once
+        cache_folder/urls/<URL hash>        the name of the image file the URL downloaded to
+    A URL already in the cache is not downloaded again. With endpoint, requests go to endpoint
+    plus the URL's path and query instead of the URL's own host (e.g. a fake_drive.py server).
+    """
+
+    def __init__(self, cache_folder=IMAGE_CACHE_FOLDER, endpoint=None, workers=IMAGE_FETCH_WORKERS,
+                 timeout=FETCH_TIMEOUT, attempts=FETCH_ATTEMPTS):
+        self.cache_folder = cache_folder
+        self.endpoint = endpoint.rstrip('/') if endpoint else None
+        self.timeout = timeout
+        self.attempts = attempts
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-fetch")
+
+    def cache_path(self, name):
+        return os.path.join(self.cache_folder, name)
+
+    def _url_path(self, url):
+        return os.path.join(self.cache_folder, 'urls', hashlib.sha256(url.encode('utf-8')).hexdigest())
+
+    def cached(self, url):
+        """File name of url's cached copy, or None if it hasn't been downloaded"""
+        try:
+            with open(self._url_path(url), 'r', encoding='utf-8') as f:
+                name = f.read().strip()
+        except OSError:
+            return None
+        return name if name and os.path.exists(self.cache_path(name)) else None
+
+    def fetch_all(self, urls):
+        """{url: cached file name, or None if it failed} for every URL, downloaded concurrently"""
+        futures = {url: self.pool.submit(self.fetch, url) for url in urls}
+        return {url: future.result() for url, future in futures.items()}
+
+    def fetch(self, url):
+        """File name of url's cached copy, downloading it first if needed; None if that fails"""
+        name = self.cached(url)
+        if name is not None:
+            return name
+        try:
+            data, extension = self.download(url)
+        except ImageFetchError as e:
+            print(f"Warning: could not download image {url}: {e}")
+            return None
+        name = image_file_name(data, extension)
+        if not os.path.exists(self.cache_path(name)):
+            _writer.write(self.cache_path(name), data)
+        _writer.write(self._url_path(url), name)
+        return name
+
+    def request_url(self, url):
+        if self.endpoint is None:
+            return url
+        parts = urlsplit(url)
+        return self.endpoint + parts.path + (f"?{parts.query}" if parts.query else '')
+
+    def download(self, url):
+        """(bytes, extension) of the image at url, retrying timeouts, 429s and 5xx responses"""
+        for attempt in range(self.attempts):
+            try:
+                return self._download_once(url)
+            except ImageFetchError as e:
+                if not e.retryable or attempt + 1 >= self.attempts:
+                    raise
+            time.sleep(0.5 * 2 ** attempt)
+
+    def _download_once(self, url):
+        request = urllib.request.Request(self.request_url(url), headers={'User-Agent': 'DPPBlogConvert'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                mime_type = response.headers.get_content_type()
+                data = response.read(MAX_IMAGE_BYTES + 1)
+        except urllib.error.HTTPError as e:
+            raise ImageFetchError(f"HTTP {e.code}", retryable=e.code == 429 or e.code >= 500)
+        except OSError as e:  # URLError, timeouts and dropped connections
+            raise ImageFetchError(str(getattr(e, 'reason', e)), retryable=True)
+        extension = MIME_EXTENSIONS.get(mime_type)
+        if extension is None:
+            raise ImageFetchError(f"not an image ({mime_type})")
+        if not data:
+            raise ImageFetchError("empty response")
+        if len(data) > MAX_IMAGE_BYTES:
+            raise ImageFetchError(f"larger than {MAX_IMAGE_BYTES // 2**20} MB")
+        return data, extension
+
+_fetchers = {}
+_fetchers_lock = threading.Lock()
+
+def get_image_fetcher(cache_folder=IMAGE_CACHE_FOLDER, endpoint=None):
+    """This process's ImageFetcher for cache_folder and endpoint, so one pool bounds every document"""
+    with _fetchers_lock:
+        key = (cache_folder, endpoint)
+        if key not in _fetchers:
+            _fetchers[key] = ImageFetcher(cache_folder, endpoint)
+        return _fetchers[key]
+
+# ==== RECOMPRESSION ====
+
+def _recompressed_item(item):
+    name, data = item
+    return name, recompress_image(data, os.path.splitext(name)[1])
+
+def recompress_image(data, extension, quality=IMAGE_QUALITY):
+    """
+    The image re-encoded with Pillow (optimized PNG, or JPEG/WebP at quality), or the
+    original bytes if Pillow is missing, the format is not recompressed, or it got larger.
+    """
+    image_format = RECOMPRESS_FORMATS.get(extension)
+    if Image is None or image_format is None:
+        return data
+    try:
+        with Image.open(BytesIO(data)) as image:
+            options = {'optimize': True}
+            if image_format in ('JPEG', 'WEBP'):
+                options['quality'] = quality
+                if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+                    image = image.convert('RGB')
+            output = BytesIO()
+            image.save(output, image_format, **options)
+    except Exception as e:
+        print(f"Warning: could not recompress image: {e}")
+        return data
+    smaller = output.getvalue()
+    return smaller if len(smaller) < len(data) else data
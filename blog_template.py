@@ -0,0 +1,66 @@
+# blog_template.py
+
+# The stylesheet and wrapper around every converted post, defined once in blog_style.css and
+# prepared once per process: minified and either inlined as a <style> block or linked.
+
+import os
+import re
+
+STYLESHEET_FILE = 'blog_style.css'
+STYLESHEET_NAME = 'blog-style.css'  # file written next to the posts for linked stylesheets
+CONTENT_CLASS = 'blog-content'
+
+# ==== CSS ====
+
+def minify_css(css):
+    """
+    css without comments and insignificant whitespace. Spaces around + and ~ and before : are
+    kept, since they matter in calc() and in selectors like '.post :hover'.
+    """
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    return css.replace(';}', '}').strip()
+
+def default_stylesheet_path():
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), STYLESHEET_FILE)
+
+# ==== TEMPLATE ====
+
+class BlogTemplate:
+    """
+    Wraps a post's body in the shared stylesheet and <div class="blog-content">. The
+    header is built once: the minified CSS in a <style> block, or with stylesheet_url a
+    <link> to it, so each post carries only its own content. Serializers write just the
+    body and call render().
+    """
+
+    def __init__(self, css, stylesheet_url=None, minify=True, source_path=None):
+        self.css = minify_css(css) if minify else css
+        self.stylesheet_url = stylesheet_url
+        self.source_path = source_path
+        if stylesheet_url:
+            self.header = f'<link rel="stylesheet" href="{stylesheet_url}">\n'
+        else:
+            self.header = f'<style>{self.css}</style>\n'
+        self.opening = f'{self.header}<div class="{CONTENT_CLASS}">\n'
+        self.closing = '</div>\n'
+
+    def render(self, body):
+        """The complete post for body (its serialized elements)"""
+        return f'{self.opening}{body}{self.closing}'
+
+def load_blog_template(path=None, stylesheet_url=None, minify=True):
+    """BlogTemplate for the stylesheet at path (default: blog_style.css next to this file)"""
+    path = path or default_stylesheet_path()
+    with open(path, 'r', encoding='utf-8') as f:
+        return BlogTemplate(f.read(), stylesheet_url, minify, path)
+
+# <style>...</style> or <link rel="stylesheet"> at the start of a converted post
+_HEADER = re.compile(r'\s*(?:<style\b[^>]*>.*?</style>|<link\b[^>]*>)\s*', re.S | re.I)
+
+def post_body(html):
+    """A converted post without its leading stylesheet, so only its text is tagged"""
+    match = _HEADER.match(html)
+    return html[match.end():] if match else html
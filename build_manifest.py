@@ -0,0 +1,97 @@
+# build_manifest.py
+
+# Records what produced each converted post so reruns only redo the stages whose inputs changed.
+
+import os
+import json
+import hashlib
+import threading
+
+MANIFEST_FILE = 'build_manifest.json'
+MANIFEST_VERSION = 1
+
+# Actions returned by BuildManifest.plan, from most to least work
+CONVERT = 'convert'  # new or changed .docx: upload, export, clean, tag
+CLEAN = 'clean'      # cleanup code (or the raw export) changed: re-clean the saved raw export and tag
+TAG = 'tag'          # tag list or tag finder changed: re-tag the saved cleaned HTML
+SKIP = 'skip'        # everything is up to date
+
+# ==== HASHING ====
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """sha256 hex digest of a file's contents, or None if it doesn't exist"""
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+def text_hash(text):
+    """sha256 hex digest of a string as UTF-8"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def combined_hash(paths=(), texts=()):
+    """One digest over several files (missing ones count as empty) and strings"""
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.basename(path).encode('utf-8'))
+        digest.update((file_hash(path) or '').encode('ascii'))
+    for text in texts:
+        digest.update(text_hash(text).encode('ascii'))
+    return digest.hexdigest()
+
+# ==== MANIFEST ====
+
+class BuildManifest:
+    """
+    Per-document record of the hashes of every input and output of a conversion:
+    the .docx source, the raw export, the cleaner version, the tagger version (tag list
+    and tag finder), and the cleaned HTML and tags.txt written. Saved as JSON after every
+    change, with an atomic replace so an interrupted run never leaves a broken manifest.
+    """
+
+    def __init__(self, path=MANIFEST_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self.documents = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                self.documents = data.get('documents', {})
+        except FileNotFoundError:
+            pass
+        except (ValueError, OSError) as e:
+            print(f"Warning: ignoring unreadable build manifest {path}: {e}")
+
+    def plan(self, name, source_hash, raw_path, html_path, tags_path, cleaner_version, tagger_version):
+        """Which stages must be redone for document `name` (CONVERT, CLEAN, TAG or SKIP)"""
+        with self._lock:
+            entry = self.documents.get(name)
+        if entry is None or entry.get('source_hash') != source_hash:
+            return CONVERT
+        if file_hash(raw_path) != entry.get('raw_hash'):
+            return CONVERT if not os.path.exists(raw_path) else CLEAN
+        if entry.get('cleaner_version') != cleaner_version or file_hash(html_path) != entry.get('html_hash'):
+            return CLEAN
+        if entry.get('tagger_version') != tagger_version or (
+                entry.get('tags_hash') is not None and file_hash(tags_path) != entry.get('tags_hash')):
+            return TAG
+        return SKIP
+
+    def record(self, name, **fields):
+        """Update document `name` with fields and save the manifest"""
+        with self._lock:
+            self.documents.setdefault(name, {}).update(fields)
+            self._save()
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'documents': self.documents}, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
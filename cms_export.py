@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+CMS Export - Streams converted posts into one NDJSON or CSV file for bulk import
+One record per post (title, slug, body HTML, tags, source file and hash), written as each post finishes
+"""
+
+import os
+import re
+import sys
+import csv
+import json
+import argparse
+import threading
+import unicodedata
+
+from build_manifest import MANIFEST_FILE
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+FIELDS = ['title', 'slug', 'body_html', 'tags', 'source', 'source_hash']
+OUTPUT_FOLDER = 'output_html'  # convert_blog.OUTPUT_FOLDER
+
+
+def slugify(title):
+    """URL handle for a title: 'Diesel Tips: Part 2' -> 'diesel-tips-part-2'"""
+    ascii_title = unicodedata.normalize('NFKD', title).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]+', '-', ascii_title.lower()).strip('-')
+
+
+def detect_format(path, requested=None):
+    """requested, or the format implied by path's extension (.csv is CSV, anything else NDJSON)"""
+    if requested:
+        return requested
+    return 'csv' if path.lower().endswith('.csv') else 'ndjson'
+
+
+def read_tags(tags_path):
+    """Tags from a post's tags.txt (one per line), or [] if it has none"""
+    try:
+        with open(tags_path, 'r', encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+class CmsExport:
+    """
+    Export file that posts are appended to one at a time, so memory stays flat however many
+    posts there are. Each record is flushed as soon as it is written; threads may share one.
+    NDJSON records have tags as a list; CSV has a header row and comma-separated tags.
+    """
+
+    def __init__(self, path, export_format=None):
+        self.path = path
+        self.format = detect_format(path, export_format)
+        if self.format not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format {self.format!r} (expected {' or '.join(EXPORT_FORMATS)})")
+        self.count = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, 'w', encoding='utf-8', newline='')
+        self._csv = None
+        if self.format == 'csv':
+            self._csv = csv.DictWriter(self._file, fieldnames=FIELDS)
+            self._csv.writeheader()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def add(self, title, body_html, tags, source=None, source_hash=None):
+        """Write one post"""
+        record = {'title': title, 'slug': slugify(title), 'body_html': body_html, 'tags': list(tags or []),
+                  'source': source, 'source_hash': source_hash}
+        with self._lock:
+            if self._csv is not None:
+                self._csv.writerow(dict(record, tags=', '.join(record['tags']),
+                                        source=source or '', source_hash=source_hash or ''))
+            else:
+                self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._file.flush()
+            self.count += 1
+
+    def add_files(self, title, html_path, tags_path, source=None, source_hash=None):
+        """Write one post from its saved cleaned HTML and tags.txt"""
+        with open(html_path, 'r', encoding='utf-8') as f:
+            body_html = f.read()
+        self.add(title, body_html, read_tags(tags_path), source, source_hash)
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def load_sources(manifest_path):
+    """{post name: (source file, source hash)} from a build manifest, or {} without one"""
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            documents = json.load(f).get('documents', {})
+    except (OSError, ValueError):
+        return {}
+    return {os.path.splitext(name)[0]: (name, entry.get('source_hash')) for name, entry in documents.items()}
+
+
+def export_folder(output_folder, path, export_format=None, manifest_path=None):
+    """
+    Export every post already converted into output_folder (blog folders holding
+    <post>.html and tags.txt), in name order. Source files and hashes come from the build
+    manifest when there is one. Returns the number of posts written.
+    """
+    sources = load_sources(manifest_path) if manifest_path else {}
+    with CmsExport(path, export_format) as export:
+        for folder_name in sorted(os.listdir(output_folder)):
+            blog_folder = os.path.join(output_folder, folder_name)
+            if not os.path.isdir(blog_folder):
+                continue
+            for filename in sorted(os.listdir(blog_folder)):
+                if not filename.lower().endswith('.html'):
+                    continue
+                title = os.path.splitext(filename)[0]
+                source, source_hash = sources.get(title, (None, None))
+                export.add_files(title, os.path.join(blog_folder, filename),
+                                 os.path.join(blog_folder, 'tags.txt'), source, source_hash)
+        return export.count
+
+
+def main():
+    script_folder = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(
+        description="Export converted posts to one NDJSON or CSV file for bulk import.")
+    parser.add_argument("output", help="file to write (.csv for CSV, anything else for NDJSON)")
+    parser.add_argument("--folder", default=os.path.join(script_folder, OUTPUT_FOLDER),
+                        help=f"folder of converted posts (default: {OUTPUT_FOLDER} next to this script)")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default=None,
+                        help="export format (default: from the output file's extension)")
+    parser.add_argument("--manifest", default=os.path.join(script_folder, MANIFEST_FILE),
+                        help=f"build manifest to read source hashes from (default: {MANIFEST_FILE})")
+    args = parser.parse_args()
+
+    count = export_folder(args.folder, args.output, args.format, args.manifest)
+    print(f"Exported {count} posts -> {args.output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Conversion Service - Local HTTP API for the HTML cleaner, tag finder and .docx converter
+Keeps a pool of cleaning processes started and warm (imports, tag catalog, link rewrites)
+so each request costs only the work itself
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import tempfile
+import argparse
+import threading
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from async_drive import AsyncDriveClient, DEFAULT_MAX_IN_FLIGHT
+from convert_blog import (clean_and_tag_in_pool, clean_html, export_docx_raw, export_docx_raw_async,
+                          get_credentials, start_clean_pool, tag_html, DEFAULT_CLEAN_PROCESSES, DRIVE_ENDPOINT)
+from drive_client import DriveCleanupQueue, DriveThrottle, build_drive_service, PENDING_DELETES_FILE
+
+DEFAULT_PORT = 8780
+MAX_BODY_BYTES = 64 * 2**20  # larger requests are refused with 413
+
+
+def worker_pid(hold=0.0):
+    """Run in a cleaning process: wait hold seconds and return the process ID"""
+    time.sleep(hold)
+    return os.getpid()
+
+
+class ConversionServer(ThreadingHTTPServer):
+    """
+    HTTP server owning the warm cleaning processes and, unless disabled, a Drive connection.
+
+    Args:
+        processes: Cleaning processes, all started (and warmed) before the server accepts requests
+        tags_file: Tag list merged with DEFAULT_TAGS for /tags, /clean?tags=1 and /convert
+        max_pending: Requests handled at once; further requests are answered 503 with Retry-After
+            instead of queueing without bound (default: twice the number of processes)
+        convert: Enable /convert, which uploads to Google Drive (or drive_endpoint)
+        drive_endpoint: Send Drive calls to this server (e.g. fake_drive.py) instead of Google
+        workers: Maximum /convert requests using Google Drive at once
+        async_drive: Make /convert's Drive calls with async_drive.AsyncDriveClient on one
+            event loop thread (needs aiohttp); workers then limits documents in flight
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, processes=DEFAULT_CLEAN_PROCESSES, tags_file=None, max_pending=None,
+                 convert=True, drive_endpoint=None, workers=4, async_drive=False):
+        super().__init__(address, ConversionHandler)
+        self.tags_file = tags_file
+        self.processes = max(1, processes)
+        self.max_pending = max_pending or 2 * self.processes
+        self.slots = threading.BoundedSemaphore(self.max_pending)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.stats = {'clean': 0, 'tags': 0, 'convert': 0, 'rejected': 0, 'errors': 0}
+
+        self.clean_pool = start_clean_pool(self.processes, tags_file)
+        self.worker_pids = self.prestart_workers()
+
+        self.drive_endpoint = drive_endpoint
+        self.throttle = None
+        self.cleanup_queue = None
+        self.loop = None
+        self.async_client = None
+        self._local = threading.local()
+        if convert:
+            self.creds = None if drive_endpoint else get_credentials()
+            self.throttle = DriveThrottle(max_concurrency=workers)
+            script_folder = os.path.dirname(os.path.abspath(__file__))
+            self.cleanup_queue = DriveCleanupQueue(
+                lambda: build_drive_service(self.creds, drive_endpoint),
+                pending_file=os.path.join(script_folder, PENDING_DELETES_FILE),
+                throttle=self.throttle,
+            )
+            self.cleanup_queue.start()
+            if async_drive:
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever, name="async-drive", daemon=True).start()
+                self.async_client = self.run_async(self._open_async_client(workers))
+
+    @property
+    def endpoint(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def prestart_workers(self, hold=0.2, max_hold=5.0):
+        """
+        Start and warm every cleaning process now rather than on the first requests. Tasks
+        submitted while no process is idle each start a new process; each task holds its
+        process for `hold` seconds so one early process can't answer them all, and the round
+        is repeated with a longer hold until every process has answered.
+        Returns the process IDs that answered.
+        """
+        pids = set()
+        while True:
+            futures = [self.clean_pool.submit(worker_pid, hold) for _ in range(self.processes)]
+            pids.update(future.result() for future in futures)
+            if len(pids) >= self.processes or hold >= max_hold:
+                return sorted(pids)
+            hold *= 2
+
+    def drive_service(self):
+        """This thread's Drive service (googleapiclient services are not thread-safe)"""
+        if not hasattr(self._local, 'drive_service'):
+            self._local.drive_service = build_drive_service(self.creds, self.drive_endpoint)
+        return self._local.drive_service
+
+    def run_async(self, coroutine):
+        """Run a coroutine on the async Drive loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    async def _open_async_client(self, workers):
+        return await AsyncDriveClient(self.creds, self.drive_endpoint, max_concurrency=workers,
+                                      shared_bucket=self.throttle.bucket).__aenter__()
+
+    async def _export_async(self, input_path, raw_folder):
+        async with self.async_client.slot():
+            return await export_docx_raw_async(self.async_client, input_path, raw_folder, self.cleanup_queue)
+
+    def export(self, input_path, raw_folder):
+        """Upload input_path and stream its HTML export into raw_folder; returns the export's path"""
+        if self.async_client is not None:
+            return self.run_async(self._export_async(input_path, raw_folder))
+        with self.throttle.concurrency.slot():
+            return export_docx_raw(self.drive_service(), input_path, raw_folder, self.cleanup_queue,
+                                   self.throttle)
+
+    def admit(self):
+        """Take a request slot; False if max_pending requests are already being handled"""
+        if not self.slots.acquire(blocking=False):
+            self.count('rejected')
+            return False
+        with self.lock:
+            self.in_flight += 1
+        return True
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+        self.slots.release()
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def close(self):
+        """Close the socket, stop the cleaning processes and flush pending Drive deletes"""
+        self.server_close()
+        self.clean_pool.shutdown()
+        if self.async_client is not None:
+            self.run_async(self.async_client.__aexit__(None, None, None))
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.cleanup_queue is not None:
+            self.cleanup_queue.close()
+
+
+class ConversionHandler(BaseHTTPRequestHandler):
+    """
+    GET  /health                 pool and request counters
+    POST /clean[?tags=1]         raw Drive export HTML -> cleaned HTML (JSON {html, tags} with tags=1)
+    POST /tags                   cleaned HTML -> JSON {tags}
+    POST /convert?name=Post.docx .docx bytes -> JSON {name, html, tags}
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass  # one line per request would drown the startup messages
+
+    # ---- helpers ----
+
+    def read_body(self):
+        """The request body, or None if it was too large (the 413 has been sent)"""
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_BYTES:
+            self.send_error_json(413, f"Request body over {MAX_BODY_BYTES // 2**20} MB")
+            self.close_connection = True
+            return None
+        return self.rfile.read(length) if length else b''
+
+    def read_text(self):
+        """The request body decoded as UTF-8, or None if the request was answered with an error"""
+        body = self.read_body()
+        if body is None:
+            return None
+        try:
+            return body.decode('utf-8')
+        except UnicodeDecodeError:
+            self.send_error_json(400, "Request body is not UTF-8 text")
+            return None
+
+    def send(self, status, body=b'', content_type='application/json', headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode('utf-8')
+        elif isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, message, headers=None):
+        self.send(status, {'error': {'code': status, 'message': message}}, headers=headers)
+
+    # ---- routing ----
+
+    def do_GET(self):
+        if urlparse(self.path).path != '/health':
+            return self.send_error_json(404, "Unknown endpoint")
+        server = self.server
+        with server.lock:
+            health = {'status': 'ok', 'processes': server.processes, 'worker_pids': server.worker_pids,
+                      'in_flight': server.in_flight, 'max_pending': server.max_pending,
+                      'convert_enabled': server.cleanup_queue is not None, **server.stats}
+        self.send(200, health)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        handlers = {'/clean': self.handle_clean, '/tags': self.handle_tags, '/convert': self.handle_convert}
+        handler = handlers.get(url.path)
+        if handler is None:
+            self.read_body()
+            return self.send_error_json(404, "Unknown endpoint")
+        if not self.server.admit():
+            self.close_connection = True
+            return self.send_error_json(503, "Too many requests in progress", {'Retry-After': '1'})
+        try:
+            handler(parse_qs(url.query))
+        except Exception as e:
+            self.server.count('errors')
+            self.send_error_json(500, str(e) or type(e).__name__)
+        finally:
+            self.server.release()
+
+    def handle_clean(self, query):
+        raw_html = self.read_text()
+        if raw_html is None:
+            return
+        server = self.server
+        server.count('clean')
+        if query.get('tags', ['0'])[0] not in ('', '0'):
+            cleaned_html, tags = clean_and_tag_in_pool(server.clean_pool, raw_html, server.tags_file)
+            return self.send(200, {'html': cleaned_html, 'tags': tags or []})
+        cleaned_html = server.clean_pool.submit(clean_html, raw_html).result()
+        self.send(200, cleaned_html, 'text/html; charset=utf-8')
+
+    def handle_tags(self, query):
+        cleaned_html = self.read_text()
+        if cleaned_html is None:
+            return
+        server = self.server
+        server.count('tags')
+        tags = server.clean_pool.submit(tag_html, cleaned_html, server.tags_file).result()
+        self.send(200, {'tags': tags or []})
+
+    def handle_convert(self, query):
+        server = self.server
+        if server.cleanup_queue is None:
+            self.read_body()
+            return self.send_error_json(404, "/convert is disabled (--no-convert)")
+        name = os.path.basename(query.get('name', ['document.docx'])[0]) or 'document.docx'
+        if not name.lower().endswith('.docx'):
+            name += '.docx'
+        data = self.read_body()
+        if data is None:
+            return
+        server.count('convert')
+
+        with tempfile.TemporaryDirectory(prefix='dpp-convert-') as work_folder:
+            input_path = os.path.join(work_folder, name)
+            with open(input_path, 'wb') as f:
+                f.write(data)
+            del data
+            raw_path = server.export(input_path, work_folder)
+            # The worker reads the export from disk, so it is never held by this process
+            cleaned_html, tags = clean_and_tag_in_pool(server.clean_pool, None, server.tags_file,
+                                                       raw_path=raw_path)
+        self.send(200, {'name': name, 'html': cleaned_html, 'tags': tags or []})
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve the HTML cleaner, tag finder and .docx converter over local HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--processes", type=int, default=DEFAULT_CLEAN_PROCESSES,
+                        help=f"cleaning processes kept warm (default: {DEFAULT_CLEAN_PROCESSES}, "
+                             "the number of CPUs)")
+    parser.add_argument("--max-pending", type=int, default=None, metavar="N",
+                        help="requests handled at once before answering 503 (default: twice --processes)")
+    script_folder = os.path.dirname(os.path.abspath(__file__))
+    parser.add_argument("--tags-file", default=os.path.join(script_folder, "Tags.txt"),
+                        help="tag list merged with DEFAULT_TAGS (default: Tags.txt next to this script)")
+    parser.add_argument("--no-convert", action="store_true",
+                        help="disable /convert, so no Google credentials are needed")
+    parser.add_argument("--drive-endpoint", default=DRIVE_ENDPOINT, metavar="URL",
+                        help="send /convert's Drive calls to this server (e.g. fake_drive.py) "
+                             "instead of Google")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="maximum /convert requests using Google Drive at once (default: 4, or "
+                             f"{DEFAULT_MAX_IN_FLIGHT} with --async-drive)")
+    parser.add_argument("--async-drive", action="store_true",
+                        help="make /convert's Drive calls with the asyncio client (needs aiohttp)")
+    args = parser.parse_args()
+    workers = args.workers or (DEFAULT_MAX_IN_FLIGHT if args.async_drive else 4)
+
+    print(f"Starting {args.processes} cleaning processes...")
+    server = ConversionServer(
+        (args.host, args.port), processes=args.processes, tags_file=args.tags_file,
+        max_pending=args.max_pending, convert=not args.no_convert, drive_endpoint=args.drive_endpoint,
+        workers=workers, async_drive=args.async_drive,
+    )
+    print(f"Conversion service listening on {server.endpoint} ({len(server.worker_pids)} warm processes)")
+    print(f"  curl --data-binary @raw_html/Post.html {server.endpoint}clean")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
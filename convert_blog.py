@@ -5,12 +5,34 @@
 import os
 import re
 import io
+import time
 import pickle
+import signal
+import asyncio
+import argparse
+import urllib.parse
+import functools
+import threading
+import tracemalloc
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from bs4 import BeautifulSoup, NavigableString, Tag
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
+from run_metrics import (DocumentMetrics, PassProfiler, RunMetrics, format_memory_summary, format_profile,
+                         format_summary, max_rss_bytes, observe, stage)
+from url_rewrites import RewriteMap
+from output_writer import OutputWriter, post_folder_name
+from cms_export import CmsExport, EXPORT_FORMATS
+from blog_template import load_blog_template, post_body, STYLESHEET_NAME
+from blog_images import (extract_images, is_local_image, ImageOptions, IMAGE_CACHE_FOLDER, IMAGE_FETCH_WORKERS,
+                         IMAGE_QUALITY, IMAGES_FOLDER)
+from async_drive import AsyncDriveClient, DEFAULT_CONNECTIONS, DEFAULT_MAX_IN_FLIGHT
+from build_manifest import BuildManifest, combined_hash, file_hash, MANIFEST_FILE, CONVERT, CLEAN, TAG, SKIP
+from todo_watcher import SettleTracker, create_watcher, file_signature, move_to_done, DONE_FOLDER, SETTLE_SECONDS
+from drive_client import (DriveCleanupQueue, DriveThrottle, build_drive_service, build_upload_media,
+                          download_to_file, execute_request, PENDING_DELETES_FILE, RESUMABLE_UPLOAD_THRESHOLD)
 
 # ==== CONFIGURATION ====
 
@@ -20,6 +42,34 @@ TOKEN_FILE = 'token.pickle'
 OUTPUT_FOLDER = 'output_html'
 RAW_FOLDER = 'raw_html'
 SAFE_ATTRS = {"href", "aria-level", "role", "class"}
+DEFAULT_WORKERS = 4  # maximum documents converted at once
+DEFAULT_CLEAN_PROCESSES = os.cpu_count() or 1  # processes cleaning and tagging exports
+OUTPUT_FSYNC = False  # flush every cleaned HTML and tags.txt to disk before moving on (slower, crash-safe)
+# Set to a fake_drive.py URL (e.g. http://127.0.0.1:8765/) to run without Google
+DRIVE_ENDPOINT = os.environ.get('DPP_DRIVE_ENDPOINT')
+# Documents whose estimated cleaning footprint (export size x SOUP_EXPANSION_FACTOR) exceeds
+# this many MB are cleaned in a separate short-lived process; None cleans everything in-process
+MEMORY_CEILING_MB = None
+SOUP_EXPANSION_FACTOR = 20  # BeautifulSoup trees take roughly 10-20x the HTML size
+# Link rewrite rules (exact, prefix and regex; see url_rewrites.py), added to DEFAULT_LINK_REWRITES
+LINK_REWRITES_FILE = 'link_rewrites.txt'
+DEFAULT_LINK_REWRITES = {
+    "https://www.dieselpowerproducts.com/t-contact.aspx": "https://dieselpowerproducts.com/pages/contact-us",
+}
+LINK_STYLE = 'color: #0000EE;'
+# Stylesheet shared by every post (see blog_template.py); None uses blog_style.css next to this script.
+# With STYLESHEET_URL posts link to the stylesheet instead of inlining it, and the minified CSS is
+# saved as blog-style.css in the output folder to be uploaded there
+STYLESHEET_PATH = None
+STYLESHEET_URL = os.environ.get('DPP_STYLESHEET_URL')
+# Images pasted into drafts (base64 data: URIs) are saved to <blog folder>/images/ instead of being
+# dropped; RECOMPRESS_IMAGES re-encodes them with Pillow first (see blog_images.py)
+EXTRACT_IMAGES = True
+RECOMPRESS_IMAGES = False
+# Download images the export links to (googleusercontent.com URLs expire) into images/ as well,
+# through a cache in IMAGE_CACHE_FOLDER; IMAGE_ENDPOINT sends the downloads to a stand-in server
+FETCH_REMOTE_IMAGES = False
+IMAGE_ENDPOINT = os.environ.get('DPP_IMAGE_ENDPOINT')
 DEFAULT_TAGS = [
     "allison6speedconversion",
     "autoenginuity",
@@ -148,6 +198,97 @@ def get_credentials():
             pickle.dump(creds, token)
     return creds
 
+# ==== STYLE ANALYSIS ====
+
+# Google Docs repeats a small set of identical style strings on thousands of spans, so each
+# distinct string is parsed once and looked up afterwards
+StyleFlags = namedtuple('StyleFlags', ['bold', 'italic', 'font_size_pt'])
+FONT_SIZE_PATTERN = re.compile(r'(\d+(?:\.\d+)?)pt$')
+HEADING_FONT_SIZES = (13.0, 14.0)  # bold text at these sizes is a heading in unformatted documents
+
+@functools.lru_cache(maxsize=4096)
+def parse_style(style):
+    """Parse an inline style string into StyleFlags (later declarations win, as in CSS)"""
+    bold = italic = False
+    font_size_pt = None
+    for declaration in style.split(';'):
+        name, sep, value = declaration.partition(':')
+        if not sep:
+            continue
+        name = name.strip().lower()
+        value = value.strip().lower()
+        if name == 'font-weight':
+            bold = value.startswith(('700', 'bold'))
+        elif name == 'font-style':
+            italic = value.startswith('italic')
+        elif name == 'font-size':
+            match = FONT_SIZE_PATTERN.match(value)
+            font_size_pt = float(match.group(1)) if match else None
+    return StyleFlags(bold, italic, font_size_pt)
+
+# Drive exports put most formatting in a <style> block as rules like .c3{font-weight:700}
+CSS_RULE_PATTERN = re.compile(r'([^{}]+)\{([^{}]*)\}')
+CSS_COMMENT_PATTERN = re.compile(r'/\*.*?\*/', re.S)
+CLASS_SELECTOR_PATTERN = re.compile(r'\.([\w-]+)$')
+
+def parse_class_styles(soup):
+    """
+    Class -> (rule position, declarations) table from the document's <style> blocks.
+    Only plain .class selectors are used; rules for the same class are concatenated.
+    """
+    class_styles = {}
+    position = 0
+    for style_tag in soup.find_all('style'):
+        css = CSS_COMMENT_PATTERN.sub('', style_tag.get_text())
+        for selectors, declarations in CSS_RULE_PATTERN.findall(css):
+            # Drop anything before the selector, e.g. a leading @import url(...);
+            for selector in selectors.rsplit(';', 1)[-1].split(','):
+                match = CLASS_SELECTOR_PATTERN.match(selector.strip())
+                if match:
+                    cls = match.group(1)
+                    first_position, previous = class_styles.get(cls, (position, ''))
+                    class_styles[cls] = (first_position, f"{previous}{declarations};")
+            position += 1
+    return class_styles
+
+class StyleResolver:
+    """
+    Resolves StyleFlags for elements from their classes (via the document's stylesheet)
+    and their inline style, which wins. Results are cached per (classes, style) pair, so
+    after the first element with a given combination each lookup is a dict hit.
+    """
+
+    def __init__(self, class_styles=None):
+        self.class_styles = class_styles or {}
+        self._cache = {}
+
+    @classmethod
+    def from_soup(cls, soup):
+        return cls(parse_class_styles(soup))
+
+    def flags(self, tag):
+        style = tag.get('style') or ''
+        classes = tag.get('class')
+        if not classes or not self.class_styles:
+            return parse_style(style)
+        key = (tuple(classes), style)
+        flags = self._cache.get(key)
+        if flags is None:
+            rules = sorted(self.class_styles[c] for c in classes if c in self.class_styles)
+            flags = self._cache[key] = parse_style(''.join(declarations for _, declarations in rules) + style)
+        return flags
+
+def style_flags(tag, styles=None):
+    """StyleFlags for a tag, from its classes too when a StyleResolver is given"""
+    if styles is not None:
+        return styles.flags(tag)
+    return parse_style(tag.get('style') or '')
+
+def is_bold_heading_text(tag, styles=None):
+    """True for bold 13pt/14pt text, which unformatted documents use for headings"""
+    flags = style_flags(tag, styles)
+    return flags.bold and flags.font_size_pt in HEADING_FONT_SIZES
+
 # ==== CLEANUP HELPERS ====
 
 def remove_everything_before_marker(soup):
@@ -213,18 +354,18 @@ def remove_everything_before_marker(soup):
 
     return True  # Marker was found and processed
 
-def convert_bold_italic_spans(soup):
+def convert_bold_italic_spans(soup, styles=None):
     """
     Convert spans/font tags that declare bold/italic into <strong>/<em> respectively.
+    Bold/italic come from the inline style or the tag's classes (styles is the
+    document's StyleResolver, built from soup when not given).
     """
+    if styles is None:
+        styles = StyleResolver.from_soup(soup)
     for tag in list(soup.find_all(["span", "font"])):
-        style = tag.get("style", "") or ""
-        is_bold = False
-        is_italic = False
-        if re.search(r'font-weight\s*:\s*(700|bold)', style, re.I) or tag.name == "b":
-            is_bold = True
-        if re.search(r'font-style\s*:\s*italic', style, re.I) or tag.name == "i":
-            is_italic = True
+        flags = style_flags(tag, styles)
+        is_bold = flags.bold or tag.name == "b"
+        is_italic = flags.italic or tag.name == "i"
 
         if is_bold or is_italic:
             new_inner = None
@@ -275,7 +416,7 @@ def normalize_heading_markers(soup):
         else:
             text_node.replace_with(new_tag)
 
-def process_unformatted_document(soup):
+def process_unformatted_document(soup, styles=None):
     """
     Process documents without the 'Begin writing' marker.
     These documents have:
@@ -284,6 +425,9 @@ def process_unformatted_document(soup):
     - Mixed paragraphs with bold 13pt text embedded in regular text - split them
     - Regular paragraphs (including those with partial bold text) as <p> tags
     """
+    if styles is None:
+        styles = StyleResolver.from_soup(soup)
+
     # Track if we've removed the title yet
     title_removed = False
 
@@ -303,17 +447,13 @@ def process_unformatted_document(soup):
         regular_spans = []
 
         for span in all_spans:
-            style = span.get('style', '')
             span_text = span.get_text(strip=True)
 
             if not span_text:
                 continue
 
             # Check if this span is bold and 13pt (or close to it)
-            is_bold = 'font-weight:700' in style or 'font-weight: 700' in style
-            is_large = 'font-size:13pt' in style or 'font-size: 13pt' in style or 'font-size:14pt' in style
-
-            if is_bold and is_large:
+            if is_bold_heading_text(span, styles):
                 bold_13pt_spans.append((span, span_text))
             else:
                 regular_spans.append((span, span_text))
@@ -390,6 +530,8 @@ def strip_styles_and_attributes(soup):
         for k, v in list(tag.attrs.items()):
             if k in SAFE_ATTRS:
                 kept[k] = v
+        if tag.name == 'img' and is_local_image(tag.get('src')):
+            kept['src'] = tag['src']
         tag.attrs = kept
 
 def unwrap_spans_and_fonts(soup):
@@ -414,31 +556,80 @@ def remove_empty_meta_and_images(soup):
             except Exception:
                 pass
 
+def load_link_rewrites(path=None):
+    """
+    RewriteMap of DEFAULT_LINK_REWRITES plus the rules in path (default: LINK_REWRITES_FILE
+    next to this script); see url_rewrites.parse_rules for the file format.
+    """
+    if path is None:
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), LINK_REWRITES_FILE)
+    return RewriteMap(path, DEFAULT_LINK_REWRITES)
+
+_link_rewrites = None
+_link_rewrites_lock = threading.Lock()
+
+def get_link_rewrites():
+    """The process-wide link rewrite map, reloaded when link_rewrites.txt changes"""
+    global _link_rewrites
+    with _link_rewrites_lock:
+        if _link_rewrites is None:
+            _link_rewrites = load_link_rewrites()
+    _link_rewrites.reload_if_changed()
+    return _link_rewrites
+
+def resolve_google_redirect(href):
+    """
+    The real destination of a https://www.google.com/url?q=... link, percent-decoded.
+    Returns href unchanged for other links and for YouTube targets, whose encoding is kept.
+    """
+    if 'google.com/url' not in href:
+        return href
+    parts = urllib.parse.urlsplit(href)
+    if parts.netloc not in ('www.google.com', 'google.com') or parts.path != '/url':
+        return href
+    targets = urllib.parse.parse_qs(parts.query).get('q')
+    if not targets:
+        return href
+    target = targets[0]
+    # Skip YouTube links to preserve their URL encoding
+    if 'youtube.com' in target or 'youtu.be' in target:
+        return href
+    return target
+
+def fix_link_target(link, rewrites):
+    """Unwrap a Google redirect and apply the rewrite table to one link's href"""
+    href = link.get("href")
+    if href is None:
+        return
+    fixed = rewrites.rewrite(resolve_google_redirect(href))
+    if fixed != href:
+        link["href"] = fixed
+
 def fix_google_redirect_links(soup):
     """Replace 'https://www.google.com/url?q=' with the real destination URL.
     Skips YouTube links to preserve URL encoding."""
     for a in soup.find_all("a", href=True):
-        href = a["href"]
-        match = re.search(r"https://www\.google\.com/url\?q=([^&]+)", href)
-        if match:
-            decoded_url = match.group(1)
-            # Skip YouTube links to preserve their URL encoding
-            if 'youtube.com' not in decoded_url and 'youtu.be' not in decoded_url:
-                a["href"] = decoded_url
+        fixed = resolve_google_redirect(a["href"])
+        if fixed != a["href"]:
+            a["href"] = fixed
 
 def fix_specific_links(soup):
-    """Replace specific URLs with updated versions."""
+    """Replace specific URLs with updated versions (see load_link_rewrites)."""
+    rewrites = get_link_rewrites()
     for a in soup.find_all("a", href=True):
-        href = a["href"]
-        # Replace old contact page URL with new one
-        if href == "https://www.dieselpowerproducts.com/t-contact.aspx":
-            a["href"] = "https://dieselpowerproducts.com/pages/contact-us"
+        fixed = rewrites.rewrite(a["href"])
+        if fixed != a["href"]:
+            a["href"] = fixed
+
+def contains_local_image(tag):
+    """True if tag holds an image saved into the post's images folder"""
+    return any(is_local_image(img.get("src")) for img in tag.find_all("img"))
 
 def remove_empty_paragraphs(soup):
-    """Remove <p> tags that are empty or contain only nbsp."""
+    """Remove <p> tags that are empty or contain only nbsp (keeping ones that hold a saved image)."""
     for p in soup.find_all("p"):
         text = p.get_text(strip=True)
-        if not text or text == "\xa0":
+        if (not text or text == "\xa0") and not contains_local_image(p):
             try:
                 p.decompose()
             except Exception:
@@ -462,77 +653,47 @@ def remove_notes_section(soup):
         except Exception:
             pass
 
+# Google Docs list classes, e.g. 'lst-kix_list_9-1' -> list_id='9', level=1
+LIST_CLASS_PATTERN = re.compile(r'lst-kix_list_(\d+)-(\d+)')
+
+def list_class_info(list_tag):
+    """(list_id, level) from a Google Docs list class, or (None, None) if there is none"""
+    for cls in list_tag.get('class', []):
+        match = LIST_CLASS_PATTERN.match(cls)
+        if match:
+            return match.group(1), int(match.group(2))
+    return None, None
+
 def preserve_list_structure(soup):
     """
     Convert Google Docs flat list structure to proper nested HTML lists.
-    Google Docs exports nested lists as sibling <ul> tags with class indicators
+    Google Docs exports nested lists as sibling <ul>/<ol> tags with class indicators
     like 'lst-kix_list_9-0' (level 0), 'lst-kix_list_9-1' (level 1), etc.
+    Lists are visited once in document order; the most recent list seen for each
+    (container, list_id, level) is indexed, so a level-n list is moved into the last <li>
+    of the latest level n-1 list of the same list_id that shared its original container.
     """
-    import re
+    latest_list = {}
 
-    # Find all ul tags
-    all_lists = soup.find_all('ul')
-
-    # Pattern to extract list ID and level from Google Docs classes
-    # e.g., 'lst-kix_list_9-1' -> list_id='9', level=1
-    list_class_pattern = re.compile(r'lst-kix_list_(\d+)-(\d+)')
-
-    # Track processed lists to avoid double-processing
-    processed = set()
-
-    for ul in all_lists:
-        if ul in processed:
+    for list_tag in soup.find_all(['ul', 'ol']):
+        list_id, level = list_class_info(list_tag)
+        if list_id is None:
             continue
 
-        # Get class attribute
-        classes = ul.get('class', [])
-        if not classes:
+        container = id(list_tag.parent)
+        latest_list[(container, list_id, level)] = list_tag
+        if level == 0:
             continue
 
-        # Find the list class with level info
-        list_id = None
-        level = None
-        for cls in classes:
-            match = list_class_pattern.match(cls)
-            if match:
-                list_id = match.group(1)
-                level = int(match.group(2))
-                break
-
-        if list_id is None or level == 0:
-            # This is a top-level list, continue
+        parent_list = latest_list.get((container, list_id, level - 1))
+        if parent_list is None:
             continue
 
-        # This is a nested list (level > 0)
-        # Find the previous list with the same list_id and level-1
-        parent_level = level - 1
-        parent_pattern = re.compile(rf'lst-kix_list_{list_id}-{parent_level}')
-
-        # Search backwards through previous siblings to find parent list
-        parent_ul = None
-        sibling = ul.previous_sibling
-
-        while sibling:
-            if hasattr(sibling, 'name') and sibling.name == 'ul':
-                sibling_classes = sibling.get('class', [])
-                for cls in sibling_classes:
-                    if parent_pattern.match(cls):
-                        parent_ul = sibling
-                        break
-                if parent_ul:
-                    break
-            sibling = sibling.previous_sibling
-
-        if parent_ul:
-            # Find the last <li> in the parent list
-            parent_lis = parent_ul.find_all('li', recursive=False)
-            if parent_lis:
-                last_li = parent_lis[-1]
-
-                # Move the nested ul into the last li of the parent
-                ul_extract = ul.extract()
-                last_li.append(ul_extract)
-                processed.add(ul_extract)
+        # Move the nested list into the last <li> of the parent list
+        last_li = next((child for child in reversed(parent_list.contents) if getattr(child, 'name', None) == 'li'),
+                       None)
+        if last_li is not None:
+            last_li.append(list_tag.extract())
 
 # ==== MAIN CLEANUP PIPELINE ====
 
@@ -565,7 +726,7 @@ def remove_blank_paragraphs_before_headings(soup):
             if hasattr(prev_sibling, 'name'):
                 if prev_sibling.name == 'p':
                     text = prev_sibling.get_text(strip=True)
-                    if not text or text == "\xa0":
+                    if (not text or text == "\xa0") and not contains_local_image(prev_sibling):
                         temp = prev_sibling.previous_sibling
                         try:
                             prev_sibling.decompose()
@@ -588,15 +749,18 @@ def convert_first_h1_to_h2(soup):
             h2.append(child)
         first_h1.replace_with(h2)
 
-def apply_text_and_link_colors(soup):
-    """Make all text black and links blue."""
-    # Add style to body for black text
+def apply_text_color(soup):
+    """Make all text black (links are coloured by process_links)."""
     if soup.body:
         soup.body['style'] = 'color: #000000;'
 
+def apply_text_and_link_colors(soup):
+    """Make all text black and links blue."""
+    apply_text_color(soup)
+
     # Make all links blue
     for link in soup.find_all('a'):
-        link['style'] = 'color: #0000EE;'
+        link['style'] = LINK_STYLE
 
 def remove_all_empty_tags(soup):
     """Remove all empty tags throughout the document (final cleanup pass)."""
@@ -784,97 +948,119 @@ def normalize_link_spacing(soup):
     - Replace nbsp with regular spaces
     - Handle links inside strong tags and between strong tags
     """
-    import re
-    from bs4 import NavigableString
-
     for link in soup.find_all('a'):
-        # Check if link is inside a strong tag
-        parent_strong = link.parent if link.parent and link.parent.name == 'strong' else None
-
-        if parent_strong:
-            # Handle spacing around the strong tag that contains the link
-            prev_sibling = parent_strong.previous_sibling
-            if prev_sibling and isinstance(prev_sibling, str):
-                # Replace nbsp with regular space
-                cleaned = prev_sibling.replace('\xa0', ' ')
-                cleaned = re.sub(r' +', ' ', cleaned)
-
-                if cleaned:
-                    cleaned = cleaned.rstrip()
-                    if cleaned and not cleaned.endswith('\n'):
-                        cleaned = cleaned + ' '
-
-                    if cleaned != prev_sibling:
-                        prev_sibling.replace_with(cleaned)
-            elif prev_sibling and hasattr(prev_sibling, 'name') and prev_sibling.name == 'strong':
-                # Previous sibling is also a strong tag, ensure space between them
-                # Check if there's a text node between them
-                if prev_sibling.next_sibling == parent_strong:
-                    # No space between, insert one
-                    parent_strong.insert_before(NavigableString(' '))
-
-            next_sibling = parent_strong.next_sibling
-            if next_sibling and isinstance(next_sibling, str):
-                cleaned = next_sibling.replace('\xa0', ' ')
-                cleaned = re.sub(r' +', ' ', cleaned)
-
-                if cleaned:
-                    cleaned = cleaned.lstrip()
-                    if cleaned and not cleaned[0] in '.,;:!?)}\n':
-                        cleaned = ' ' + cleaned
-
-                    if cleaned != next_sibling:
-                        next_sibling.replace_with(cleaned)
-            elif next_sibling and hasattr(next_sibling, 'name') and next_sibling.name == 'strong':
-                # Next sibling is also a strong tag, ensure space between them
-                if parent_strong.next_sibling == next_sibling:
-                    # No space between, insert one
-                    parent_strong.insert_after(NavigableString(' '))
-        else:
-            # Link is not inside a strong tag - handle normally
-            prev_sibling = link.previous_sibling
-            if prev_sibling and isinstance(prev_sibling, str):
-                # Replace nbsp with regular space
-                cleaned = prev_sibling.replace('\xa0', ' ')
-                # Collapse multiple spaces
-                cleaned = re.sub(r' +', ' ', cleaned)
-
-                # If there's text before the link, ensure single space at the end
-                # Store original to check if it was just whitespace
-                was_just_whitespace = cleaned.strip() == ''
-
-                if cleaned and not was_just_whitespace:
-                    # Remove trailing spaces
-                    cleaned = cleaned.rstrip()
-                    # Add single space if there's actual content
-                    if cleaned and not cleaned.endswith('\n'):
-                        cleaned = cleaned + ' '
-
-                    if cleaned != prev_sibling:
-                        prev_sibling.replace_with(cleaned)
-                elif was_just_whitespace:
-                    # Previous sibling is just whitespace - preserve as single space
-                    if prev_sibling != ' ':
-                        prev_sibling.replace_with(' ')
-
-            # Process next sibling
-            next_sibling = link.next_sibling
-            if next_sibling and isinstance(next_sibling, str):
-                # Replace nbsp with regular space
-                cleaned = next_sibling.replace('\xa0', ' ')
-                # Collapse multiple spaces
-                cleaned = re.sub(r' +', ' ', cleaned)
-
-                # If there's text after the link, ensure single space at the start
-                if cleaned:
-                    # Remove leading spaces
-                    cleaned = cleaned.lstrip()
-                    # Add single space if there's actual content and it doesn't start with punctuation or newline
-                    if cleaned and not cleaned[0] in '.,;:!?)}\n':
-                        cleaned = ' ' + cleaned
-
-                    if cleaned != next_sibling:
-                        next_sibling.replace_with(cleaned)
+        fix_link_spacing(link)
+
+def fix_link_spacing(link):
+    """Normalize the spacing around one <a> tag (see normalize_link_spacing)."""
+    # Check if link is inside a strong tag
+    parent_strong = link.parent if link.parent and link.parent.name == 'strong' else None
+
+    if parent_strong:
+        # Handle spacing around the strong tag that contains the link
+        prev_sibling = parent_strong.previous_sibling
+        if prev_sibling and isinstance(prev_sibling, str):
+            # Replace nbsp with regular space
+            cleaned = prev_sibling.replace('\xa0', ' ')
+            cleaned = re.sub(r' +', ' ', cleaned)
+
+            if cleaned:
+                cleaned = cleaned.rstrip()
+                if cleaned and not cleaned.endswith('\n'):
+                    cleaned = cleaned + ' '
+
+                if cleaned != prev_sibling:
+                    prev_sibling.replace_with(cleaned)
+        elif prev_sibling and hasattr(prev_sibling, 'name') and prev_sibling.name == 'strong':
+            # Previous sibling is also a strong tag, ensure space between them
+            # Check if there's a text node between them
+            if prev_sibling.next_sibling == parent_strong:
+                # No space between, insert one
+                parent_strong.insert_before(NavigableString(' '))
+
+        next_sibling = parent_strong.next_sibling
+        if next_sibling and isinstance(next_sibling, str):
+            cleaned = next_sibling.replace('\xa0', ' ')
+            cleaned = re.sub(r' +', ' ', cleaned)
+
+            if cleaned:
+                cleaned = cleaned.lstrip()
+                if cleaned and not cleaned[0] in '.,;:!?)}\n':
+                    cleaned = ' ' + cleaned
+
+                if cleaned != next_sibling:
+                    next_sibling.replace_with(cleaned)
+        elif next_sibling and hasattr(next_sibling, 'name') and next_sibling.name == 'strong':
+            # Next sibling is also a strong tag, ensure space between them
+            if parent_strong.next_sibling == next_sibling:
+                # No space between, insert one
+                parent_strong.insert_after(NavigableString(' '))
+    else:
+        # Link is not inside a strong tag - handle normally
+        prev_sibling = link.previous_sibling
+        if prev_sibling and isinstance(prev_sibling, str):
+            # Replace nbsp with regular space
+            cleaned = prev_sibling.replace('\xa0', ' ')
+            # Collapse multiple spaces
+            cleaned = re.sub(r' +', ' ', cleaned)
+
+            # If there's text before the link, ensure single space at the end
+            # Store original to check if it was just whitespace
+            was_just_whitespace = cleaned.strip() == ''
+
+            if cleaned and not was_just_whitespace:
+                # Remove trailing spaces
+                cleaned = cleaned.rstrip()
+                # Add single space if there's actual content
+                if cleaned and not cleaned.endswith('\n'):
+                    cleaned = cleaned + ' '
+
+                if cleaned != prev_sibling:
+                    prev_sibling.replace_with(cleaned)
+            elif was_just_whitespace:
+                # Previous sibling is just whitespace - preserve as single space
+                if prev_sibling != ' ':
+                    prev_sibling.replace_with(' ')
+
+        # Process next sibling
+        next_sibling = link.next_sibling
+        if next_sibling and isinstance(next_sibling, str):
+            # Replace nbsp with regular space
+            cleaned = next_sibling.replace('\xa0', ' ')
+            # Collapse multiple spaces
+            cleaned = re.sub(r' +', ' ', cleaned)
+
+            # If there's text after the link, ensure single space at the start
+            if cleaned:
+                # Remove leading spaces
+                cleaned = cleaned.lstrip()
+                # Add single space if there's actual content and it doesn't start with punctuation or newline
+                if cleaned and not cleaned[0] in '.,;:!?)}\n':
+                    cleaned = ' ' + cleaned
+
+                if cleaned != next_sibling:
+                    next_sibling.replace_with(cleaned)
+
+def process_links(soup, rewrites=None, link_style=LINK_STYLE, fix_spacing=True):
+    """
+    Single pass over every <a>: unwrap Google redirects (percent-decoded, YouTube links kept
+    as they are), apply the rewrite rules (rewrites, a url_rewrites.RewriteMap, default
+    get_link_rewrites()), set link_style (None leaves styles alone) and, with fix_spacing, normalize the
+    spacing around the link. Replaces fix_google_redirect_links, fix_specific_links, the link
+    half of apply_text_and_link_colors and normalize_link_spacing in the pipeline.
+    """
+    if rewrites is None:
+        rewrites = get_link_rewrites()
+    for link in soup.find_all('a'):
+        fix_link_target(link, rewrites)
+        if link_style is not None:
+            link['style'] = link_style
+        if fix_spacing:
+            fix_link_spacing(link)
+
+def process_link_targets(soup):
+    """process_links without styling or spacing, for unformatted documents."""
+    process_links(soup, link_style=None, fix_spacing=False)
 
 def split_paragraphs_at_double_br(soup):
     """
@@ -978,23 +1164,53 @@ def format_html_with_newlines(element, indent=0):
     content = '\n' + '\n'.join(children_html) + indent_str
     return f"{opening}{content}</{tag_name}>\n"
 
-def clean_html_simple(raw_html):
+_blog_template = None
+_blog_template_lock = threading.Lock()
+
+def get_blog_template():
+    """The process-wide BlogTemplate, built from STYLESHEET_PATH and STYLESHEET_URL on first use"""
+    global _blog_template
+    with _blog_template_lock:
+        if _blog_template is None:
+            _blog_template = load_blog_template(STYLESHEET_PATH, STYLESHEET_URL)
+        return _blog_template
+
+def set_blog_template(path=None, stylesheet_url=None):
+    """Wrap posts in the stylesheet at path (default blog_style.css), linked at stylesheet_url if given"""
+    global _blog_template
+    template = load_blog_template(path, stylesheet_url)
+    with _blog_template_lock:
+        _blog_template = template
+    return template
+
+def blog_template_settings():
+    """(stylesheet path, stylesheet URL) of this process's template, for set_blog_template in another"""
+    template = get_blog_template()
+    return template.source_path, template.stylesheet_url
+
+def render_post(content_elements, metrics=None):
+    """Serialize the cleaned top-level elements and wrap them in the shared stylesheet and blog-content div"""
+    with stage(metrics, "serialize"):
+        body_parts = []
+        for element in content_elements:
+            if isinstance(element, Tag):
+                body_parts.append(format_html_with_newlines(element, 1))
+            elif isinstance(element, NavigableString) and str(element).strip():
+                body_parts.append(str(element))
+        return get_blog_template().render(''.join(body_parts))
+
+def convert_bold_13pt_paragraphs(soup, styles=None):
     """
-    Simple processing for unformatted documents without the 'Begin writing' marker.
-    Rules:
-    1. Remove first paragraph with bold 13pt text (title)
-    2. Convert paragraphs with ONLY bold 13pt text to H2 headings
-    3. For mixed paragraphs, split bold 13pt text into H2 headings and keep rest as paragraphs
+    Turn bold 13pt text in unformatted documents into headings.
+    The first bold 13pt paragraph is the title and is removed, paragraphs that are
+    entirely bold 13pt become <h2>, and mixed paragraphs are split into <h2> + <p>.
+    Empty paragraphs (other than ones holding a saved image) are removed along the way.
+    Bold/size come from inline styles or classes (see convert_bold_italic_spans).
     """
-    soup = BeautifulSoup(raw_html, "html.parser")
-
-    # Get the body
+    if styles is None:
+        styles = StyleResolver.from_soup(soup)
     body = soup.body if soup.body else soup
 
-    # Split paragraphs at <br><br> boundaries FIRST, before any other processing
-    # This must happen immediately while <br> tags still exist in raw HTML
-    split_paragraphs_at_double_br(soup)
-
     # Find all paragraphs
     all_paragraphs = body.find_all('p')
 
@@ -1004,7 +1220,8 @@ def clean_html_simple(raw_html):
     for p in list(all_paragraphs):
         text = p.get_text(strip=True)
         if not text:
-            p.decompose()
+            if not contains_local_image(p):
+                p.decompose()
             continue
 
         # Find all spans with bold 13pt text
@@ -1016,17 +1233,13 @@ def clean_html_simple(raw_html):
         regular_spans = []  # List of (span_element, text)
 
         for span in all_spans:
-            style = span.get('style', '')
             span_text = span.get_text(strip=True)
 
             if not span_text:
                 continue
 
             # Check if this span is bold 13pt
-            is_bold = 'font-weight:700' in style or 'font-weight: 700' in style
-            is_13pt = 'font-size:13pt' in style or 'font-size: 13pt' in style or 'font-size:14pt' in style
-
-            if is_bold and is_13pt:
+            if is_bold_heading_text(span, styles):
                 bold_13pt_spans.append((span, span_text))
             else:
                 regular_spans.append((span, span_text))
@@ -1061,16 +1274,12 @@ def clean_html_simple(raw_html):
                     if stripped:
                         content_order.append(('text', stripped))
                 elif hasattr(child, 'name') and child.name == 'span':
-                    style = child.get('style', '')
                     child_text = child.get_text(strip=True)
 
                     if not child_text:
                         continue
 
-                    is_bold = 'font-weight:700' in style or 'font-weight: 700' in style
-                    is_13pt = 'font-size:13pt' in style or 'font-size: 13pt' in style or 'font-size:14pt' in style
-
-                    if is_bold and is_13pt:
+                    if is_bold_heading_text(child, styles):
                         content_order.append(('bold13pt', child_text))
                     else:
                         content_order.append(('text', child_text))
@@ -1111,217 +1320,133 @@ def clean_html_simple(raw_html):
                     p.insert_after(elem)
                 p.decompose()
 
-    # Paragraph splitting already done at the beginning of this function
-
-    # Remove Notes section
-    remove_notes_section(soup)
-
-    # Remove empty paragraphs
-    for p in body.find_all('p'):
-        if not p.get_text(strip=True):
-            p.decompose()
-
-    # Now convert bold/italic spans to semantic tags (for remaining paragraphs)
-    convert_bold_italic_spans(soup)
-
-    # Strip all styles and attributes
+def strip_all_attributes(soup):
+    """Remove <style> tags and all attributes from body content, keeping only href on links."""
+    body = soup.body if soup.body else soup
     for style_tag in body.find_all("style"):
         style_tag.decompose()
     for tag in body.find_all(True):
         # Only keep href for links
         if tag.name == 'a' and tag.get('href'):
             tag.attrs = {'href': tag['href']}
+        # Keep images saved into the post's images folder
+        elif tag.name == 'img' and is_local_image(tag.get('src')):
+            tag.attrs = {'src': tag['src']}
         else:
             tag.attrs = {}
 
-    # Unwrap remaining spans and fonts
-    for tag in list(body.find_all(["span", "font"])):
-        try:
-            tag.unwrap()
-        except:
-            pass
+# Cleanup passes in the order they run. Each takes the soup and edits it in place.
+
+# Unformatted documents (no 'Begin writing' marker)
+SIMPLE_PASSES = [
+    # Split paragraphs at <br><br> boundaries FIRST, before any other processing
+    # This must happen immediately while <br> tags still exist in raw HTML
+    split_paragraphs_at_double_br,
+    convert_bold_13pt_paragraphs,
+    remove_notes_section,
+    remove_empty_paragraphs,
+    # Now convert bold/italic spans to semantic tags (for remaining paragraphs)
+    convert_bold_italic_spans,
+    strip_all_attributes,
+    unwrap_spans_and_fonts,
+    process_link_targets,
+]
+
+# Formatted documents, run after remove_everything_before_marker()
+FORMATTED_PASSES = [
+    # Convert bold/italic spans to semantic tags before styles are stripped
+    convert_bold_italic_spans,
+    strip_styles_and_attributes,
+    normalize_heading_markers,
+    flatten_nested_headings,
+    unwrap_headings_from_paragraphs,
+    unwrap_spans_and_fonts,
+    preserve_list_structure,
+    remove_empty_meta_and_images,
+    remove_empty_paragraphs,
+    remove_notes_section,
+    remove_trailing_hr,
+    remove_blank_paragraphs_before_headings,
+    convert_first_h1_to_h2,
+    apply_text_color,
+    add_table_styling,
+    remove_all_empty_tags,  # Final cleanup pass to remove all empty tags
+    fix_strong_tag_spacing,  # Run after prettify won't interfere
+    fix_strong_in_list_items,  # Ensure space after strong tags in list items
+    process_links,  # Fix link targets, colour links and normalize the spacing around them
+]
+
+# Passes that detect bold/italic/heading text and take the document's StyleResolver
+STYLE_AWARE_PASSES = {convert_bold_italic_spans, convert_bold_13pt_paragraphs}
+
+def bind_styles(passes, styles):
+    """Copy of passes with the style-aware ones bound to styles (keeping their names)"""
+    return [functools.update_wrapper(functools.partial(cleanup_pass, styles=styles), cleanup_pass)
+            if cleanup_pass in STYLE_AWARE_PASSES else cleanup_pass
+            for cleanup_pass in passes]
 
-    # Fix Google redirect links
-    fix_google_redirect_links(soup)
-    fix_specific_links(soup)
+def run_cleanup_passes(soup, passes, metrics=None, profiler=None):
+    """
+    Run each cleanup pass on soup, timing it as stage 'clean.<name>' when metrics is given
+    and recording it with profiler (a run_metrics.PassProfiler) when one is given.
+    """
+    for cleanup_pass in passes:
+        with stage(metrics, f"clean.{cleanup_pass.__name__}"), observe(profiler, cleanup_pass.__name__, soup):
+            cleanup_pass(soup)
+
+def clean_html_simple(raw_html, metrics=None, profiler=None):
+    """
+    Simple processing for unformatted documents without the 'Begin writing' marker.
+    Rules:
+    1. Remove first paragraph with bold 13pt text (title)
+    2. Convert paragraphs with ONLY bold 13pt text to H2 headings
+    3. For mixed paragraphs, split bold 13pt text into H2 headings and keep rest as paragraphs
+    If metrics (a run_metrics.DocumentMetrics) is given, every pass is timed; a profiler
+    (run_metrics.PassProfiler) also records nodes visited and mutated per pass.
+    """
+    with stage(metrics, "parse"):
+        soup = BeautifulSoup(raw_html, "html.parser")
+        styles = StyleResolver.from_soup(soup)
+
+    run_cleanup_passes(soup, bind_styles(SIMPLE_PASSES, styles), metrics, profiler)
+
+    # Get the body
+    body = soup.body if soup.body else soup
 
     # Get final content
     content_elements = list(body.children) if body else []
 
-    # CSS styles to prepend
-    css_styles = """<style>
-
-    .blog-content {
-        line-height: 1.6;
-        font-size: 1rem;
-        color: #222;
-    }
-
-    /* Reset defaults */
-    .blog-content h1,
-    .blog-content h2,
-    .blog-content h3,
-    .blog-content h4,
-    .blog-content h5,
-    .blog-content h6,
-    .blog-content p,
-    .blog-content ul,
-    .blog-content ol,
-    .blog-content table {
-        margin: 0;
-        padding: 0;
-    }
-
-    /* H1 styled as paragraph to avoid duplicate H1s on Shopify */
-    .blog-content p.h1 {
-        margin: 30px 0;
-        font-size: 40px;
-        font-weight: 700;
-        font-family: var(--heading-font);
-    }
-
-    /* Table styles */
-    .blog-content table {
-        border-collapse: collapse;
-        width: 100%;
-        margin: 1em 0;
-    }
-
-    .blog-content td,
-    .blog-content th {
-        border: 1px solid #ddd;
-        padding: 8px;
-        text-align: left;
-    }
-
-    .blog-content tr:first-child td,
-    .blog-content tr:first-child th {
-        background-color: #f8f8f8;
-        font-weight: bold;
-    }
-
-    /* Consistent vertical rhythm */
-    .blog-content h2 + *,
-    .blog-content h3 + *,
-    .blog-content h4 + *,
-    .blog-content h5 + *,
-    .blog-content h6 + *,
-    .blog-content p + *,
-    .blog-content ul + *,
-    .blog-content ol + *,
-    .blog-content table + * {
-        margin-top: 1em;
-    }
-
-    /* Slightly tighter after headings */
-    .blog-content h2 + *,
-    .blog-content h3 + * {
-        margin-top: 0.6em;
-    }
-
-    /* List styles */
-    .blog-content ul {
-        padding-left: 20px;
-        margin: 0.5em 0;
-    }
-
-    .blog-content li {
-        list-style-type: circle;
-        padding-bottom: 0.3em;
-    }
-
-    .blog-content li:last-child {
-        padding-bottom: 0;
-    }
-
-    /* Numbered list styling (for converted <ol> tags) */
-    .blog-content ul.numberedList {
-        list-style-type: decimal;
-    }
-
-    .blog-content ul.numberedList li {
-        list-style-type: decimal;
-    }
-
-    /* Additional spacing fixes */
-    .blog-content * + p,
-    .blog-content table + p {
-        margin-top: 1em;
-    }
-
-    .blog-content p:empty {
-        display: none;
-    }
-
-    /* Link styles */
-    .blog-content a {
-        color: #0645ad;
-        text-decoration: underline;
-    }
-
-    .blog-content a:visited {
-        color: #0b0080;
-    }
-
-    .blog-content a:hover,
-    .blog-content a:focus {
-        color: #3366cc;
-        text-decoration: underline;
-    }
-
-</style>
-"""
-
-    # Build formatted HTML output manually
-    html_parts = [css_styles]
-    html_parts.append('<div class="blog-content">\n')
-
-    # Format each child element
-    for element in content_elements:
-        if isinstance(element, Tag):
-            html_parts.append(format_html_with_newlines(element, 1))
-        elif isinstance(element, NavigableString) and str(element).strip():
-            html_parts.append(str(element))
-
-    html_parts.append('</div>\n')
-
-    html_output = ''.join(html_parts)
-    return html_output
-
-def clean_html(raw_html):
-    soup = BeautifulSoup(raw_html, "html.parser")
+    return render_post(content_elements, metrics)
+
+def clean_html(raw_html, metrics=None, profiler=None, images=None):
+    """
+    Clean a Google Docs HTML export into blog-ready HTML.
+    If metrics (a run_metrics.DocumentMetrics) is given, parsing, every cleanup pass
+    and serialization are timed; a profiler (run_metrics.PassProfiler) also records
+    nodes visited and mutated per pass.
+    Images are taken out before parsing: with images (a blog_images.ImageOptions) they are
+    saved into the post's images folder and linked by relative path, otherwise embedded
+    data: URI images are dropped.
+    """
+    with stage(metrics, "images"):
+        raw_html = extract_images(raw_html, images)
+
+    with stage(metrics, "parse"):
+        soup = BeautifulSoup(raw_html, "html.parser")
+        # Read the export's stylesheet before the passes strip it
+        styles = StyleResolver.from_soup(soup)
 
     # First, check if this is a formatted document with the marker
-    has_marker = remove_everything_before_marker(soup)
+    with stage(metrics, "clean.remove_everything_before_marker"), \
+            observe(profiler, "remove_everything_before_marker", soup):
+        has_marker = remove_everything_before_marker(soup)
 
     # If no marker was found, use simple processing
     if not has_marker:
-        return clean_html_simple(raw_html)
+        return clean_html_simple(raw_html, metrics, profiler)
 
     # FORMATTED DOCUMENT PROCESSING (with "Begin writing" marker)
-    # Now convert bold/italic spans to semantic tags and strip styles
-    convert_bold_italic_spans(soup)
-    strip_styles_and_attributes(soup)
-
-    normalize_heading_markers(soup)
-    flatten_nested_headings(soup)
-    unwrap_headings_from_paragraphs(soup)
-    unwrap_spans_and_fonts(soup)
-    preserve_list_structure(soup)
-    remove_empty_meta_and_images(soup)
-    fix_google_redirect_links(soup)
-    fix_specific_links(soup)
-    remove_empty_paragraphs(soup)
-    remove_notes_section(soup)
-    remove_trailing_hr(soup)
-    remove_blank_paragraphs_before_headings(soup)
-    convert_first_h1_to_h2(soup)
-    apply_text_and_link_colors(soup)
-    add_table_styling(soup)
-    remove_all_empty_tags(soup)  # Final cleanup pass to remove all empty tags
-    fix_strong_tag_spacing(soup)  # Run after prettify won't interfere
-    fix_strong_in_list_items(soup)  # Ensure space after strong tags in list items
-    normalize_link_spacing(soup)  # Ensure consistent spacing around links
+    run_cleanup_passes(soup, bind_styles(FORMATTED_PASSES, styles), metrics, profiler)
 
     # Get the body content or the whole soup if no body
     body = soup.body if soup.body else soup
@@ -1329,260 +1454,571 @@ def clean_html(raw_html):
     # Extract only the content, not the body tag itself
     content_elements = list(body.children) if body else []
 
-    # CSS styles to prepend
-    css_styles = """<style>
-
-    .blog-content {
-        line-height: 1.6;
-        font-size: 1rem;
-        color: #222;
-    }
-
-    /* Reset defaults */
-    .blog-content h1,
-    .blog-content h2,
-    .blog-content h3,
-    .blog-content h4,
-    .blog-content h5,
-    .blog-content h6,
-    .blog-content p,
-    .blog-content ul,
-    .blog-content ol,
-    .blog-content table {
-        margin: 0;
-        padding: 0;
-    }
-
-    /* H1 styled as paragraph to avoid duplicate H1s on Shopify */
-    .blog-content p.h1 {
-        margin: 30px 0;
-        font-size: 40px;
-        font-weight: 700;
-        font-family: var(--heading-font);
-    }
-
-    /* Table styles */
-    .blog-content table {
-        border-collapse: collapse;
-        width: 100%;
-        margin: 1em 0;
-    }
-
-    .blog-content td,
-    .blog-content th {
-        border: 1px solid #ddd;
-        padding: 8px;
-        text-align: left;
-    }
-
-    .blog-content tr:first-child td,
-    .blog-content tr:first-child th {
-        background-color: #f8f8f8;
-        font-weight: bold;
-    }
-
-    /* Consistent vertical rhythm */
-    .blog-content h2 + *,
-    .blog-content h3 + *,
-    .blog-content h4 + *,
-    .blog-content h5 + *,
-    .blog-content h6 + *,
-    .blog-content p + *,
-    .blog-content ul + *,
-    .blog-content ol + *,
-    .blog-content table + * {
-        margin-top: 1em;
-    }
-
-    /* Slightly tighter after headings */
-    .blog-content h2 + *,
-    .blog-content h3 + * {
-        margin-top: 0.6em;
-    }
-
-    /* List styles */
-    .blog-content ul {
-        padding-left: 20px;
-        margin: 0.5em 0;
-    }
-
-    .blog-content li {
-        list-style-type: circle;
-        padding-bottom: 0.3em;
-    }
-
-    .blog-content li:last-child {
-        padding-bottom: 0;
-    }
-
-    /* Numbered list styling (for converted <ol> tags) */
-    .blog-content ul.numberedList {
-        list-style-type: decimal;
-    }
-
-    .blog-content ul.numberedList li {
-        list-style-type: decimal;
-    }
-
-    /* Additional spacing fixes */
-    .blog-content * + p,
-    .blog-content table + p {
-        margin-top: 1em;
-    }
-
-    .blog-content p:empty {
-        display: none;
-    }
-
-    /* Link styles */
-    .blog-content a {
-        color: #0645ad;
-        text-decoration: underline;
-    }
-
-    .blog-content a:visited {
-        color: #0b0080;
-    }
-
-    .blog-content a:hover,
-    .blog-content a:focus {
-        color: #3366cc;
-        text-decoration: underline;
-    }
-
-</style>
-"""
-
-    # Build formatted HTML output manually
-    html_parts = [css_styles]
-    html_parts.append('<div class="blog-content">\n')
-
-    # Format each child element
-    for element in content_elements:
-        if isinstance(element, Tag):
-            html_parts.append(format_html_with_newlines(element, 1))
-        elif isinstance(element, NavigableString) and str(element).strip():
-            html_parts.append(str(element))
-
-    html_parts.append('</div>\n')
-
-    html_output = ''.join(html_parts)
-    return html_output
+    return render_post(content_elements, metrics)
+
+# ==== ISOLATED CLEANING ====
+
+# Only one oversized document is cleaned at a time, so at most one large tree exists at once
+_isolated_clean_lock = threading.Lock()
+
+def clean_html_file(raw_path, metrics=None, images=None):
+    """clean_html for a raw export saved on disk"""
+    return clean_html(read_raw_html(raw_path, metrics), metrics, images=images)
+
+def estimate_clean_memory(raw_html=None, raw_path=None):
+    """Rough peak memory in bytes needed to parse and clean raw_html (or the export at raw_path)"""
+    size = os.path.getsize(raw_path) if raw_path is not None else len(raw_html)
+    return size * SOUP_EXPANSION_FACTOR
+
+def clean_html_isolated(raw_html=None, raw_path=None, images=None):
+    """
+    Run clean_html in a fresh worker process, so the memory of the parse tree is returned to
+    the operating system as soon as the document is done rather than kept by this process.
+    With raw_path the worker reads the export itself and it is never loaded here.
+    """
+    with _isolated_clean_lock:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=set_blog_template,
+                                 initargs=blog_template_settings()) as executor:
+            if raw_path is not None:
+                return executor.submit(clean_html_file, raw_path, images=images).result()
+            return executor.submit(clean_html, raw_html, images=images).result()
+
+def exceeds_memory_ceiling(memory_ceiling, raw_html=None, raw_path=None):
+    """True if cleaning the export is estimated to need more than memory_ceiling MB"""
+    return memory_ceiling is not None and estimate_clean_memory(raw_html, raw_path) > memory_ceiling * 2**20
+
+def clean_html_within_ceiling(raw_html=None, memory_ceiling=MEMORY_CEILING_MB, metrics=None, raw_path=None,
+                              images=None):
+    """
+    clean_html of raw_html, or of the export saved at raw_path, moved to an isolated process
+    when the estimate exceeds memory_ceiling MB
+    """
+    if exceeds_memory_ceiling(memory_ceiling, raw_html, raw_path):
+        print(f"Cleaning in a separate process (estimated "
+              f"{estimate_clean_memory(raw_html, raw_path) / 2**20:.0f} MB > {memory_ceiling} MB ceiling)")
+        with stage(metrics, "clean.isolated"):
+            return clean_html_isolated(raw_html, raw_path, images)
+    if raw_path is not None:
+        return clean_html_file(raw_path, metrics, images)
+    return clean_html(raw_html, metrics, images=images)
 
 # ==== DRIVE CONVERSION ====
 
-def convert_docx_to_html(drive_service, input_path, output_folder, raw_folder, tags_file=None):
+def merge_tag_lists(tags_file=None):
+    """DEFAULT_TAGS followed by any new tags from tags_file, deduplicated case-insensitively"""
+    from tagFinder import load_tags
+
+    def _normalize_tag(tag):
+        return tag.strip().lower()
+
+    merged_tags = []
+    seen = set()
+
+    for tag in DEFAULT_TAGS:
+        norm = _normalize_tag(tag)
+        if norm and norm not in seen:
+            merged_tags.append(tag)
+            seen.add(norm)
+
+    if tags_file and os.path.exists(tags_file):
+        for tag in load_tags(tags_file):
+            norm = _normalize_tag(tag)
+            if norm and norm not in seen:
+                merged_tags.append(tag)
+                seen.add(norm)
+
+    return merged_tags
+
+_tag_catalogs = {}
+_tag_catalogs_lock = threading.Lock()
+
+def get_tag_catalog(tags_file=None):
+    """
+    tagFinder.TagCatalog for merge_tag_lists(tags_file), kept for the life of the process
+    (so its keyword cache stays warm) and rebuilt when tags_file changes.
+    """
+    # Import tagFinder functions
+    import sys
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    if script_dir not in sys.path:
+        sys.path.insert(0, script_dir)
+
+    from tagFinder import TagCatalog
+
+    mtime = os.path.getmtime(tags_file) if tags_file and os.path.exists(tags_file) else None
+    key = (tags_file, mtime)
+    with _tag_catalogs_lock:
+        catalog = _tag_catalogs.get(key)
+        if catalog is None:
+            _tag_catalogs.clear()
+            catalog = _tag_catalogs[key] = TagCatalog(merge_tag_lists(tags_file))
+    return catalog
+
+def export_docx_raw(drive_service, input_path, raw_folder, cleanup_queue=None, throttle=None, stats=None,
+                    resumable_threshold=RESUMABLE_UPLOAD_THRESHOLD, metrics=None):
+    """
+    Upload one .docx to Google Drive and stream its HTML export into raw_folder in chunks,
+    so the export is never held in memory. Returns the raw export's path.
+    See convert_docx_to_html for the arguments.
+    """
     filename = os.path.basename(input_path)
     base_name = os.path.splitext(filename)[0]
     print(f"\nUploading {filename} to Google Drive...")
 
     file_metadata = {"name": filename, "mimeType": "application/vnd.google-apps.document"}
-    media = MediaFileUpload(
-        input_path,
-        mimetype="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        resumable=True,
-    )
-    uploaded = drive_service.files().create(body=file_metadata, media_body=media, fields="id").execute()
+    with stage(metrics, "read"):
+        media = build_upload_media(input_path, resumable_threshold=resumable_threshold)
+    with stage(metrics, "upload"):
+        uploaded = execute_request(
+            drive_service.files().create(body=file_metadata, media_body=media, fields="id"),
+            throttle, stats,
+        )
     file_id = uploaded.get("id")
 
+    os.makedirs(raw_folder, exist_ok=True)  # may be a per-request temporary folder, so not cached
+    raw_output_path = os.path.join(raw_folder, f"{base_name}.html")
     try:
-        html_bytes = drive_service.files().export(fileId=file_id, mimeType="text/html").execute()
-        html_content = html_bytes.decode("utf-8") if isinstance(html_bytes, bytes) else html_bytes
-    except Exception as e:
-        try:
-            drive_service.files().delete(fileId=file_id).execute()
-        except Exception:
-            pass
-        raise e
+        with stage(metrics, "export"):
+            download_to_file(drive_service.files().export_media(fileId=file_id, mimeType="text/html"),
+                             raw_output_path, throttle, stats)
+    finally:
+        with stage(metrics, "delete"):
+            if cleanup_queue is not None:
+                cleanup_queue.enqueue(file_id)
+            else:
+                try:
+                    execute_request(drive_service.files().delete(fileId=file_id), throttle, stats)
+                except Exception:
+                    pass
 
-    try:
-        drive_service.files().delete(fileId=file_id).execute()
-    except Exception:
-        pass
+    print(f"Saved raw HTML -> {raw_output_path}")
+    return raw_output_path
+
+def export_docx_html(drive_service, input_path, raw_folder, cleanup_queue=None, throttle=None, stats=None,
+                     resumable_threshold=RESUMABLE_UPLOAD_THRESHOLD, metrics=None):
+    """export_docx_raw, returning the raw export's HTML instead of its path"""
+    raw_path = export_docx_raw(drive_service, input_path, raw_folder, cleanup_queue, throttle, stats,
+                               resumable_threshold, metrics)
+    return read_raw_html(raw_path, metrics)
 
-    # Save raw HTML first
-    os.makedirs(raw_folder, exist_ok=True)
+async def export_docx_raw_async(client, input_path, raw_folder, cleanup_queue=None, stats=None,
+                                resumable_threshold=RESUMABLE_UPLOAD_THRESHOLD, metrics=None):
+    """
+    export_docx_raw through an async_drive.AsyncDriveClient, so many documents can be
+    uploaded and exported at once from one event loop thread.
+    """
+    filename = os.path.basename(input_path)
+    base_name = os.path.splitext(filename)[0]
+    print(f"\nUploading {filename} to Google Drive...")
+
+    with stage(metrics, "upload"):
+        file_id = await client.upload(input_path, filename, resumable_threshold, stats=stats)
+
+    os.makedirs(raw_folder, exist_ok=True)  # may be a per-request temporary folder, so not cached
     raw_output_path = os.path.join(raw_folder, f"{base_name}.html")
-    with open(raw_output_path, "w", encoding="utf-8") as f:
-        f.write(html_content)
+    try:
+        with stage(metrics, "export"):
+            await client.export_to_file(file_id, raw_output_path, stats)
+    finally:
+        with stage(metrics, "delete"):
+            if cleanup_queue is not None:
+                await asyncio.to_thread(cleanup_queue.enqueue, file_id)  # writes the pending list
+            else:
+                try:
+                    await client.delete(file_id, stats)
+                except Exception:
+                    pass
+
     print(f"Saved raw HTML -> {raw_output_path}")
+    return raw_output_path
 
-    # Clean and save cleaned HTML
-    cleaned_html = clean_html(html_content)
+def read_raw_html(raw_path, metrics=None):
+    """The text of a raw export saved on disk"""
+    with stage(metrics, "read"):
+        with open(raw_path, "r", encoding="utf-8") as f:
+            return f.read()
 
-    # Create individual blog folder (first 10 chars of filename, sanitized)
-    folder_name = base_name[:10] if len(base_name) > 10 else base_name
-    # Strip trailing spaces and replace remaining spaces with underscores
-    folder_name = folder_name.strip().replace(' ', '_')
-    blog_folder = os.path.join(output_folder, folder_name)
-    os.makedirs(blog_folder, exist_ok=True)
+def clean_and_tag(html_content, tags_file=None, memory_ceiling=MEMORY_CEILING_MB, metrics=None, raw_path=None,
+                  images=None):
+    """
+    Clean a raw export (html_content, or the file at raw_path) and suggest tags for it.
+    Images are saved as images (a blog_images.ImageOptions) says, if given (see clean_html).
+    Returns (cleaned_html, suggested_tags); suggested_tags is None if there are no tags to
+    match against or tagging failed.
+    """
+    cleaned_html = clean_html_within_ceiling(html_content, memory_ceiling, metrics, raw_path, images)
+    del html_content  # only the cleaned HTML is needed while tagging
+    return cleaned_html, tag_html(cleaned_html, tags_file, metrics)
 
-    # Save HTML in blog folder
-    output_path = os.path.join(blog_folder, f"{base_name}.html")
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write(cleaned_html)
+def tag_html(cleaned_html, tags_file=None, metrics=None):
+    """
+    Suggested tags for cleaned HTML, or None if there are no tags to match against or tagging failed.
+    Only the post's body is searched, not the stylesheet in front of it.
+    """
+    try:
+        with stage(metrics, "tag"):
+            catalog = get_tag_catalog(tags_file)
+            if catalog.tags:
+                return catalog.find(post_body(cleaned_html))
+    except Exception as e:
+        print(f"Warning: Could not generate tags: {e}")
+    return None
 
-    print(f"Saved cleaned HTML -> {output_path}")
+_output_writer = OutputWriter(OUTPUT_FSYNC)
 
-    # Generate and save tags
-    suggested_tags = []
-    try:
-        # Import tagFinder functions
-        import sys
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        if script_dir not in sys.path:
-            sys.path.insert(0, script_dir)
+def get_output_writer():
+    """The process-wide OutputWriter, so each output folder is created only once per run"""
+    return _output_writer
 
-        from tagFinder import load_tags, find_tags
+def post_output_paths(base_name, output_folder):
+    """(blog folder, cleaned HTML path, tags.txt path) for one post"""
+    # Individual blog folder (first 10 chars of filename, sanitized, made unique; see output_writer.py)
+    blog_folder = os.path.join(output_folder, post_folder_name(base_name))
+    return blog_folder, os.path.join(blog_folder, f"{base_name}.html"), os.path.join(blog_folder, "tags.txt")
 
-        # Merge baked-in tags with Tags.txt if present
-        def _normalize_tag(tag):
-            return tag.strip().lower()
+def post_image_options(base_name, output_folder, recompress=RECOMPRESS_IMAGES, fetch_remote=FETCH_REMOTE_IMAGES,
+                       cache_folder=IMAGE_CACHE_FOLDER, endpoint=IMAGE_ENDPOINT):
+    """blog_images.ImageOptions saving a post's images into its blog folder's images/ subfolder"""
+    images_folder = os.path.join(post_output_paths(base_name, output_folder)[0], IMAGES_FOLDER)
+    return ImageOptions(images_folder, recompress, fetch_remote, cache_folder, endpoint)
 
-        merged_tags = []
-        seen = set()
+def post_images(base_name, output_folder, extract_images=EXTRACT_IMAGES, recompress=RECOMPRESS_IMAGES,
+                fetch_remote=FETCH_REMOTE_IMAGES, cache_folder=IMAGE_CACHE_FOLDER, endpoint=IMAGE_ENDPOINT):
+    """
+    The images argument a post is cleaned with: post_image_options, or None (embedded images
+    dropped) without extract_images. clean_html itself picks clean_html_simple for documents
+    without the "Begin writing" marker, so this and the export are all a cleaning run needs.
+    """
+    if not extract_images:
+        return None
+    return post_image_options(base_name, output_folder, recompress, fetch_remote, cache_folder, endpoint)
 
-        for tag in DEFAULT_TAGS:
-            norm = _normalize_tag(tag)
-            if norm and norm not in seen:
-                merged_tags.append(tag)
-                seen.add(norm)
+def save_converted_html(base_name, output_folder, cleaned_html, suggested_tags, metrics=None):
+    """
+    Write the cleaned HTML and tags.txt into the post's folder; returns the HTML path.
+    Both files are replaced together, so an interrupted write leaves the previous versions.
+    """
+    _, output_path, tags_output_path = post_output_paths(base_name, output_folder)
+    files = {output_path: cleaned_html}
+    if suggested_tags is not None:
+        files[tags_output_path] = '\n'.join(suggested_tags)
+    with stage(metrics, "write"):
+        get_output_writer().write_files(files)
 
-        if tags_file and os.path.exists(tags_file):
-            for tag in load_tags(tags_file):
-                norm = _normalize_tag(tag)
-                if norm and norm not in seen:
-                    merged_tags.append(tag)
-                    seen.add(norm)
+    print(f"Saved cleaned HTML -> {output_path}")
+    if suggested_tags is not None:
+        print(f"Saved tags -> {tags_output_path}")
 
-        if merged_tags:
-            suggested_tags = find_tags(cleaned_html, merged_tags)
+    return output_path
 
-            # Save tags to file in blog folder
-            tags_output_path = os.path.join(blog_folder, "tags.txt")
-            with open(tags_output_path, "w", encoding="utf-8") as f:
-                f.write('\n'.join(suggested_tags))
+def save_tags(tags_output_path, suggested_tags, metrics=None):
+    """Write suggested tags to the post's tags.txt, one per line"""
+    with stage(metrics, "write"):
+        get_output_writer().write(tags_output_path, '\n'.join(suggested_tags))
 
-            print(f"Saved tags -> {tags_output_path}")
-    except Exception as e:
-        print(f"Warning: Could not generate tags: {e}")
+    print(f"Saved tags -> {tags_output_path}")
+
+def convert_docx_to_html(drive_service, input_path, output_folder, raw_folder, tags_file=None,
+                         cleanup_queue=None, throttle=None, stats=None,
+                         resumable_threshold=RESUMABLE_UPLOAD_THRESHOLD, metrics=None,
+                         memory_ceiling=MEMORY_CEILING_MB, extract_images=EXTRACT_IMAGES,
+                         recompress_images=RECOMPRESS_IMAGES, fetch_images=FETCH_REMOTE_IMAGES):
+    """
+    Convert one .docx via Google Drive and save raw HTML, cleaned HTML and tags.
+    If cleanup_queue (a DriveCleanupQueue) is given, the temp Google Doc is deleted in
+    the background instead of blocking on a delete call.
+    If throttle (a DriveThrottle) is given, Drive calls are rate limited and retried;
+    the number of retries is recorded in stats['retries'] when stats is a dict.
+    Files smaller than resumable_threshold bytes are uploaded in a single request.
+    If metrics (a run_metrics.DocumentMetrics) is given, every stage is timed.
+    Documents expected to need more than memory_ceiling MB to clean are cleaned in a
+    separate process (see clean_html_within_ceiling).
+    With extract_images, embedded images are saved to the post's images/ folder (optionally
+    recompressed) instead of being dropped, and with fetch_images so are linked ones.
+    """
+    base_name = os.path.splitext(os.path.basename(input_path))[0]
+    raw_path = export_docx_raw(drive_service, input_path, raw_folder, cleanup_queue, throttle, stats,
+                               resumable_threshold, metrics)
+    images = post_images(base_name, output_folder, extract_images, recompress_images, fetch_images)
+    cleaned_html, suggested_tags = clean_and_tag(None, tags_file, memory_ceiling, metrics, raw_path, images)
+    output_path = save_converted_html(base_name, output_folder, cleaned_html, suggested_tags, metrics)
+    return output_path, suggested_tags or []
+
+# ==== BUILD MANIFEST ====
+
+def cleaner_version(extract_images=EXTRACT_IMAGES, recompress_images=RECOMPRESS_IMAGES,
+                    fetch_images=FETCH_REMOTE_IMAGES):
+    """
+    Hash of the code, link rewrite rules, stylesheet and image options that turn a raw export
+    into cleaned HTML
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    stylesheet_path, stylesheet_url = blog_template_settings()
+    return combined_hash([os.path.abspath(__file__), os.path.join(script_dir, "url_rewrites.py"),
+                          os.path.join(script_dir, "blog_images.py"), os.path.join(script_dir, "blog_template.py"),
+                          get_link_rewrites().path, stylesheet_path],
+                         [f"images={extract_images},recompress={recompress_images},fetch={fetch_images}",
+                          f"stylesheet_url={stylesheet_url}"])
+
+def tagger_version(tags_file=None):
+    """Hash of the merged tag list and the tag finder's code"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return combined_hash([os.path.join(script_dir, "tagFinder.py")], ['\n'.join(merge_tag_lists(tags_file))])
+
+# ==== CLEANING PROCESSES ====
+
+def warm_clean_worker(tags_file, stylesheet=None):
+    """
+    Load the tag catalog, link rewrites and blog template once when a cleaning process starts;
+    stylesheet is the (path, URL) from blog_template_settings() in the main process
+    """
+    # Ctrl+C is handled by the main process, which lets running documents finish
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    get_tag_catalog(tags_file)
+    get_link_rewrites()
+    if stylesheet is not None:
+        set_blog_template(*stylesheet)
+    get_blog_template()
+
+def start_clean_pool(processes, tags_file=None):
+    """
+    ProcessPoolExecutor of long-lived cleaning processes, so cleaning and tagging (pure CPU)
+    use every core while Drive I/O stays in threads. Each process keeps its tag catalog warm
+    and uses this process's blog template.
+    """
+    return ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=warm_clean_worker, initargs=(tags_file, blog_template_settings()))
+
+def clean_and_tag_in_worker(html_content, tags_file=None, timed=False, raw_path=None, images=None):
+    """clean_and_tag for a cleaning process; returns (cleaned_html, suggested_tags, stage timings)"""
+    metrics = DocumentMetrics("worker") if timed else None
+    cleaned_html, suggested_tags = clean_and_tag(html_content, tags_file, None, metrics, raw_path, images)
+    return cleaned_html, suggested_tags, metrics.stages if metrics else {}
+
+def clean_and_tag_in_pool(clean_pool, html_content, tags_file=None, memory_ceiling=MEMORY_CEILING_MB,
+                          metrics=None, raw_path=None, images=None):
+    """
+    clean_and_tag run by clean_pool. With raw_path instead of html_content the worker reads
+    the export from disk, so it is never copied between processes. Documents over
+    memory_ceiling still get their own single-use process. Worker stage timings are added to
+    metrics, along with the time spent waiting for a free process as 'clean.queue'.
+    """
+    if exceeds_memory_ceiling(memory_ceiling, html_content, raw_path):
+        return clean_and_tag(html_content, tags_file, memory_ceiling, metrics, raw_path, images)
+
+    started = time.perf_counter()
+    future = clean_pool.submit(clean_and_tag_in_worker, html_content, tags_file, metrics is not None,
+                               raw_path, images)
+    del html_content
+    cleaned_html, suggested_tags, stages = future.result()
+    if metrics is not None:
+        for name, seconds in stages.items():
+            metrics.stages[name] = metrics.stages.get(name, 0.0) + seconds
+        queued = time.perf_counter() - started - sum(stages.values())
+        metrics.stages["clean.queue"] = metrics.stages.get("clean.queue", 0.0) + max(queued, 0.0)
+    return cleaned_html, suggested_tags
+
+# ==== PROFILING ====
+
+def profile_passes(path):
+    """
+    Clean a raw HTML export, or every .html file in a folder, with a PassProfiler and
+    print the cleanup passes ranked by time. No Google Drive access is needed.
+    """
+    if os.path.isdir(path):
+        paths = [os.path.join(path, f) for f in sorted(os.listdir(path)) if f.lower().endswith(".html")]
+    else:
+        paths = [path]
+    if not paths:
+        print(f"No .html files found in {path}")
+        return None
+
+    profiler = PassProfiler()
+    for html_path in paths:
+        with open(html_path, "r", encoding="utf-8") as f:
+            raw_html = f.read()
+        clean_html(raw_html, profiler=profiler)
+        profiler.documents += 1
+
+    print(f"Cleanup passes by time ({profiler.documents} "
+          f"{'document' if profiler.documents == 1 else 'documents'} from {path}):")
+    print(format_profile(profiler))
+    return profiler
+
+# ==== WATCH MODE ====
+
+def watch_todo(input_folder, executor, convert_one, settle_seconds=SETTLE_SECONDS, stop=None):
+    """
+    Convert .docx files in input_folder as they arrive or change, until Ctrl+C (or until stop,
+    a threading.Event, is set).
+    Files already there are converted first. Each file is handed to convert_one (run on
+    executor) once it has been unchanged for settle_seconds; converted sources are moved to
+    done/, failed ones stay in todo/ and are retried when they are saved again. A file saved
+    again while it was being converted also stays, and the new version is converted once the
+    earlier conversion has finished; a file is never converted twice at once.
+    Returns the convert_one results.
+    """
+    watcher = create_watcher(input_folder)
+    tracker = SettleTracker(input_folder, settle_seconds)
+    tracker.touch_existing()
+    running = {}  # future -> (filename, file signature when its conversion started)
+    results = []
+
+    def finish(future):
+        filename, error, retries = future.result()
+        _, signature = running.pop(future)
+        results.append((filename, error, retries))
+        if error is None:
+            try:
+                destination = move_to_done(input_folder, filename, signature=signature)
+                if destination is None:
+                    print(f"Changed during conversion: {filename} stays in todo/ to be converted again")
+                else:
+                    print(f"Done: {filename} -> {destination}")
+            except OSError as e:
+                print(f"Warning: could not move {filename} to {DONE_FOLDER}/: {e}")
 
-    return output_path, suggested_tags
+    print(f"\nWatching {input_folder} for .docx files (Ctrl+C to stop)...")
+    try:
+        while stop is None or not stop.is_set():
+            for future in [f for f in running if f.done()]:
+                finish(future)
+
+            converting = {filename for filename, _ in running.values()}
+            for filename in tracker.ready():
+                if filename in converting:
+                    # Saved again mid-conversion: wait for that conversion, which writes the same files
+                    tracker.defer(filename)
+                    continue
+                signature = file_signature(os.path.join(input_folder, filename))
+                running[executor.submit(convert_one, filename)] = (filename, signature)
+                converting.add(filename)
+
+            timeout = tracker.next_check()
+            if running or stop is not None:
+                timeout = min(timeout or 0.5, 0.5)
+            for name in watcher.wait(timeout if timeout is not None else 60.0):
+                tracker.touch(name)
+        print("\nStopping watch; waiting for conversions in progress...")
+    except KeyboardInterrupt:
+        print("\nStopping watch; waiting for conversions in progress...")
+    finally:
+        watcher.close()
+    for future in list(running):
+        finish(future)
+    return results
 
 # ==== MAIN ====
 
-def main():
-    creds = get_credentials()
-    drive_service = build("drive", "v3", credentials=creds)
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Convert .docx files in todo/ to clean blog HTML.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"maximum documents using Google Drive at once (default: {DEFAULT_WORKERS}); "
+                             "lowered automatically while Google Drive is throttling")
+    parser.add_argument("--clean-processes", type=int, default=DEFAULT_CLEAN_PROCESSES, metavar="N",
+                        help="clean and tag exports in N worker processes while Drive calls run in threads "
+                             f"(default: {DEFAULT_CLEAN_PROCESSES}, the number of CPUs); 0 cleans in the "
+                             "conversion threads")
+    parser.add_argument("--max-pending", type=int, default=None, metavar="N",
+                        help="at most N documents are exported and waiting to be cleaned or saved, which "
+                             "bounds the raw HTML held in memory (default: twice --clean-processes, "
+                             "at least --workers)")
+    parser.add_argument("--resumable-threshold", type=int, default=RESUMABLE_UPLOAD_THRESHOLD // 1024,
+                        metavar="KB",
+                        help="files at least this large use a resumable upload, smaller ones a single "
+                             f"request (default: {RESUMABLE_UPLOAD_THRESHOLD // 1024})")
+    parser.add_argument("--drive-endpoint", default=DRIVE_ENDPOINT, metavar="URL",
+                        help="send Drive calls to this server (e.g. fake_drive.py) instead of Google; "
+                             "no credentials are needed (default: $DPP_DRIVE_ENDPOINT)")
+    parser.add_argument("--metrics", nargs="?", const="", default=None, metavar="REPORT",
+                        help="time every stage of every document and write a JSONL run report "
+                             "(default: metrics/run-<timestamp>.jsonl) plus a .summary.json with p50/p95")
+    parser.add_argument("--memory-report", action="store_true",
+                        help="also trace memory with tracemalloc and report each stage's peak allocation "
+                             "(implies --metrics; documents are converted one at a time so peaks are not mixed)")
+    parser.add_argument("--memory-ceiling", type=float, default=MEMORY_CEILING_MB, metavar="MB",
+                        help=f"clean documents estimated to need more than MB (export size x "
+                             f"{SOUP_EXPANSION_FACTOR}) in a separate process, one at a time (default: off)")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and convert each .docx as soon as it lands in todo/ (or is saved "
+                             f"again) and has been unchanged for --settle seconds; converted files move to "
+                             f"{DONE_FOLDER}/. Stop with Ctrl+C")
+    parser.add_argument("--settle", type=float, default=SETTLE_SECONDS, metavar="SECONDS",
+                        help=f"with --watch, how long a file must stay unchanged before converting it "
+                             f"(default: {SETTLE_SECONDS})")
+    parser.add_argument("--async-drive", action="store_true",
+                        help="upload and export with the asyncio Drive client (needs aiohttp), so up to "
+                             "--in-flight documents are in flight on one thread; not used with --watch "
+                             "or --memory-report")
+    parser.add_argument("--in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT, metavar="N",
+                        help=f"with --async-drive, maximum documents in progress at once "
+                             f"(default: {DEFAULT_MAX_IN_FLIGHT}); Drive calls are lowered automatically "
+                             "while Google Drive is throttling")
+    parser.add_argument("--connections", type=int, default=DEFAULT_CONNECTIONS, metavar="N",
+                        help=f"with --async-drive, HTTP connections shared by all documents "
+                             f"(default: {DEFAULT_CONNECTIONS})")
+    parser.add_argument("--no-extract-images", dest="extract_images", action="store_false",
+                        default=EXTRACT_IMAGES,
+                        help=f"drop images embedded in the export instead of saving them to the post's "
+                             f"{IMAGES_FOLDER}/ folder")
+    parser.add_argument("--recompress-images", action="store_true", default=RECOMPRESS_IMAGES,
+                        help=f"re-encode saved images with Pillow (optimized PNG, JPEG/WebP at quality "
+                             f"{IMAGE_QUALITY}), keeping whichever file is smaller")
+    parser.add_argument("--fetch-images", action="store_true", default=FETCH_REMOTE_IMAGES,
+                        help=f"also download the images the export links to ({IMAGE_FETCH_WORKERS} at a time) into the "
+                             f"post's {IMAGES_FOLDER}/ folder; downloads are cached in {IMAGE_CACHE_FOLDER}/ "
+                             "so reruns don't fetch them again")
+    parser.add_argument("--image-endpoint", default=IMAGE_ENDPOINT, metavar="URL",
+                        help="with --fetch-images, send image downloads to this server instead of the image "
+                             "hosts (e.g. a fake_drive.py URL)")
+    parser.add_argument("--fsync", action="store_true", default=OUTPUT_FSYNC,
+                        help="flush each cleaned HTML and tags.txt to disk before the document counts as done, "
+                             "so a power cut can't leave empty or truncated files (slower)")
+    parser.add_argument("--cms-export", metavar="PATH",
+                        help="also write every converted post (title, slug, body HTML, tags, source hash) to "
+                             "PATH, one record per post as it finishes, for bulk import into a CMS; CSV if PATH "
+                             "ends in .csv, otherwise NDJSON")
+    parser.add_argument("--cms-format", choices=EXPORT_FORMATS, default=None,
+                        help="with --cms-export, the format regardless of the file extension")
+    parser.add_argument("--stylesheet", default=STYLESHEET_PATH, metavar="PATH",
+                        help="CSS file every post is styled with (default: blog_style.css next to this "
+                             "script); it is minified once per run")
+    parser.add_argument("--stylesheet-url", default=STYLESHEET_URL, metavar="URL",
+                        help=f"link posts to the stylesheet at URL instead of inlining it in each post; the "
+                             f"minified CSS is written to {OUTPUT_FOLDER}/{STYLESHEET_NAME} to upload there")
+    parser.add_argument("--force", action="store_true",
+                        help=f"convert every document from scratch, ignoring {MANIFEST_FILE} (which normally "
+                             "skips unchanged documents and redoes only the stages whose inputs changed)")
+    parser.add_argument("--profile-passes", metavar="PATH",
+                        help="clean a raw HTML export (or a folder of them, e.g. raw_html) offline, "
+                             "print each cleanup pass's time, nodes visited and nodes mutated, and exit")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    template = set_blog_template(args.stylesheet, args.stylesheet_url)
+    if args.profile_passes:
+        profile_passes(args.profile_passes)
+        return
+
+    creds = None if args.drive_endpoint else get_credentials()
 
     script_folder = os.path.dirname(os.path.abspath(__file__))
     input_folder = os.path.join(script_folder, "todo")
     output_folder = os.path.join(script_folder, OUTPUT_FOLDER)
     raw_folder = os.path.join(script_folder, RAW_FOLDER)
+    image_cache_folder = os.path.join(script_folder, IMAGE_CACHE_FOLDER)
     tags_file = os.path.join(script_folder, "Tags.txt")
 
-    os.makedirs(output_folder, exist_ok=True)
-    os.makedirs(raw_folder, exist_ok=True)
+    writer = get_output_writer()
+    writer.fsync = args.fsync
+    writer.ensure_dir(output_folder)
+    writer.ensure_dir(raw_folder)
+    if template.stylesheet_url:
+        stylesheet_path = os.path.join(output_folder, STYLESHEET_NAME)
+        writer.write(stylesheet_path, template.css + '\n')
+        print(f"Posts link to {template.stylesheet_url}; upload {stylesheet_path} there")
 
     if not os.path.exists(input_folder):
         print(f"Error: 'todo' folder not found at {input_folder}")
@@ -1590,17 +2026,212 @@ def main():
 
     print("Starting Google Docs -> HTML export...")
 
-    for filename in os.listdir(input_folder):
-        if filename.lower().endswith(".docx"):
-            input_path = os.path.join(input_folder, filename)
-            try:
-                convert_docx_to_html(drive_service, input_path, output_folder, raw_folder, tags_file)
-            except Exception as e:
-                print(f"Error converting {filename}: {e}")
+    # Set before the throttle and pools are sized from args.workers
+    if args.memory_report:
+        print("Memory report: tracing allocations, converting one document at a time")
+        args.workers = 1
+        tracemalloc.start()
+
+    # One token bucket and concurrency limit shared by every Drive call
+    throttle = DriveThrottle(max_concurrency=args.workers)
+
+    # googleapiclient services are not thread-safe, so each worker thread builds its own
+    local = threading.local()
+
+    def thread_service():
+        if not hasattr(local, "drive_service"):
+            local.drive_service = build_drive_service(creds, args.drive_endpoint)
+        return local.drive_service
+
+    # Temp docs are deleted in batches by a background thread with its own service
+    cleanup_queue = DriveCleanupQueue(
+        lambda: build_drive_service(creds, args.drive_endpoint),
+        pending_file=os.path.join(script_folder, PENDING_DELETES_FILE),
+        throttle=throttle,
+    )
+
+    run_metrics = None
+    if args.metrics is not None or args.memory_report:
+        report_path = args.metrics or os.path.join(
+            script_folder, "metrics", f"run-{time.strftime('%Y%m%d-%H%M%S')}.jsonl")
+        run_metrics = RunMetrics(report_path, trace_memory=args.memory_report)
+
+    filenames = [f for f in os.listdir(input_folder) if f.lower().endswith(".docx")]
+
+    # Cleaning and tagging are CPU-bound, so with more than one document they run in worker
+    # processes; one thread per pending document does the Drive I/O and waits for its result
+    clean_pool = None
+    if args.memory_report:
+        args.clean_processes = 0  # tracemalloc only sees this process
+    if args.clean_processes > 0 and (len(filenames) > 1 or args.watch):
+        clean_pool = start_clean_pool(args.clean_processes, tags_file)
+        max_pending = args.max_pending or max(args.workers, 2 * args.clean_processes)
+    else:
+        max_pending = args.max_pending or args.workers
+
+    # Hashes of every document's inputs and outputs, so unchanged work is not redone
+    manifest = BuildManifest(os.path.join(script_folder, MANIFEST_FILE))
+    # Hashing the cleanup and tagging code once per run, not per document; a file changed
+    # during the run only makes the next run redo those documents again
+    versions = {"cleaner": cleaner_version(args.extract_images, args.recompress_images, args.fetch_images),
+                "tagger": tagger_version(tags_file)}
+
+    # Every post that finishes is appended to the bulk import file as it finishes
+    cms_export = CmsExport(args.cms_export, args.cms_format) if args.cms_export else None
+
+    # A document goes through plan_job (what needs redoing), the Drive export if the source
+    # changed, then finish_job (clean, tag, save, record); the Drive step runs in a thread
+    # per document, or as a coroutine with --async-drive
+    def plan_job(filename):
+        base_name = os.path.splitext(filename)[0]
+        _, html_path, tags_path = post_output_paths(base_name, output_folder)
+        job = {"filename": filename, "input_path": os.path.join(input_folder, filename), "base_name": base_name,
+               "raw_path": os.path.join(raw_folder, f"{base_name}.html"), "html_path": html_path,
+               "tags_path": tags_path, "stats": {"retries": 0}, "action": CONVERT,
+               "metrics": run_metrics.document(filename) if run_metrics else None}
+        try:
+            with stage(job["metrics"], "plan"):
+                job["source_hash"] = file_hash(job["input_path"])
+                job["cleaner"], job["tagger"] = versions["cleaner"], versions["tagger"]
+                if not args.force:
+                    job["action"] = manifest.plan(filename, job["source_hash"], job["raw_path"], html_path,
+                                                  tags_path, job["cleaner"], job["tagger"])
+        except Exception as e:
+            job["error"] = e
+        return job
+
+    def finish_job(job, error=None):
+        filename, action, doc_metrics = job["filename"], job["action"], job["metrics"]
+        raw_path, html_path, tags_path = job["raw_path"], job["html_path"], job["tags_path"]
+        error = error or job.get("error")
+        try:
+            if error is not None:
+                raise error
+            if action == SKIP:
+                print(f"\nUp to date: {filename}")
+            elif action == TAG:
+                # Only the tag list or tag finder changed: re-tag the saved cleaned HTML
+                print(f"\nRe-tagging {filename}...")
+                with stage(doc_metrics, "read"):
+                    with open(html_path, "r", encoding="utf-8") as f:
+                        cleaned_html = f.read()
+                suggested_tags = tag_html(cleaned_html, tags_file, doc_metrics)
+                if suggested_tags is not None:
+                    save_tags(tags_path, suggested_tags, doc_metrics)
+            else:
+                if action == CLEAN:
+                    # The source is unchanged but the cleanup code is not: re-clean the saved export
+                    print(f"\nRe-cleaning {filename} from {raw_path}...")
+                # Either way the export is cleaned from raw_path, read by whichever process cleans it
+                images = post_images(job["base_name"], output_folder, args.extract_images, args.recompress_images,
+                                     args.fetch_images, image_cache_folder, args.image_endpoint)
+                if clean_pool is not None:
+                    cleaned_html, suggested_tags = clean_and_tag_in_pool(
+                        clean_pool, None, tags_file, args.memory_ceiling, doc_metrics, raw_path, images)
+                else:
+                    cleaned_html, suggested_tags = clean_and_tag(None, tags_file, args.memory_ceiling,
+                                                                 doc_metrics, raw_path, images)
+                save_converted_html(job["base_name"], output_folder, cleaned_html, suggested_tags, doc_metrics)
+
+            if action != SKIP:
+                manifest.record(filename, source_hash=job["source_hash"], raw_hash=file_hash(raw_path),
+                                cleaner_version=job["cleaner"], tagger_version=job["tagger"],
+                                html_hash=file_hash(html_path),
+                                tags_hash=file_hash(tags_path) if suggested_tags is not None else None,
+                                converted=time.strftime('%Y-%m-%dT%H:%M:%S'))
+            if cms_export is not None:
+                # Read back from disk so only one post is held at a time (skipped ones included)
+                with stage(doc_metrics, "cms_export"):
+                    cms_export.add_files(job["base_name"], html_path, tags_path, filename, job["source_hash"])
+        except Exception as e:
+            print(f"Error converting {filename}: {e}")
+            error = e
+        retries = job["stats"]["retries"]
+        if run_metrics:
+            status = "failed" if error else ("skipped" if action == SKIP else "ok")
+            run_metrics.record(doc_metrics, status=status, retries=retries, error=str(error) if error else None)
+        return filename, error, retries
+
+    def convert_one(filename):
+        job = plan_job(filename)
+        if job["action"] != CONVERT or "error" in job:
+            return finish_job(job)
+        try:
+            with throttle.concurrency.slot():
+                export_docx_raw(thread_service(), job["input_path"], raw_folder, cleanup_queue, throttle,
+                                job["stats"], args.resumable_threshold * 1024, job["metrics"])
+        except Exception as e:
+            return finish_job(job, e)
+        return finish_job(job)
+
+    async def convert_all_async(executor):
+        """Every file as a coroutine: Drive calls share one loop, cleaning and saving run on executor"""
+        loop = asyncio.get_running_loop()
+        documents = asyncio.Semaphore(max(1, args.in_flight))
+
+        # The cleanup queue's deletes draw from the same request budget as the async client
+        async with AsyncDriveClient(creds, args.drive_endpoint, max_concurrency=args.in_flight,
+                                    connections=args.connections, shared_bucket=throttle.bucket) as client:
+            async def convert_one_async(filename):
+                async with documents:
+                    job = await loop.run_in_executor(executor, plan_job, filename)
+                    if job["action"] != CONVERT or "error" in job:
+                        return await loop.run_in_executor(executor, finish_job, job)
+                    try:
+                        async with client.slot():
+                            await export_docx_raw_async(client, job["input_path"], raw_folder, cleanup_queue,
+                                                        job["stats"], args.resumable_threshold * 1024,
+                                                        job["metrics"])
+                    except Exception as e:
+                        return await loop.run_in_executor(executor, finish_job, job, e)
+                    return await loop.run_in_executor(executor, finish_job, job)
+
+            return await asyncio.gather(*(convert_one_async(filename) for filename in filenames))
+
+    use_async = args.async_drive
+    if use_async and (args.watch or args.memory_report):
+        print("Note: --async-drive is not used with --watch or --memory-report; using threads")
+        use_async = False
+
+    try:
+        with cleanup_queue:
+            with ThreadPoolExecutor(max_workers=max(1, max_pending)) as executor:
+                if args.watch:
+                    results = watch_todo(input_folder, executor, convert_one, args.settle)
+                elif use_async:
+                    results = asyncio.run(convert_all_async(executor))
+                else:
+                    results = list(executor.map(convert_one, filenames))
+
+            print("\nRemoving temp docs from Google Drive...")
+    finally:
+        if clean_pool is not None:
+            clean_pool.shutdown()
+        if cms_export is not None:
+            cms_export.close()
 
     print("\nAll files processed!")
+    for filename, error, retries in results:
+        status = "FAILED" if error else "ok"
+        print(f"  {status}: {filename} ({retries} {'retry' if retries == 1 else 'retries'})")
     print(f"Raw HTML: {raw_folder}")
     print(f"Cleaned HTML: {output_folder}")
+    if cms_export is not None:
+        print(f"CMS export: {cms_export.count} posts -> {cms_export.path}")
+
+    if run_metrics:
+        summary = run_metrics.close()
+        print(f"\nSlowest stages ({summary['documents']} documents, {summary['wall_seconds']:.1f}s):")
+        print(format_summary(summary, limit=10))
+        if args.memory_report:
+            tracemalloc.stop()
+            print(f"\nLargest stage allocations (traced peak {summary['traced_peak_bytes'] / 2**20:.1f} MB):")
+            print(format_memory_summary(summary, limit=10))
+            if summary['max_rss_bytes']:
+                print(f"Peak RSS: {summary['max_rss_bytes'] / 2**20:.1f} MB")
+        print(f"Run report: {run_metrics.report_path}")
+        print(f"Summary: {run_metrics.summary_path}")
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,387 @@
+# drive_client.py
+
+# Helpers around the Google Drive API used by convert_blog.py.
+
+import os
+import json
+import time
+import queue
+import random
+import socket
+import threading
+from contextlib import contextmanager
+
+import httplib2
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaFileUpload, MediaInMemoryUpload, MediaIoBaseDownload
+
+# ==== CONFIGURATION ====
+
+PENDING_DELETES_FILE = 'pending_deletes.json'
+DELETE_BATCH_SIZE = 50        # Drive accepts up to 100 calls per batch request
+DELETE_FLUSH_INTERVAL = 2.0   # seconds to wait for more IDs before sending a batch
+DRIVE_REQUESTS_PER_SECOND = 8.0
+DRIVE_BURST = 8
+MAX_RETRIES = 6
+BACKOFF_BASE = 1.0            # seconds; doubled on every retry
+BACKOFF_MAX = 32.0
+RATE_LIMIT_REASONS = {'userRateLimitExceeded', 'rateLimitExceeded'}
+DOCX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+RESUMABLE_UPLOAD_THRESHOLD = 5 * 1024 * 1024  # bytes; smaller files use one multipart request
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024           # must be a multiple of 256 KB
+DOWNLOAD_CHUNK_SIZE = 4 * 1024 * 1024         # exports are streamed to disk in chunks this size
+
+# ==== SERVICE ====
+
+def build_drive_service(credentials=None, endpoint=None):
+    """
+    Build a Drive v3 service.
+    endpoint (e.g. 'http://127.0.0.1:8765/' from fake_drive.py) sends every call, including
+    uploads and batch requests, to that server instead of Google, without credentials.
+    """
+    if not endpoint:
+        return build("drive", "v3", credentials=credentials)
+    # client_options api_endpoint does not cover media uploads or batch requests,
+    # so point the discovery document itself at the endpoint
+    document = json.loads(get_static_doc("drive", "v3"))
+    document['rootUrl'] = endpoint.rstrip('/') + '/'
+    document['mtlsRootUrl'] = document['rootUrl']
+    document['baseUrl'] = document['rootUrl'] + document['servicePath']
+    return build_from_document(document, http=httplib2.Http())
+
+# ==== UPLOADS ====
+
+def build_upload_media(input_path, mimetype=DOCX_MIMETYPE, resumable_threshold=RESUMABLE_UPLOAD_THRESHOLD,
+                       chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    Pick the upload strategy by file size.
+    Files below resumable_threshold are read into memory and sent as a single multipart
+    request; a resumable upload would cost an extra round trip just to open the session.
+    Larger files are streamed from disk as a resumable upload with chunk_size chunks so a
+    dropped connection does not restart them.
+    """
+    if os.path.getsize(input_path) < resumable_threshold:
+        with open(input_path, 'rb') as f:
+            return MediaInMemoryUpload(f.read(), mimetype=mimetype, resumable=False)
+    return MediaFileUpload(input_path, mimetype=mimetype, resumable=True, chunksize=chunk_size)
+
+# ==== RATE LIMITING AND RETRIES ====
+
+def get_error_reason(error):
+    """Return the Drive error reason (e.g. 'userRateLimitExceeded') of an HttpError, if any"""
+    try:
+        content = error.content.decode('utf-8') if isinstance(error.content, bytes) else error.content
+        errors = json.loads(content).get('error', {}).get('errors', [])
+        return errors[0].get('reason') if errors else None
+    except Exception:
+        return None
+
+def is_rate_limit_error(error):
+    """True for 429 and 403 rate limit responses"""
+    if not isinstance(error, HttpError):
+        return False
+    status = error.resp.status
+    return status == 429 or (status == 403 and get_error_reason(error) in RATE_LIMIT_REASONS)
+
+def is_retryable_error(error):
+    """True for rate limits, 5xx responses and dropped connections"""
+    if isinstance(error, HttpError):
+        return is_rate_limit_error(error) or error.resp.status >= 500
+    return isinstance(error, (ConnectionError, socket.timeout, TimeoutError))
+
+def backoff_delay(attempt, base=BACKOFF_BASE, maximum=BACKOFF_MAX):
+    """Exponential backoff with full jitter for the given retry attempt (0-based)"""
+    return random.uniform(0, min(maximum, base * (2 ** attempt)))
+
+class TokenBucket:
+    """Thread-safe token bucket shared by every Drive call in the process"""
+
+    def __init__(self, rate=DRIVE_REQUESTS_PER_SECOND, capacity=DRIVE_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """Take a token if one is available; returns 0, or the seconds until the next one"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        """Block until a token is available"""
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+class AdaptiveConcurrency:
+    """
+    Limits how many documents are in flight at once.
+    The limit is halved when Drive throttles us and grows by one after a run of
+    successful calls, up to maximum.
+    """
+
+    def __init__(self, maximum, minimum=1, initial=None):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.limit = initial or max(self.minimum, self.maximum // 2)
+        self._active = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def slot(self):
+        """Hold one in-flight slot for the duration of the block"""
+        with self._condition:
+            while self._active >= self.limit:
+                self._condition.wait()
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._active -= 1
+                self._condition.notify_all()
+
+    def on_success(self):
+        with self._condition:
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self._successes = 0
+                self._condition.notify_all()
+
+    def on_throttle(self):
+        with self._condition:
+            self._successes = 0
+            new_limit = max(self.minimum, self.limit // 2)
+            if new_limit < self.limit:
+                print(f"Drive is throttling requests, reducing concurrency to {new_limit}")
+            self.limit = new_limit
+
+class DriveThrottle:
+    """
+    Wraps Drive calls with a shared token bucket, jittered exponential backoff on
+    rate limit / 5xx / connection errors, and adaptive concurrency.
+    """
+
+    def __init__(self, max_concurrency=1, requests_per_second=DRIVE_REQUESTS_PER_SECOND,
+                 burst=DRIVE_BURST, max_retries=MAX_RETRIES):
+        self.bucket = TokenBucket(requests_per_second, burst)
+        self.concurrency = AdaptiveConcurrency(max_concurrency)
+        self.max_retries = max_retries
+
+    def execute(self, request, stats=None, **kwargs):
+        """
+        Execute a googleapiclient request (or batch), retrying transient failures.
+        If stats is a dict, its 'retries' count is incremented for every retry.
+        """
+        return self.call(lambda: request.execute(**kwargs), stats)
+
+    def call(self, function, stats=None):
+        """Call function (which makes one Drive request) with the same rate limiting and retries"""
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            try:
+                result = function()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable_error(e):
+                    raise
+                if is_rate_limit_error(e):
+                    self.concurrency.on_throttle()
+                if stats is not None:
+                    stats['retries'] = stats.get('retries', 0) + 1
+                time.sleep(backoff_delay(attempt))
+                attempt += 1
+                continue
+            self.concurrency.on_success()
+            return result
+
+def execute_request(request, throttle=None, stats=None, **kwargs):
+    """Execute a Drive request through throttle if one is given"""
+    if throttle is None:
+        return request.execute(**kwargs)
+    return throttle.execute(request, stats=stats, **kwargs)
+
+# ==== DOWNLOADS ====
+
+def download_to_file(request, path, throttle=None, stats=None, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """
+    Stream a media request (e.g. files().export_media(...)) to path in chunk_size ranges,
+    so only one chunk is in memory at a time. Each chunk is rate limited and retried through
+    throttle. The file is written as path.part and renamed when complete.
+    Returns the number of bytes written.
+    """
+    partial_path = f"{path}.part"
+    try:
+        with open(partial_path, 'wb') as f:
+            downloader = MediaIoBaseDownload(f, request, chunksize=chunk_size)
+            done = False
+            while not done:
+                if throttle is None:
+                    _, done = downloader.next_chunk()
+                else:
+                    _, done = throttle.call(downloader.next_chunk, stats)
+            size = f.tell()
+    except BaseException:
+        try:
+            os.remove(partial_path)
+        except OSError:
+            pass  # e.g. open() failed, so there is no partial file; keep the original error
+        raise
+    os.replace(partial_path, path)
+    return size
+
+# ==== DEFERRED CLEANUP ====
+
+class DriveCleanupQueue:
+    """
+    Deletes temporary Google Docs in the background using Drive batch requests.
+
+    Every queued file ID is also written to a pending list on disk, so temp docs left
+    behind by a crashed run are deleted the next time the queue starts.
+
+    service_factory must return a new Drive service; the worker thread builds its own
+    because googleapiclient services are not safe to share between threads.
+    """
+
+    def __init__(self, service_factory, pending_file=PENDING_DELETES_FILE,
+                 batch_size=DELETE_BATCH_SIZE, flush_interval=DELETE_FLUSH_INTERVAL,
+                 throttle=None):
+        self.service_factory = service_factory
+        self.throttle = throttle
+        self.pending_file = pending_file
+        self.batch_size = min(batch_size, 100)
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = self._load_pending()
+        self._thread = None
+
+    def _load_pending(self):
+        """Load file IDs left over from a previous run"""
+        if not os.path.exists(self.pending_file):
+            return []
+        try:
+            with open(self.pending_file, 'r', encoding='utf-8') as f:
+                return [file_id for file_id in json.load(f) if file_id]
+        except Exception as e:
+            print(f"Warning: Could not read {self.pending_file}: {e}")
+            return []
+
+    def _save_pending(self):
+        """Persist the pending list (caller holds the lock)"""
+        temp_path = self.pending_file + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._pending, f)
+        os.replace(temp_path, self.pending_file)
+
+    def start(self):
+        """Start the worker thread and requeue anything a previous run left behind"""
+        if self._thread:
+            return self
+        with self._lock:
+            leftovers = list(self._pending)
+        if leftovers:
+            print(f"Cleaning up {len(leftovers)} temp doc(s) left by a previous run...")
+        for file_id in leftovers:
+            self._queue.put(file_id)
+        self._thread = threading.Thread(target=self._run, name="drive-cleanup", daemon=True)
+        self._thread.start()
+        return self
+
+    def enqueue(self, file_id):
+        """Schedule a Drive file for deletion"""
+        with self._lock:
+            if file_id not in self._pending:
+                self._pending.append(file_id)
+                self._save_pending()
+        self._queue.put(file_id)
+
+    def close(self, timeout=None):
+        """Send everything still queued and stop the worker thread"""
+        if not self._thread:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _run(self):
+        drive_service = None
+        stopping = False
+        while not stopping:
+            file_id = self._queue.get()
+            if file_id is None:
+                break
+            batch_ids = [file_id]
+
+            # Collect more IDs until the batch is full or the queue goes quiet
+            while len(batch_ids) < self.batch_size:
+                try:
+                    file_id = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    break
+                if file_id is None:
+                    stopping = True
+                    break
+                batch_ids.append(file_id)
+
+            try:
+                if drive_service is None:
+                    drive_service = self.service_factory()
+                self._delete_batch(drive_service, batch_ids)
+            except Exception as e:
+                # IDs stay in the pending file and are retried on the next start
+                print(f"Warning: Could not delete {len(batch_ids)} temp doc(s): {e}")
+
+    def _delete_batch(self, drive_service, file_ids):
+        """Delete file_ids in batch requests and drop the ones that are gone"""
+        deleted = set()
+        # Request IDs must be unique within a batch
+        remaining = list(dict.fromkeys(file_ids))
+        attempt = 0
+
+        while remaining:
+            throttled = []
+
+            def _callback(request_id, response, exception):
+                status = getattr(getattr(exception, 'resp', None), 'status', None)
+                # 404 means the file is already gone, which is what we wanted
+                if exception is None or status == 404:
+                    deleted.add(request_id)
+                elif is_retryable_error(exception):
+                    throttled.append(request_id)
+
+            batch = drive_service.new_batch_http_request(callback=_callback)
+            for file_id in remaining:
+                batch.add(drive_service.files().delete(fileId=file_id), request_id=file_id)
+            execute_request(batch, self.throttle)
+
+            # Individual deletes can be rate limited even when the batch call succeeds
+            if not throttled or attempt >= MAX_RETRIES:
+                break
+            time.sleep(backoff_delay(attempt))
+            attempt += 1
+            remaining = throttled
+
+        if deleted:
+            with self._lock:
+                self._pending = [file_id for file_id in self._pending if file_id not in deleted]
+                self._save_pending()
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Fake Drive - Local stand-in for the Google Drive v3 endpoints used by convert_blog.py
+Serves recorded exports from raw_html/ with configurable latency, throttling and errors, and
+stands in for the image host (googleusercontent.com) that exports link their images to
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import zlib
+import struct
+import hashlib
+import zipfile
+import argparse
+import threading
+from email.parser import BytesParser
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+
+DEFAULT_PORT = 8765
+
+
+class FakeDriveServer(ThreadingHTTPServer):
+    """
+    HTTP server holding the fake Drive's files and behaviour settings.
+
+    Args:
+        raw_folder: Folder of recorded exports; an upload named 'Post.docx' is exported
+            as raw_folder/Post.html. Without a recording, text is pulled from the .docx.
+        latency: Seconds added to every response (plus up to jitter seconds)
+        rate_limit: Requests per second allowed before answering with throttle_status
+            (0 disables throttling)
+        throttle_status: 403 (userRateLimitExceeded) or 429
+        error_rate: Probability (0.0 to 1.0) of answering a request with error_status
+        error_status: Status code used for injected errors
+        seed: Seed for the random generator, for repeatable runs
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, raw_folder=None, latency=0.0, jitter=0.0, rate_limit=0.0,
+                 throttle_status=403, error_rate=0.0, error_status=503, seed=None):
+        super().__init__(address, FakeDriveHandler)
+        self.raw_folder = raw_folder
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.throttle_status = throttle_status
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.files = {}           # file id -> {'name': ..., 'data': bytes}
+        self.uploads = {}         # resumable upload id -> {'name': ..., 'size': int, 'data': bytearray}
+        self.stats = {'create': 0, 'export': 0, 'delete': 0, 'batch': 0, 'image': 0, 'throttled': 0, 'errors': 0}
+        self._window_start = time.monotonic()
+        self._window_count = 0
+
+    @property
+    def endpoint(self):
+        """Root URL to pass to drive_client.build_drive_service()"""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] = self.stats.get(key, 0) + amount
+
+    def check_throttle(self):
+        """Return True if this request is over the configured rate limit"""
+        if not self.rate_limit:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            if now - self._window_start >= 1.0:
+                self._window_start = now
+                self._window_count = 0
+            self._window_count += 1
+            return self._window_count > self.rate_limit
+
+    def inject_error(self):
+        with self.lock:
+            return self.error_rate > 0 and self.random.random() < self.error_rate
+
+    def delay(self):
+        if self.latency or self.jitter:
+            with self.lock:
+                extra = self.random.uniform(0, self.jitter) if self.jitter else 0.0
+            time.sleep(self.latency + extra)
+
+    def add_file(self, name, data):
+        file_id = uuid.uuid4().hex
+        with self.lock:
+            self.files[file_id] = {'name': name, 'data': bytes(data)}
+        self.count('create')
+        return file_id
+
+    def export_file(self, file_id):
+        """Return the HTML export for file_id, or None if it does not exist"""
+        with self.lock:
+            entry = self.files.get(file_id)
+        if entry is None:
+            return None
+        base_name = os.path.splitext(entry['name'])[0]
+        if self.raw_folder:
+            recorded = os.path.join(self.raw_folder, f"{base_name}.html")
+            if os.path.exists(recorded):
+                with open(recorded, 'rb') as f:
+                    return f.read()
+        return docx_to_html(entry['data'], base_name).encode('utf-8')
+
+    def delete_file(self, file_id):
+        with self.lock:
+            found = self.files.pop(file_id, None) is not None
+        if found:
+            self.count('delete')
+        return found
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def placeholder_png(path, size=64):
+    """A size x size PNG in a colour derived from path, so every image URL gets its own image"""
+    red, green, blue = hashlib.sha256(path.encode('utf-8')).digest()[:3]
+    rows = b''.join(b'\x00' + bytes((red, green, blue)) * size for _ in range(size))
+
+    def chunk(kind, body):
+        return struct.pack('>I', len(body)) + kind + body + struct.pack('>I', zlib.crc32(kind + body))
+
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', size, size, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(rows)) + chunk(b'IEND', b''))
+
+
+def docx_to_html(data, title):
+    """
+    Build a minimal Drive-style HTML export from the paragraphs of a .docx.
+    Like Drive, formatting goes in a <style> block and runs reference it by class
+    (c1 for bold runs, c0 for the rest), and pictures link to googleusercontent.com.
+    """
+    paragraphs = []
+    try:
+        with zipfile.ZipFile(io.BytesIO(data)) as docx:
+            xml = docx.read('word/document.xml').decode('utf-8')
+    except Exception:
+        xml = ''
+
+    for p_xml in re.findall(r'<w:p[ >].*?</w:p>', xml, re.S):
+        spans = []
+        for run in re.findall(r'<w:r[ >].*?</w:r>', p_xml, re.S):
+            picture = re.search(r'<a:blip [^>]*r:embed="([^"]+)"', run)
+            if picture:
+                image_id = hashlib.sha256(f"{title}/{picture.group(1)}".encode('utf-8')).hexdigest()[:24]
+                spans.append(f'<span class="c0"><img alt="" src="https://lh7-rt.googleusercontent.com/docsz/'
+                             f'{image_id}?key=fake" style="width: 320px; height: 240px;"></span>')
+            text = ''.join(re.findall(r'<w:t(?: [^>]*)?>(.*?)</w:t>', run, re.S))
+            if not text:
+                continue
+            cls = 'c1' if re.search(r'<w:b(?: w:val="(?:1|true)")?/>', run) else 'c0'
+            spans.append(f'<span class="{cls}">{text}</span>')
+        paragraphs.append(f'<p>{"".join(spans)}</p>')
+
+    return ('<html><head><meta content="text/html; charset=UTF-8" http-equiv="content-type">'
+            f'<title>{escape(title)}</title><style type="text/css">.c0{{font-weight:400}}.c1{{font-weight:700}}'
+            f'</style></head><body>{"".join(paragraphs)}</body></html>')
+
+
+class FakeDriveHandler(BaseHTTPRequestHandler):
+    """
+    Implements files.create (multipart and resumable), files.export, files.delete and batch.
+    Any other GET path is answered as the image host, with a placeholder PNG for that path.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass  # keep benchmark output quiet
+
+    # ---- helpers ----
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def send(self, status, body=b'', content_type='application/json', headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        if body or status not in (204, 304):
+            self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if body and self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def send_error_json(self, status, reason, message):
+        self.send(status, {'error': {'code': status, 'message': message,
+                                     'errors': [{'domain': 'usageLimits', 'reason': reason,
+                                                 'message': message}]}})
+
+    def guard(self):
+        """Apply latency, throttling and error injection; return False if the request was answered"""
+        self.server.delay()
+        if self.server.check_throttle():
+            self.server.count('throttled')
+            if self.server.throttle_status == 429:
+                self.send_error_json(429, 'rateLimitExceeded', 'Too many requests')
+            else:
+                self.send_error_json(403, 'userRateLimitExceeded', 'User rate limit exceeded')
+            return False
+        if self.server.inject_error():
+            self.server.count('errors')
+            self.send_error_json(self.server.error_status, 'backendError', 'Injected error')
+            return False
+        return True
+
+    # ---- routing ----
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/__stats':
+            with self.server.lock:
+                stats = dict(self.server.stats, files=len(self.server.files))
+            return self.send(200, stats)
+        match = re.fullmatch(r'/drive/v3/files/([^/]+)/export', url.path)
+        if not match:
+            if url.path.startswith(('/drive/', '/upload/')):
+                return self.send_error_json(404, 'notFound', 'Unknown endpoint')
+            if not self.guard():
+                return
+            self.server.count('image')
+            return self.send(200, placeholder_png(self.path), 'image/png')
+        if not self.guard():
+            return
+        html = self.server.export_file(unquote(match.group(1)))
+        if html is None:
+            return self.send_error_json(404, 'notFound', 'File not found')
+        self.server.count('export')
+        self.send_range(html, 'text/html; charset=utf-8')
+
+    def send_range(self, data, content_type):
+        """Send data, honouring a 'Range: bytes=a-b' header as chunked downloads use"""
+        match = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if not match:
+            return self.send(200, data, content_type)
+        start = int(match.group(1))
+        end = min(int(match.group(2)) if match.group(2) else len(data) - 1, len(data) - 1)
+        self.send(206, data[start:end + 1], content_type,
+                  {'Content-Range': f'bytes {start}-{end}/{len(data)}'})
+
+    def do_DELETE(self):
+        match = re.fullmatch(r'/drive/v3/files/([^/]+)', urlparse(self.path).path)
+        if not match:
+            return self.send_error_json(404, 'notFound', 'Unknown endpoint')
+        if not self.guard():
+            return
+        if self.server.delete_file(unquote(match.group(1))):
+            return self.send(204)
+        self.send_error_json(404, 'notFound', 'File not found')
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self.read_body()
+        if url.path == '/batch/drive/v3':
+            if not self.guard():
+                return
+            return self.handle_batch(body)
+        if url.path != '/upload/drive/v3/files':
+            return self.send_error_json(404, 'notFound', 'Unknown endpoint')
+        if not self.guard():
+            return
+
+        upload_type = parse_qs(url.query).get('uploadType', [''])[0]
+        if upload_type == 'multipart':
+            message = BytesParser().parsebytes(
+                b'Content-Type: ' + self.headers['Content-Type'].encode('utf-8') + b'\r\n\r\n' + body)
+            parts = message.get_payload()
+            metadata = json.loads(parts[0].get_payload(decode=True) or b'{}')
+            data = parts[1].get_payload(decode=True) if len(parts) > 1 else b''
+            file_id = self.server.add_file(metadata.get('name', 'Untitled'), data)
+            return self.send(200, {'id': file_id, 'name': metadata.get('name')})
+        if upload_type == 'media':
+            file_id = self.server.add_file('Untitled', body)
+            return self.send(200, {'id': file_id})
+        if upload_type == 'resumable':
+            metadata = json.loads(body or b'{}')
+            upload_id = uuid.uuid4().hex
+            with self.server.lock:
+                self.server.uploads[upload_id] = {
+                    'name': metadata.get('name', 'Untitled'),
+                    'size': int(self.headers.get('X-Upload-Content-Length') or 0),
+                    'data': bytearray(),
+                }
+            location = f"{self.server.endpoint}upload/drive/v3/files?uploadType=resumable&upload_id={upload_id}"
+            return self.send(200, b'', headers={'Location': location})
+        self.send_error_json(400, 'badRequest', f'Unsupported uploadType {upload_type!r}')
+
+    def do_PUT(self):
+        url = urlparse(self.path)
+        upload_id = parse_qs(url.query).get('upload_id', [''])[0]
+        body = self.read_body()
+        if not self.guard():
+            return
+        with self.server.lock:
+            upload = self.server.uploads.get(upload_id)
+        if upload is None:
+            return self.send_error_json(404, 'notFound', 'Upload session not found')
+
+        # Content-Range: bytes first-last/total
+        match = re.fullmatch(r'bytes (\d+)-(\d+)/(\d+|\*)', self.headers.get('Content-Range', ''))
+        if match:
+            upload['data'][int(match.group(1)):] = body
+            total = int(match.group(3)) if match.group(3) != '*' else None
+        else:
+            upload['data'][:] = body
+            total = len(body)
+        if total is not None and len(upload['data']) >= total:
+            with self.server.lock:
+                self.server.uploads.pop(upload_id, None)
+            file_id = self.server.add_file(upload['name'], upload['data'])
+            return self.send(200, {'id': file_id, 'name': upload['name']})
+        self.send(308, b'', headers={'Range': f"bytes=0-{len(upload['data']) - 1}"})
+
+    def handle_batch(self, body):
+        """Answer a multipart/mixed batch of DELETE calls"""
+        self.server.count('batch')
+        message = BytesParser().parsebytes(
+            b'Content-Type: ' + self.headers['Content-Type'].encode('utf-8') + b'\r\n\r\n' + body)
+        boundary = f"batch_{uuid.uuid4().hex}"
+        parts = []
+        for part in message.get_payload():
+            # Unfold the header; the client splits its Content-ID across lines
+            content_id = re.sub(r'\r?\n[ \t]+', ' ', part['Content-ID'] or '')
+            request_line = part.get_payload(decode=True).decode('utf-8').split('\n', 1)[0].strip()
+            method, path = request_line.split(' ')[:2]
+            match = re.fullmatch(r'/drive/v3/files/([^/?]+)', urlparse(path).path)
+            if method == 'DELETE' and match and self.server.delete_file(unquote(match.group(1))):
+                response = 'HTTP/1.1 204 No Content\r\nContent-Length: 0\r\n\r\n'
+            else:
+                error = json.dumps({'error': {'code': 404, 'message': 'File not found',
+                                              'errors': [{'reason': 'notFound'}]}})
+                response = (f'HTTP/1.1 404 Not Found\r\nContent-Type: application/json\r\n'
+                            f'Content-Length: {len(error)}\r\n\r\n{error}')
+            parts.append(f'--{boundary}\r\nContent-Type: application/http\r\n'
+                         f'Content-ID: <response-{content_id.strip("<>")}>\r\n\r\n{response}\r\n')
+        payload = (''.join(parts) + f'--{boundary}--\r\n').encode('utf-8')
+        self.send(200, payload, f'multipart/mixed; boundary={boundary}')
+
+
+def start_fake_drive(host='127.0.0.1', port=0, **options):
+    """Start a FakeDriveServer on a background thread and return it (port 0 picks a free port)"""
+    server = FakeDriveServer((host, port), **options)
+    thread = threading.Thread(target=server.serve_forever, name="fake-drive", daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the Google Drive v3 API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--raw-folder", default="raw_html",
+                        help="folder of recorded exports served for matching uploads (default: raw_html)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra latency, up to this many seconds")
+    parser.add_argument("--rate-limit", type=float, default=0.0,
+                        help="requests per second before throttling (0 = unlimited)")
+    parser.add_argument("--throttle-status", type=int, choices=[403, 429], default=403)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with an error")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server = FakeDriveServer(
+        (args.host, args.port), raw_folder=args.raw_folder, latency=args.latency, jitter=args.jitter,
+        rate_limit=args.rate_limit, throttle_status=args.throttle_status,
+        error_rate=args.error_rate, error_status=args.error_status, seed=args.seed,
+    )
+    print(f"Fake Drive listening on {server.endpoint}")
+    print(f"Run the converter against it with: python convert_blog.py --drive-endpoint {server.endpoint}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Golden Corpus - Regression check for the HTML cleaner and tag finder
+Runs every raw_html/*.html export through the cleaner exactly as a conversion run does (clean_html_simple
+without the "Begin writing" marker, embedded images saved) and find_tags, and diffs the results
+against stored golden outputs, with per-file timing next to the timing recorded with the goldens
+"""
+
+import os
+import sys
+import json
+import time
+import difflib
+import argparse
+import tempfile
+
+from convert_blog import clean_html_file, merge_tag_lists, post_images, RAW_FOLDER
+from tagFinder import find_tags
+from blog_template import post_body
+
+GOLDEN_FOLDER = 'golden'
+TIMINGS_FILE = 'timings.json'
+DIFF_LINES = 20  # diff lines shown per mismatching file
+
+# ==== HELPERS ====
+
+def golden_paths(golden_folder, base_name):
+    """Paths of the golden cleaned HTML and tags for one raw export"""
+    return (os.path.join(golden_folder, f"{base_name}.html"),
+            os.path.join(golden_folder, f"{base_name}.tags.txt"))
+
+def read_text(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+def write_text(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+def first_diff(expected, actual, name, limit=DIFF_LINES):
+    """The first `limit` lines of a unified diff between expected and actual"""
+    diff = difflib.unified_diff(expected.splitlines(), actual.splitlines(),
+                                f"golden/{name}", f"current/{name}", lineterm="", n=1)
+    lines = []
+    for line in diff:
+        if len(lines) == limit:
+            lines.append("...")
+            break
+        lines.append(line)
+    return lines
+
+# ==== CORPUS ====
+
+def process_file(raw_path, tag_list, output_folder):
+    """
+    Clean one raw export as a conversion run does and find its tags, returning (html, tags,
+    clean_seconds, tag_seconds). Images are saved under output_folder (a scratch folder).
+    """
+    base_name = os.path.splitext(os.path.basename(raw_path))[0]
+
+    started = time.perf_counter()
+    cleaned_html = clean_html_file(raw_path, images=post_images(base_name, output_folder))
+    clean_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    tags = find_tags(post_body(cleaned_html), tag_list) if tag_list else []
+    tag_seconds = time.perf_counter() - started
+
+    return cleaned_html, '\n'.join(tags), clean_seconds, tag_seconds
+
+def check_file(raw_path, golden_folder, golden_timings, tag_list, scratch, update=False, check_tags=True):
+    """
+    Check (or with update=True, record) one raw export against its golden output; returns its
+    result dict. With update, its timings are stored in golden_timings.
+    """
+    base_name = os.path.splitext(os.path.basename(raw_path))[0]
+    html_path, tags_path = golden_paths(golden_folder, base_name)
+    cleaned_html, tags, clean_seconds, tag_seconds = process_file(raw_path, tag_list, scratch)
+
+    result = {
+        'name': base_name,
+        'clean_seconds': clean_seconds,
+        'tag_seconds': tag_seconds,
+        'golden': golden_timings.get(base_name, {}),
+        'html': 'ok',
+        'tags': 'ok' if check_tags else 'skipped',
+        'diff': [],
+    }
+
+    if update:
+        write_text(html_path, cleaned_html)
+        if check_tags:
+            write_text(tags_path, tags)
+        golden_timings[base_name] = {'clean_seconds': round(clean_seconds, 6),
+                                     'tag_seconds': round(tag_seconds, 6)}
+        result['html'] = result['tags'] = 'updated'
+        return result
+
+    expected_html = read_text(html_path)
+    if expected_html is None:
+        result['html'] = 'missing'
+    elif expected_html != cleaned_html:
+        result['html'] = 'MISMATCH'
+        result['diff'] += first_diff(expected_html, cleaned_html, f"{base_name}.html")
+
+    if check_tags:
+        expected_tags = read_text(tags_path)
+        if expected_tags is None:
+            result['tags'] = 'missing'
+        elif expected_tags != tags:
+            result['tags'] = 'MISMATCH'
+            result['diff'] += first_diff(expected_tags, tags, f"{base_name}.tags.txt")
+    return result
+
+def error_result(base_name, error, golden_timings, check_tags=True):
+    """Result for an export that could not be cleaned or tagged at all"""
+    return {
+        'name': base_name,
+        'clean_seconds': None,
+        'tag_seconds': None,
+        'golden': golden_timings.get(base_name, {}),
+        'html': 'ERROR',
+        'tags': 'ERROR' if check_tags else 'skipped',
+        'diff': [f"{type(error).__name__}: {error}"],
+    }
+
+def run_corpus(raw_folder=RAW_FOLDER, golden_folder=GOLDEN_FOLDER, tags_file='Tags.txt',
+               update=False, check_tags=True, names=None):
+    """
+    Check (or with update=True, record) every raw export against its golden output.
+    An export that raises is reported as an ERROR result and the rest are still checked.
+    Returns a list of per-file result dicts.
+    """
+    tag_list = merge_tag_lists(tags_file) if check_tags else []
+    timings_path = os.path.join(golden_folder, TIMINGS_FILE)
+    golden_timings = json.loads(read_text(timings_path) or '{}')
+
+    filenames = sorted(f for f in os.listdir(raw_folder) if f.lower().endswith(".html"))
+    if names:
+        filenames = [f for f in filenames if os.path.splitext(f)[0] in names or f in names]
+
+    if update:
+        os.makedirs(golden_folder, exist_ok=True)
+
+    results = []
+    # Images the cleaner saves go to a scratch folder, removed however the run ends
+    with tempfile.TemporaryDirectory(prefix='golden-') as scratch:
+        for filename in filenames:
+            try:
+                result = check_file(os.path.join(raw_folder, filename), golden_folder, golden_timings,
+                                    tag_list, scratch, update, check_tags)
+            except Exception as e:
+                result = error_result(os.path.splitext(filename)[0], e, golden_timings, check_tags)
+            results.append(result)
+
+    if update:
+        with open(timings_path, "w", encoding="utf-8") as f:
+            json.dump(golden_timings, f, indent=2, sort_keys=True)
+
+    return results
+
+def format_results(results):
+    """Text table of per-file status with current and golden timings in milliseconds"""
+    lines = [f"{'document':<36}{'html':>10}{'tags':>10}{'clean ms':>11}{'golden':>9}"
+             f"{'tag ms':>10}{'golden':>9}"]
+
+    def _ms(seconds):
+        return f"{seconds * 1000:.1f}" if seconds is not None else "-"
+
+    for result in results:
+        golden = result['golden']
+        lines.append(f"{result['name'][:35]:<36}{result['html']:>10}{result['tags']:>10}"
+                     f"{_ms(result['clean_seconds']):>11}{_ms(golden.get('clean_seconds')):>9}"
+                     f"{_ms(result['tag_seconds']):>10}{_ms(golden.get('tag_seconds')):>9}")
+
+    clean_total = sum(r['clean_seconds'] or 0.0 for r in results)
+    tag_total = sum(r['tag_seconds'] or 0.0 for r in results)
+    golden_clean = [r['golden'].get('clean_seconds') for r in results]
+    golden_tag = [r['golden'].get('tag_seconds') for r in results]
+    lines.append(f"{'total':<56}{_ms(clean_total):>11}"
+                 f"{_ms(sum(golden_clean)) if None not in golden_clean else '-':>9}"
+                 f"{_ms(tag_total):>10}"
+                 f"{_ms(sum(golden_tag)) if None not in golden_tag else '-':>9}")
+    return '\n'.join(lines)
+
+# ==== MAIN ====
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Check the HTML cleaner and tag finder against golden outputs for raw_html/*.html.")
+    parser.add_argument('names', nargs='*', help="only these documents (default: all)")
+    parser.add_argument('--raw', default=RAW_FOLDER, help=f"raw export folder (default: {RAW_FOLDER})")
+    parser.add_argument('--golden', default=GOLDEN_FOLDER,
+                        help=f"golden output folder (default: {GOLDEN_FOLDER})")
+    parser.add_argument('--tags-file', default='Tags.txt', help="tag list merged with DEFAULT_TAGS")
+    parser.add_argument('--no-tags', action='store_true', help="only check the cleaned HTML")
+    parser.add_argument('--update', action='store_true',
+                        help="record the current output and timings as the new goldens")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.raw):
+        print(f"Error: raw HTML folder not found at {args.raw}")
+        return 2
+
+    results = run_corpus(args.raw, args.golden, args.tags_file, update=args.update,
+                         check_tags=not args.no_tags, names=args.names)
+    if not results:
+        print(f"No .html files found in {args.raw}")
+        return 2
+
+    print(format_results(results))
+
+    failed = [r for r in results if {'MISMATCH', 'missing', 'ERROR'} & {r['html'], r['tags']}]
+    for result in failed:
+        if result['diff']:
+            print(f"\n{result['name']}:")
+            print('\n'.join(result['diff']))
+
+    errors = [r for r in results if r['html'] == 'ERROR']
+    if args.update:
+        print(f"\nRecorded {len(results) - len(errors)} golden outputs in {args.golden}")
+        if errors:
+            print(f"{len(errors)} documents could not be cleaned")
+            return 1
+        return 0
+    if failed:
+        if errors:
+            print(f"\n{len(errors)} of {len(results)} documents could not be cleaned")
+        if len(failed) > len(errors):
+            print(f"\n{len(failed) - len(errors)} of {len(results)} documents differ from the goldens "
+                  "(run with --update to accept the new output)")
+        return 1
+    print(f"\nAll {len(results)} documents match the goldens")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+# output_writer.py
+
+# Writes converted posts: collision-free blog folder names that don't depend on the order documents
+# finish in, all-or-nothing writes through temporary files, optional fsync, and one mkdir per folder.
+
+import os
+import hashlib
+import threading
+
+FOLDER_PREFIX_LENGTH = 10  # blog folders are named after the first 10 characters of the post
+FOLDER_HASH_LENGTH = 6     # hex digits of the name's hash added when the folder name isn't the post name
+
+# ==== FOLDER NAMES ====
+
+def post_folder_name(base_name, prefix_length=FOLDER_PREFIX_LENGTH):
+    """
+    Blog folder name for a post: its first prefix_length characters, trimmed, with spaces
+    replaced by underscores. When that is not the post name itself (it was shortened or
+    changed), a short hash of the full name is appended, so 'Post number 1' and 'Post number 2'
+    get 'Post_numbe_<hash>' folders of their own. The name depends only on the post, so
+    concurrent documents can't race for a folder and a rerun finds the same one.
+    """
+    folder_name = base_name[:prefix_length].strip().replace(' ', '_')
+    if folder_name == base_name:
+        return folder_name
+    digest = hashlib.sha256(base_name.encode('utf-8')).hexdigest()[:FOLDER_HASH_LENGTH]
+    return f"{folder_name}_{digest}" if folder_name else digest
+
+# ==== WRITER ====
+
+class OutputWriter:
+    """
+    Writes files so readers (and a crash) never see half of them: each file goes to a
+    temporary name in its folder and is renamed over the target once complete. write_files
+    renames a batch (e.g. a post's HTML and tags.txt) only after every file in it is written.
+    With fsync, file contents and the folder entries are flushed to disk before returning.
+    Folders are created once per writer (and again if one is deleted while the writer is in
+    use); the writer can be shared by threads.
+    """
+
+    def __init__(self, fsync=False):
+        self.fsync = fsync
+        self._created = set()
+        self._lock = threading.Lock()
+
+    def ensure_dir(self, path):
+        """Create path (and its parents) unless this writer already has"""
+        path = os.path.abspath(path)
+        if path in self._created:
+            return
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            self._created.add(path)
+
+    def forget_dir(self, path):
+        """Drop path from the folders this writer has created, so ensure_dir creates it again"""
+        with self._lock:
+            self._created.discard(os.path.abspath(path))
+
+    def write(self, path, content):
+        """Write one file atomically; content is str (written as UTF-8 text) or bytes"""
+        self.write_files({path: content})
+
+    def write_files(self, files):
+        """
+        Write {path: content} as one batch: every file is written to a temporary file first,
+        and the targets are replaced only when all of them succeeded
+        """
+        written = []
+        try:
+            for path, content in files.items():
+                folder = os.path.dirname(os.path.abspath(path))
+                self.ensure_dir(folder)
+                temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                written.append((temp_path, path))
+                try:
+                    self._write_temp(temp_path, content)
+                except FileNotFoundError:
+                    # The folder was deleted after this writer created it
+                    self.forget_dir(folder)
+                    self.ensure_dir(folder)
+                    self._write_temp(temp_path, content)
+        except BaseException:
+            for temp_path, _ in written:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+            raise
+        for temp_path, path in written:
+            os.replace(temp_path, path)
+        if self.fsync:
+            for folder in {os.path.dirname(os.path.abspath(path)) for _, path in written}:
+                fsync_dir(folder)
+
+    def _write_temp(self, temp_path, content):
+        if isinstance(content, str):
+            f = open(temp_path, 'w', encoding='utf-8')
+        else:
+            f = open(temp_path, 'wb')
+        with f:
+            f.write(content)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+
+def fsync_dir(path):
+    """Flush a folder's entries (new and renamed files) to disk; a no-op where folders can't be opened"""
+    if not hasattr(os, 'O_DIRECTORY'):
+        return  # Windows
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,250 @@
+# run_metrics.py
+
+# Per-stage timing (and optionally memory) for conversion runs, written as a JSONL run report,
+# and per-pass profiling of the HTML cleanup passes.
+
+import os
+import sys
+import json
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from bs4 import Tag
+
+# ==== HELPERS ====
+
+def stage(metrics, name):
+    """Time a block as stage `name` of metrics, or do nothing if metrics is None"""
+    return metrics.stage(name) if metrics is not None else nullcontext()
+
+def observe(profiler, name, soup):
+    """Profile a block as cleanup pass `name` on soup, or do nothing if profiler is None"""
+    return profiler.profile(name, soup) if profiler is not None else nullcontext()
+
+def percentile(values, pct):
+    """Nearest-rank percentile of values (pct from 0 to 100)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100.0 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+# ==== METRICS ====
+
+class DocumentMetrics:
+    """
+    Stage timings for one document, measured with time.perf_counter().
+    With trace_memory=True (and tracemalloc running) each stage also records its peak
+    allocation above what was allocated when it started, in bytes; repeated stages keep the
+    highest peak. tracemalloc is process-wide, so stages running in other threads at the
+    same time are counted too. Each stage resets tracemalloc's peak, so traced_peak keeps the
+    highest total traced memory seen (read before every reset and after every stage).
+    """
+
+    def __init__(self, name, trace_memory=False):
+        self.name = name
+        self.stages = {}
+        self.memory = {}
+        self.extra = {}
+        self.trace_memory = trace_memory
+        self.traced_peak = 0
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        """Add the time spent in the block to stage `name` (repeated stages accumulate)"""
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            allocated, peak = tracemalloc.get_traced_memory()
+            self.traced_peak = max(self.traced_peak, peak)
+            tracemalloc.reset_peak()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - started
+            if tracing:
+                _, peak = tracemalloc.get_traced_memory()
+                self.traced_peak = max(self.traced_peak, peak)
+                self.memory[name] = max(self.memory.get(name, 0), peak - allocated)
+
+    def to_dict(self):
+        record = {
+            'document': self.name,
+            'total_seconds': round(time.perf_counter() - self._started, 6),
+            'stages': {name: round(seconds, 6) for name, seconds in self.stages.items()},
+        }
+        if self.trace_memory:
+            record['memory_peak_bytes'] = dict(self.memory)
+        record.update(self.extra)
+        return record
+
+class RunMetrics:
+    """
+    Collects DocumentMetrics for a run.
+    Each finished document is appended to report_path as one JSON line; close() adds
+    a summary line with p50/p95 per stage and writes it to <report>.summary.json.
+    """
+
+    def __init__(self, report_path, trace_memory=False):
+        self.report_path = report_path
+        self.trace_memory = trace_memory
+        self.summary_path = os.path.splitext(report_path)[0] + '.summary.json'
+        self._records = []
+        self._traced_peak = 0  # highest traced memory of any recorded document's stages
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+        self._file = open(report_path, 'w', encoding='utf-8')
+
+    def document(self, name):
+        return DocumentMetrics(name, self.trace_memory)
+
+    def record(self, document, status='ok', **extra):
+        """Write one document's timings to the report"""
+        document.extra.update(extra, status=status)
+        record = document.to_dict()
+        with self._lock:
+            self._traced_peak = max(self._traced_peak, document.traced_peak)
+            self._records.append(record)
+            self._file.write(json.dumps(record) + '\n')
+            self._file.flush()
+
+    def summary(self):
+        with self._lock:
+            records = list(self._records)
+            traced_peak = self._traced_peak
+        stage_times = {}
+        for record in records:
+            for name, seconds in record['stages'].items():
+                stage_times.setdefault(name, []).append(seconds)
+        totals = [record['total_seconds'] for record in records]
+        stage_memory = {}
+        for record in records:
+            for name, peak in record.get('memory_peak_bytes', {}).items():
+                stage_memory.setdefault(name, []).append(peak)
+
+        def _describe(values):
+            return {
+                'count': len(values),
+                'total': round(sum(values), 6),
+                'mean': round(sum(values) / len(values), 6) if values else 0.0,
+                'p50': round(percentile(values, 50), 6),
+                'p95': round(percentile(values, 95), 6),
+                'max': round(max(values), 6) if values else 0.0,
+            }
+
+        summary = {
+            'summary': True,
+            'documents': len(records),
+            'failed': sum(1 for record in records if record.get('status') == 'failed'),
+            'skipped': sum(1 for record in records if record.get('status') == 'skipped'),
+            'wall_seconds': round(time.perf_counter() - self._started, 6),
+            'document_seconds': _describe(totals),
+            'stages': {name: _describe(values) for name, values in stage_times.items()},
+        }
+        if self.trace_memory:
+            summary['memory_peak_bytes'] = {
+                name: {'p50': percentile(values, 50), 'p95': percentile(values, 95), 'max': max(values)}
+                for name, values in stage_memory.items()
+            }
+            if tracemalloc.is_tracing():
+                # The run's peak: the stages reset tracemalloc's own peak as they start
+                summary['traced_peak_bytes'] = max(traced_peak, tracemalloc.get_traced_memory()[1])
+            else:
+                summary['traced_peak_bytes'] = None
+            summary['max_rss_bytes'] = max_rss_bytes()
+        return summary
+
+    def close(self):
+        """Write the summary and close the report"""
+        summary = self.summary()
+        with self._lock:
+            self._file.write(json.dumps(summary) + '\n')
+            self._file.close()
+        with open(self.summary_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+def _node_signature(node):
+    """What a node looks like on its own: tag name, attributes and parent, or the string text"""
+    if isinstance(node, Tag):
+        return (node.name, repr(node.attrs), id(node.parent))
+    return (str(node), id(node.parent))
+
+def tree_fingerprint(soup):
+    """Map of id(node) -> (node, signature) for every node in soup"""
+    return {id(node): (node, _node_signature(node)) for node in soup.descendants}
+
+class PassProfiler:
+    """
+    Records wall time, nodes visited (tree size when the pass starts) and nodes mutated
+    (added, removed or changed) for every cleanup pass run through profile().
+    Fingerprinting the tree happens outside the timed section, so times stay comparable
+    to --metrics, but profiled runs are several times slower overall.
+    """
+
+    def __init__(self):
+        self.passes = {}
+        self.documents = 0
+
+    @contextmanager
+    def profile(self, name, soup):
+        before = tree_fingerprint(soup)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            after = tree_fingerprint(soup)
+            removed = before.keys() - after.keys()
+            added = after.keys() - before.keys()
+            changed = sum(1 for key in before.keys() & after.keys() if before[key][1] != after[key][1])
+            record = self.passes.setdefault(name, {'calls': 0, 'seconds': 0.0, 'visited': 0, 'mutated': 0})
+            record['calls'] += 1
+            record['seconds'] += seconds
+            record['visited'] += len(before)
+            record['mutated'] += len(removed) + len(added) + changed
+
+    def ranked(self):
+        """(name, record) pairs ordered by total time, slowest first"""
+        return sorted(self.passes.items(), key=lambda item: item[1]['seconds'], reverse=True)
+
+def format_profile(profiler, limit=None):
+    """Text table of cleanup passes ordered by total time"""
+    total = sum(record['seconds'] for record in profiler.passes.values()) or 1.0
+    lines = [f"{'pass':<44}{'calls':>7}{'total ms':>11}{'mean ms':>10}{'share':>8}"
+             f"{'visited':>10}{'mutated':>10}"]
+    for name, record in profiler.ranked()[:limit]:
+        lines.append(f"{name:<44}{record['calls']:>7}{record['seconds'] * 1000:>11.1f}"
+                     f"{record['seconds'] * 1000 / record['calls']:>10.2f}"
+                     f"{record['seconds'] / total:>8.1%}{record['visited']:>10}{record['mutated']:>10}")
+    return '\n'.join(lines)
+
+def max_rss_bytes():
+    """Peak resident set size of this process in bytes, or None where it is not available"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def format_memory_summary(summary, limit=None):
+    """Text table of stages ordered by their largest peak allocation"""
+    lines = [f"{'stage':<44}{'p50 MB':>10}{'p95 MB':>10}{'max MB':>10}"]
+    ranked = sorted(summary.get('memory_peak_bytes', {}).items(), key=lambda item: item[1]['max'], reverse=True)
+    for name, values in ranked[:limit]:
+        lines.append(f"{name:<44}{values['p50'] / 2**20:>10.2f}{values['p95'] / 2**20:>10.2f}"
+                     f"{values['max'] / 2**20:>10.2f}")
+    return '\n'.join(lines)
+
+def format_summary(summary, limit=None):
+    """Text table of stages ordered by total time"""
+    lines = [f"{'stage':<44}{'count':>7}{'total s':>11}{'p50 ms':>10}{'p95 ms':>10}"]
+    ranked = sorted(summary['stages'].items(), key=lambda item: item[1]['total'], reverse=True)
+    for name, values in ranked[:limit]:
+        lines.append(f"{name:<44}{values['count']:>7}{values['total']:>11.3f}"
+                     f"{values['p50'] * 1000:>10.1f}{values['p95'] * 1000:>10.1f}")
+    return '\n'.join(lines)
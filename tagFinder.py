@@ -70,6 +70,112 @@ def normalize_tag(tag):
     return tag.lower().replace(' ', '').replace('-', '').replace('_', '')
 
 
+class TagCatalog:
+    """
+    A tag list prepared for repeated find_tags calls.
+    Per-tag normalization is done once, and the fuzzy/substring matches of each distinct
+    keyword are computed once and remembered across documents (up to cache_size keywords),
+    so a long-lived catalog gets faster as it sees more posts. Scores are accumulated in
+    exactly the order find_tags always used, so results are identical.
+    """
+
+    def __init__(self, tags_list, threshold=0.80, cache_size=50000):
+        self.tags = list(tags_list)
+        self.threshold = threshold
+        self.cache_size = cache_size
+        self._lower = [tag.lower() for tag in self.tags]
+        self._normalized = [normalize_tag(tag) for tag in self.tags]
+        self._multi_word = [
+            (tag, [word for word in re.split(r'[\s\-_]+', tag.lower()) if len(word) > 2])
+            for tag in self.tags if ' ' in tag or '-' in tag
+        ]
+        self._fuzzy_cache = {}
+        self._substring_cache = {}
+
+    def _fuzzy_matches(self, keyword):
+        """[(tag, weight)] added by fuzzy matching for keyword, in tag order"""
+        matches = self._fuzzy_cache.get(keyword)
+        if matches is not None:
+            return matches
+
+        matches = []
+        for tag, tag_lower in zip(self.tags, self._lower):
+            contains = tag_lower in keyword or keyword in tag_lower
+            # SequenceMatcher.ratio() can't exceed 2*min/(sum) of the two lengths, so the
+            # expensive ratio is skipped when it could not reach the threshold (or beat 0.90)
+            bound = 2.0 * min(len(keyword), len(tag_lower)) / (len(keyword) + len(tag_lower))
+            if contains:
+                score = fuzzy_match_score(keyword, tag) if bound > 0.90 else 0.0
+                score = max(score, 0.90)
+            elif bound >= self.threshold:
+                score = fuzzy_match_score(keyword, tag)
+            else:
+                continue
+            if score >= self.threshold:
+                matches.append((tag, score * 5))
+
+        if len(self._fuzzy_cache) < self.cache_size:
+            self._fuzzy_cache[keyword] = matches
+        return matches
+
+    def _substring_matches(self, keyword):
+        """Tags whose normalized form contains keyword (model number matching), in tag order"""
+        matches = self._substring_cache.get(keyword)
+        if matches is not None:
+            return matches
+
+        keyword_clean = keyword.replace('.', '').replace(' ', '')
+        if len(keyword_clean) >= 2:
+            matches = [tag for tag, tag_clean in zip(self.tags, self._normalized) if keyword_clean in tag_clean]
+        else:
+            matches = []
+
+        if len(self._substring_cache) < self.cache_size:
+            self._substring_cache[keyword] = matches
+        return matches
+
+    def find(self, html_content, max_tags=10):
+        """Matching tags for html_content, sorted by relevance (same result as find_tags)"""
+        if not self.tags:
+            return []
+
+        keywords = extract_keywords(html_content)
+        keyword_set = set(keywords)
+        tag_scores = {}
+
+        # Create full text for phrase matching
+        full_text = ' '.join(keywords)
+        full_text_compact = full_text.replace(' ', '').replace('-', '').replace('_', '')
+
+        # Step 1: Exact phrase matching (highest confidence)
+        for tag, tag_lower, tag_normalized in zip(self.tags, self._lower, self._normalized):
+            if tag_lower in full_text or tag_normalized in full_text_compact:
+                tag_scores[tag] = tag_scores.get(tag, 0) + 15  # Very high weight
+
+        # Step 2: Multi-word tag matching (for tags like "Bully Dog", "clean diesel")
+        for tag, tag_words in self._multi_word:
+            if all(word in keyword_set for word in tag_words):
+                tag_scores[tag] = tag_scores.get(tag, 0) + 12
+
+        # Step 3: Fuzzy matching for variations and misspellings
+        for keyword in keywords:
+            if len(keyword) < 4:
+                continue
+            for tag, weight in self._fuzzy_matches(keyword):
+                tag_scores[tag] = tag_scores.get(tag, 0) + weight
+
+        # Step 4: Substring matching for model numbers (e.g., "6.7" matches "67cummins")
+        for keyword in keywords:
+            for tag in self._substring_matches(keyword):
+                tag_scores[tag] = tag_scores.get(tag, 0) + 3
+
+        # Sort by score (highest first) and return top N
+        sorted_tags = sorted(tag_scores.items(), key=lambda x: x[1], reverse=True)
+
+        # Return only the tag names (not scores)
+        return [tag for tag, score in sorted_tags[:max_tags]]
+
+
 def find_tags(html_content, tags_list, threshold=0.80, max_tags=10):
     """
     Find matching tags from HTML content using hybrid approach
@@ -83,65 +189,7 @@ def find_tags(html_content, tags_list, threshold=0.80, max_tags=10):
     Returns:
         List of matched tags, sorted by relevance
     """
-    if not tags_list:
-        return []
-
-    keywords = extract_keywords(html_content)
-    tag_scores = {}
-
-    # Create full text for phrase matching
-    full_text = ' '.join(keywords)
-
-    # Step 1: Exact phrase matching (highest confidence)
-    for tag in tags_list:
-        tag_normalized = normalize_tag(tag)
-
-        # Check if tag appears in content (exact match)
-        if tag.lower() in full_text or tag_normalized in full_text.replace(' ', '').replace('-', '').replace('_', ''):
-            tag_scores[tag] = tag_scores.get(tag, 0) + 15  # Very high weight
-
-    # Step 2: Multi-word tag matching (for tags like "Bully Dog", "clean diesel")
-    for tag in tags_list:
-        if ' ' in tag or '-' in tag:
-            tag_words = re.split(r'[\s\-_]+', tag.lower())
-            # If all words of the tag appear in content, it's a strong match
-            if all(word in keywords for word in tag_words if len(word) > 2):
-                tag_scores[tag] = tag_scores.get(tag, 0) + 12
-
-    # Step 3: Fuzzy matching for variations and misspellings
-    for keyword in keywords:
-        # Skip very short keywords for fuzzy matching
-        if len(keyword) < 4:
-            continue
-
-        for tag in tags_list:
-            # Calculate similarity
-            score = fuzzy_match_score(keyword, tag)
-
-            # Also check if keyword contains tag or vice versa (for compound words)
-            if tag.lower() in keyword or keyword in tag.lower():
-                score = max(score, 0.90)
-
-            if score >= threshold:
-                # Weight by similarity score (closer match = higher weight)
-                tag_scores[tag] = tag_scores.get(tag, 0) + (score * 5)
-
-    # Step 4: Substring matching for model numbers (e.g., "6.7" matches "67cummins")
-    for keyword in keywords:
-        for tag in tags_list:
-            # Remove dots and spaces for model number matching
-            keyword_clean = keyword.replace('.', '').replace(' ', '')
-            tag_clean = normalize_tag(tag)
-
-            # Check if keyword is a substring of tag (e.g., "67" in "67cummins")
-            if len(keyword_clean) >= 2 and keyword_clean in tag_clean:
-                tag_scores[tag] = tag_scores.get(tag, 0) + 3
-
-    # Sort by score (highest first) and return top N
-    sorted_tags = sorted(tag_scores.items(), key=lambda x: x[1], reverse=True)
-
-    # Return only the tag names (not scores)
-    return [tag for tag, score in sorted_tags[:max_tags]]
+    return TagCatalog(tags_list, threshold).find(html_content, max_tags)
 
 
 def process_html_file(html_file, tags_file):
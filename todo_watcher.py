@@ -0,0 +1,286 @@
+# todo_watcher.py
+
+# Watches the todo folder for new or changed .docx files (inotify on Linux, polling elsewhere)
+# and reports each one once it has stopped changing.
+
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import zipfile
+
+SETTLE_SECONDS = 2.0   # a file must be unchanged this long before it is converted
+POLL_INTERVAL = 1.0    # seconds between folder scans when inotify is not available
+DONE_FOLDER = 'done'   # finished sources are moved here, next to todo
+
+# inotify event flags (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+# ==== WATCHERS ====
+
+class InotifyWatcher:
+    """Reports names written or moved into a folder, using inotify through ctypes"""
+
+    def __init__(self, folder):
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"inotify_add_watch failed for {folder}")
+
+    def wait(self, timeout):
+        """Names changed within timeout seconds (an empty set if nothing happened)"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return set()
+            raise
+
+        names = set()
+        offset = 0
+        while offset + IN_EVENT_HEADER.size <= len(data):
+            _, _, _, length = IN_EVENT_HEADER.unpack_from(data, offset)
+            offset += IN_EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if name:
+                names.add(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    """Reports names whose size or modification time changed, by scanning the folder"""
+
+    def __init__(self, folder, interval=POLL_INTERVAL):
+        self.folder = folder
+        self.interval = interval
+        self.snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        try:
+            with os.scandir(self.folder) as entries:
+                for entry in entries:
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    snapshot[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            pass
+        return snapshot
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        snapshot = self._scan()
+        changed = {name for name, signature in snapshot.items() if self.snapshot.get(name) != signature}
+        self.snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+def create_watcher(folder, poll_interval=POLL_INTERVAL):
+    """InotifyWatcher on Linux, or a PollingWatcher where inotify is not available"""
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(folder)
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable ({e}), polling {folder} every {poll_interval}s")
+    return PollingWatcher(folder, poll_interval)
+
+# ==== DEBOUNCING ====
+
+def file_signature(path):
+    """(size, mtime_ns) of path, or None if it doesn't exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+def is_candidate(name, suffix='.docx'):
+    """True for files worth converting; skips Word lock files (~$Post.docx) and hidden files"""
+    return name.lower().endswith(suffix) and not name.startswith(('~$', '.'))
+
+class SettleTracker:
+    """
+    Debounces file changes: a file is ready once its size and modification time have not
+    changed for settle_seconds and it is a complete .docx (zip) archive. Each version of a
+    file is reported once; it is reported again only after it changes.
+    """
+
+    def __init__(self, folder, settle_seconds=SETTLE_SECONDS):
+        self.folder = folder
+        self.settle_seconds = settle_seconds
+        self.pending = {}   # name -> (signature, time the signature was first seen)
+        self.handled = {}   # name -> signature that was last reported
+
+    def touch(self, name):
+        """Note that name may have changed"""
+        if is_candidate(name) and name not in self.pending:
+            self.pending[name] = (None, time.monotonic())
+
+    def touch_existing(self):
+        """Queue every candidate already in the folder; files older than settle_seconds are ready at once"""
+        now = time.monotonic()
+        wall_now = time.time()
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            if is_candidate(name) and os.path.isfile(path):
+                age = wall_now - os.path.getmtime(path)
+                self.pending[name] = (file_signature(path), now - max(age, 0.0))
+
+    def ready(self):
+        """Names that have settled since the last call"""
+        now = time.monotonic()
+        settled = []
+        for name, (signature, seen_at) in list(self.pending.items()):
+            path = os.path.join(self.folder, name)
+            current = file_signature(path)
+            if current is None:
+                del self.pending[name]  # deleted or moved away
+            elif current != signature:
+                self.pending[name] = (current, now)
+            elif now - seen_at >= self.settle_seconds:
+                if not zipfile.is_zipfile(path):
+                    self.pending[name] = (current, now)  # still being written, or not a .docx
+                    continue
+                del self.pending[name]
+                if current != self.handled.get(name):
+                    self.handled[name] = current
+                    settled.append(name)
+        return settled
+
+    def defer(self, name):
+        """
+        Report name again once it settles, even if unchanged since it was reported (it became
+        ready while its previous version was still being converted)
+        """
+        self.handled.pop(name, None)
+        if name not in self.pending:
+            self.pending[name] = (None, time.monotonic())
+
+    def next_check(self):
+        """Seconds until the next pending file could settle (None if nothing is pending)"""
+        if not self.pending:
+            return None
+        now = time.monotonic()
+        return max(0.05, min(seen_at + self.settle_seconds - now for _, seen_at in self.pending.values()))
+
+def move_to_done(input_folder, filename, done_folder=None, signature=None):
+    """
+    Move a converted source out of todo into done_folder (default: done/ beside todo).
+    With signature (the file_signature taken when its conversion started), a file saved again
+    since then is left in todo for its next conversion and None is returned.
+    """
+    source = os.path.join(input_folder, filename)
+    if signature is not None and file_signature(source) != signature:
+        return None
+    if done_folder is None:
+        done_folder = os.path.join(os.path.dirname(os.path.abspath(input_folder)), DONE_FOLDER)
+    os.makedirs(done_folder, exist_ok=True)
+    destination = os.path.join(done_folder, filename)
+    os.replace(source, destination)
+    return destination
+
+# ==== SELF-CHECK ====
+
+def _save_docx(path, text):
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('word/document.xml', text)
+
+def check_resave_during_conversion(settle_seconds=0.2, timeout=30.0):
+    """
+    Run convert_blog.watch_todo on a scratch todo folder and save a .docx again while its
+    conversion is running. Returns a list of problems: empty when the new version is converted
+    only after the first conversion has finished, never alongside it, and ends up in done/.
+    """
+    import tempfile
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from convert_blog import watch_todo
+
+    problems = []
+    with tempfile.TemporaryDirectory(prefix='watch-check-') as root:
+        todo = os.path.join(root, 'todo')
+        os.makedirs(todo)
+        path = os.path.join(todo, 'Post.docx')
+        _save_docx(path, 'version 1')
+        lock = threading.Lock()
+        state = {'active': 0, 'overlap': 0, 'versions': []}
+        stop = threading.Event()
+
+        def convert_one(filename):
+            with lock:
+                state['active'] += 1
+                state['overlap'] = max(state['overlap'], state['active'])
+            try:
+                with zipfile.ZipFile(os.path.join(todo, filename)) as archive:
+                    version = archive.read('word/document.xml').decode('utf-8')
+                state['versions'].append(version)
+                if version == 'version 1':
+                    time.sleep(0.3)
+                    _save_docx(path, 'version 2')  # saved again mid-conversion
+                    time.sleep(settle_seconds * 5)
+                return filename, None, 0
+            finally:
+                with lock:
+                    state['active'] -= 1
+
+        def stop_when_done():
+            deadline = time.monotonic() + timeout
+            done_path = os.path.join(root, DONE_FOLDER, 'Post.docx')
+            while time.monotonic() < deadline:
+                if len(state['versions']) >= 2 and os.path.exists(done_path):
+                    break
+                time.sleep(0.05)
+            time.sleep(settle_seconds * 3)  # long enough for any extra conversion to start
+            stop.set()
+
+        threading.Thread(target=stop_when_done, daemon=True).start()
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            watch_todo(todo, executor, convert_one, settle_seconds, stop=stop)
+
+        if state['overlap'] > 1:
+            problems.append(f"{state['overlap']} conversions of Post.docx ran at once")
+        if state['versions'] != ['version 1', 'version 2']:
+            problems.append(f"converted versions {state['versions']}, expected version 1 then version 2")
+        done_path = os.path.join(root, DONE_FOLDER, 'Post.docx')
+        if not os.path.exists(done_path):
+            problems.append("Post.docx was not moved to done/")
+        else:
+            with zipfile.ZipFile(done_path) as archive:
+                if archive.read('word/document.xml') != b'version 2':
+                    problems.append("done/ has the old version of Post.docx")
+    return problems
+
+def main():
+    """python todo_watcher.py: check watch mode with a file saved again during its conversion"""
+    problems = check_resave_during_conversion()
+    for problem in problems:
+        print(f"FAILED: {problem}")
+    print("Saved again during conversion: " + ("ok" if not problems else f"{len(problems)} problems"))
+    return 1 if problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,299 @@
+# url_rewrites.py
+
+# Exact, prefix and regex URL rewrite rules loaded from a text file and reloaded when it changes.
+
+import os
+import re
+import time
+import threading
+
+RELOAD_CHECK_INTERVAL = 2.0  # seconds between checks of the rules file's modification time
+REGEX_METACHARACTERS = set('.^$*+?{}[]\\|()')
+QUANTIFIERS = set('*+?{')
+
+# ==== RULES ====
+
+class _TrieNode:
+    __slots__ = ('children', 'prefix_target', 'regexes')
+
+    def __init__(self):
+        self.children = {}
+        self.prefix_target = None
+        self.regexes = []
+
+def has_top_level_alternation(pattern):
+    """True if pattern has a | outside any group or character class ('a|b' but not '(a|b)')"""
+    depth = 0
+    in_class = False
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\':
+            i += 2
+            continue
+        if in_class:
+            in_class = char != ']'
+        elif char == '[':
+            in_class = True
+            if pattern[i + 1:i + 2] == '^':
+                i += 1
+            if pattern[i + 1:i + 2] == ']':
+                i += 1  # a ] right after [ or [^ is literal
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == '|' and depth == 0:
+            return True
+        i += 1
+    return False
+
+def literal_prefix(pattern):
+    """
+    The literal text every match of pattern must start with ('' if there is none, including
+    patterns with a top-level | whose branches start differently)
+    """
+    if has_top_level_alternation(pattern):
+        return ''
+    literal = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\' and i + 1 < len(pattern) and not pattern[i + 1].isalnum():
+            char, step = pattern[i + 1], 2  # escaped punctuation such as \. or \?
+        elif char in REGEX_METACHARACTERS:
+            break
+        else:
+            step = 1
+        # A quantified character is optional or repeated, so it can't be part of the prefix
+        if i + step < len(pattern) and pattern[i + step] in QUANTIFIERS:
+            break
+        literal.append(char)
+        i += step
+    return ''.join(literal)
+
+class RewriteRules:
+    """
+    A compiled set of rewrite rules. Lookups try, in order:
+    1. exact rules (hash table),
+    2. the longest matching prefix rule (trie walk, O(length of URL)),
+    3. regex rules in file order, matched at the start of the URL; only regexes whose
+       literal prefix matches the URL are tried, so large rule sets stay cheap.
+    The first rule that applies wins; results are not rewritten again.
+    """
+
+    def __init__(self):
+        self.exact = {}
+        self.root = _TrieNode()
+        self.count = 0
+
+    def add_exact(self, old, new):
+        self.exact[old] = new
+        self.count += 1
+
+    def add_prefix(self, old, new):
+        node = self._node(old)
+        node.prefix_target = new
+        self.count += 1
+
+    def add_regex(self, pattern, replacement):
+        """Add a regex rule (raises re.error for an invalid pattern)"""
+        compiled = re.compile(pattern)
+        self._node(literal_prefix(pattern)).regexes.append((self.count, compiled, replacement))
+        self.count += 1
+
+    def _node(self, key):
+        node = self.root
+        for char in key:
+            node = node.children.setdefault(char, _TrieNode())
+        return node
+
+    def rule_lists(self):
+        """(prefix rules {old: new}, regex rules [(compiled, replacement)] in file order) from the trie"""
+        prefixes, regexes = {}, []
+        stack = [('', self.root)]
+        while stack:
+            key, node = stack.pop()
+            if node.prefix_target is not None:
+                prefixes[key] = node.prefix_target
+            regexes.extend(node.regexes)
+            stack.extend((key + char, child) for char, child in node.children.items())
+        regexes.sort(key=lambda rule: rule[0])
+        return prefixes, [(pattern, replacement) for _, pattern, replacement in regexes]
+
+    def rewrite(self, url):
+        """The rewritten URL, or url itself when no rule applies"""
+        target = self.exact.get(url)
+        if target is not None:
+            return target
+
+        node = self.root
+        best = None
+        regexes = list(node.regexes)
+        for length, char in enumerate(url, 1):
+            node = node.children.get(char)
+            if node is None:
+                break
+            if node.prefix_target is not None:
+                best = (length, node.prefix_target)
+            regexes.extend(node.regexes)
+
+        if best is not None:
+            return best[1] + url[best[0]:]
+
+        for _, pattern, replacement in sorted(regexes, key=lambda rule: rule[0]):
+            match = pattern.match(url)
+            if match:
+                return match.expand(replacement) + url[match.end():]
+        return url
+
+def parse_rules(lines, source='<rules>', defaults=None):
+    """
+    Build RewriteRules from lines of the rules file format:
+        old-url new-url                  exact rule
+        exact old-url new-url            exact rule
+        prefix old-prefix new-prefix     replace a leading part of the URL
+        regex pattern replacement        re.match at the start; \\1 etc. in the replacement
+    Blank lines and lines starting with # are skipped; bad lines are reported and skipped.
+    defaults (a dict of exact rules) are added first, so the file can override them.
+    """
+    rules = RewriteRules()
+    for old, new in (defaults or {}).items():
+        rules.add_exact(old, new)
+
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        parts = line.split()
+        kind = 'exact'
+        if len(parts) == 3:
+            kind = parts.pop(0).lower()
+        if len(parts) != 2 or kind not in ('exact', 'prefix', 'regex'):
+            print(f"Warning: ignoring link rewrite line {number} in {source}: {line}")
+            continue
+        if kind == 'exact':
+            rules.add_exact(*parts)
+        elif kind == 'prefix':
+            rules.add_prefix(*parts)
+        else:
+            try:
+                rules.add_regex(*parts)
+            except re.error as e:
+                print(f"Warning: ignoring link rewrite line {number} in {source}: {e}")
+    return rules
+
+# ==== RELOADING MAP ====
+
+class RewriteMap:
+    """
+    Rewrite rules backed by a file that is reloaded when its modification time changes,
+    checked at most every check_interval seconds, so a long batch or watch run picks up
+    edits without a restart. A missing file leaves only the defaults.
+    """
+
+    def __init__(self, path, defaults=None, check_interval=RELOAD_CHECK_INTERVAL):
+        self.path = path
+        self.defaults = dict(defaults or {})
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked = 0.0
+        self.rules = self._load()
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def _load(self):
+        self._mtime = self._file_mtime()
+        if self._mtime is None:
+            return parse_rules([], self.path, self.defaults)
+        with open(self.path, "r", encoding="utf-8") as f:
+            return parse_rules(f, self.path, self.defaults)
+
+    def reload_if_changed(self):
+        """Reload the rules if the file changed since the last load; returns True if reloaded"""
+        now = time.monotonic()
+        if now - self._checked < self.check_interval:
+            return False
+        with self._lock:
+            self._checked = now
+            if self._file_mtime() == self._mtime:
+                return False
+            self.rules = self._load()
+        print(f"Reloaded {self.rules.count} link rewrite rules from {self.path}")
+        return True
+
+    def rewrite(self, url):
+        return self.rules.rewrite(url)
+
+# ==== SELF-CHECK ====
+
+# Rules and URLs that the indexed lookup must rewrite exactly as a plain scan of every rule does
+CHECK_RULES = [
+    r'exact https://old.com/page https://new.com/page',
+    r'prefix https://old.com/blog/ https://new.com/news/',
+    r'regex https://old\.com/a|https://old\.com/b https://new.com/x',
+    r'regex https://old\.com/(c|d)/(\d+) https://new.com/\1-\2',
+    r'regex [h]ttps://old\.com/e|x https://new.com/e',
+    r'regex https://old\.com/[|]f https://new.com/f',
+    r'regex (?i)https://OLD\.com/g https://new.com/g',
+    r'regex https?://old\.com/h https://new.com/h',
+]
+CHECK_URLS = [
+    'https://old.com/page', 'https://old.com/blog/post', 'https://old.com/a', 'https://old.com/b',
+    'https://old.com/b/more', 'https://old.com/c/12', 'https://old.com/d/7', 'https://old.com/e', 'x',
+    'https://old.com/|f', 'https://old.com/g', 'http://old.com/h', 'https://other.com/a',
+]
+
+def linear_rewrite(rules, url):
+    """rules.rewrite(url) without the trie: every prefix rule, then every regex rule re.match'ed in order"""
+    target = rules.exact.get(url)
+    if target is not None:
+        return target
+    prefixes, regexes = rules.rule_lists()
+    matching = [old for old in prefixes if url.startswith(old)]
+    if matching:
+        old = max(matching, key=len)
+        return prefixes[old] + url[len(old):]
+    for pattern, replacement in regexes:
+        match = pattern.match(url)
+        if match:
+            return match.expand(replacement) + url[match.end():]
+    return url
+
+def check_rules(rules, urls):
+    """[(url, indexed result, linear result)] for every URL the two lookups disagree on"""
+    return [(url, rules.rewrite(url), linear_rewrite(rules, url)) for url in urls
+            if rules.rewrite(url) != linear_rewrite(rules, url)]
+
+def main(argv=None):
+    """
+    Check the indexed lookup against a linear scan for CHECK_RULES, and for a rules file
+    (and URLs, one per line) if given: python url_rewrites.py [rules-file [urls-file]]
+    """
+    import sys
+    argv = sys.argv[1:] if argv is None else argv
+    checks = [('built-in rules', parse_rules(CHECK_RULES), CHECK_URLS)]
+    if argv:
+        with open(argv[0], 'r', encoding='utf-8') as f:
+            rules = parse_rules(f, argv[0])
+        urls = list(rules.exact) + list(rules.rule_lists()[0]) + CHECK_URLS
+        if len(argv) > 1:
+            with open(argv[1], 'r', encoding='utf-8') as f:
+                urls += [line.strip() for line in f if line.strip()]
+        checks.append((argv[0], rules, urls))
+    failures = 0
+    for name, rules, urls in checks:
+        mismatches = check_rules(rules, urls)
+        for url, indexed, linear in mismatches:
+            print(f"MISMATCH {name}: {url} -> {indexed} (linear scan: {linear})")
+        print(f"{name}: {len(urls) - len(mismatches)}/{len(urls)} URLs match the linear scan")
+        failures += len(mismatches)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())